@@ -1,5 +1,6 @@
 // ===== 房間管理功能 =====
 let myPlayerId = null;
+let myRoomCode = null;
 let roomStatePollingInterval = null;
 let heartbeatInterval = null;
 
@@ -104,13 +105,17 @@ async function joinRoom() {
         return;
     }
 
+    // 房號（留空則加入預設房間）
+    const roomCodeInput = document.getElementById('roomCodeInput');
+    const roomCode = roomCodeInput ? roomCodeInput.value.trim().toUpperCase() : '';
+
     try {
         console.log('發送加入房間請求...');
         const response = await fetch('/api/room/join', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             credentials: 'include',
-            body: JSON.stringify({ player_name: playerName })
+            body: JSON.stringify({ player_name: playerName, room_code: roomCode || null })
         });
 
         console.log('收到回應:', response.status);
@@ -119,7 +124,11 @@ async function joinRoom() {
 
         if (response.ok && data.success) {
             myPlayerId = data.player_id;
-            console.log('✅ 成功加入，玩家ID:', myPlayerId);
+            myRoomCode = data.room_code;
+            console.log('✅ 成功加入，玩家ID:', myPlayerId, '房號:', myRoomCode);
+
+            const roomCodeDisplay = document.getElementById('roomCodeDisplay');
+            if (roomCodeDisplay) roomCodeDisplay.textContent = myRoomCode;
 
             // 檢查是否在排隊中
             if (data.status === 'in_queue') {
@@ -175,6 +184,29 @@ async function joinRoom() {
     }
 }
 
+// 開新的一桌（建立新房間並填入房號）
+async function createRoom() {
+    try {
+        const response = await fetch('/api/room/create', {
+            method: 'POST',
+            credentials: 'include'
+        });
+        const data = await response.json();
+
+        if (response.ok && data.success) {
+            console.log('🏠 建立新房間:', data.room_code);
+            const roomCodeInput = document.getElementById('roomCodeInput');
+            if (roomCodeInput) roomCodeInput.value = data.room_code;
+            alert(`新房間已建立！房號：${data.room_code}\n請把房號告訴同桌的朋友`);
+        } else {
+            alert(data.detail || '建立房間失敗');
+        }
+    } catch (error) {
+        console.error('❌ 建立房間錯誤:', error);
+        alert('建立房間失敗：' + error.message);
+    }
+}
+
 // 離開房間
 async function leaveRoom() {
     if (!myPlayerId) return;
@@ -200,17 +232,138 @@ async function leaveRoom() {
     window.location.href = '/mode';
 }
 
-// 開始輪詢房間狀態
+// ===== WebSocket 即時推播 =====
+// 連線正常時由伺服器推送狀態；斷線時才退回輪詢
+let roomSocket = null;
+let roomSocketConnected = false;
+let roomSocketRetry = 0;
+const activeChannels = new Set();  // 目前頁面需要的狀態：'room' | 'wheel' | 'game'
+
+function connectRoomSocket() {
+    if (roomSocket || !('WebSocket' in window)) return;
+
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    roomSocket = new WebSocket(`${protocol}://${window.location.host}/ws/room`);
+
+    roomSocket.onopen = () => {
+        console.log('🔌 WebSocket 已連線，停止輪詢');
+        roomSocketConnected = true;
+        roomSocketRetry = 0;
+        pausePollingForSocket();
+    };
+
+    roomSocket.onmessage = (event) => {
+        try {
+            const message = JSON.parse(event.data);
+            if (message.type === 'state') {
+                handlePushedState(message);
+            }
+        } catch (error) {
+            console.error('❌ 處理推播訊息錯誤:', error);
+        }
+    };
+
+    roomSocket.onclose = () => {
+        const wasConnected = roomSocketConnected;
+        roomSocket = null;
+        roomSocketConnected = false;
+        if (activeChannels.size === 0) return;
+
+        if (wasConnected) console.log('🔌 WebSocket 斷線，改回輪詢');
+        resumePollingAfterSocketDrop();
+
+        // 逐步拉長重連間隔（最多 10 秒）
+        const delay = Math.min(1000 * Math.pow(2, roomSocketRetry), 10000);
+        roomSocketRetry++;
+        setTimeout(connectRoomSocket, delay);
+    };
+}
+
+// 依目前頁面需要的狀態分派推播內容
+function handlePushedState(message) {
+    if (activeChannels.has('room')) applyRoomState(message.room);
+    if (activeChannels.has('wheel')) applyWheelState(message.wheel);
+    if (activeChannels.has('game') && message.room.game_started) applyGameState(message.room);
+}
+
+function pausePollingForSocket() {
+    if (roomStatePollingInterval) {
+        clearInterval(roomStatePollingInterval);
+        roomStatePollingInterval = null;
+    }
+    if (wheelStatePollingInterval) {
+        clearInterval(wheelStatePollingInterval);
+        wheelStatePollingInterval = null;
+    }
+    if (gameStatePollingInterval) {
+        clearInterval(gameStatePollingInterval);
+        gameStatePollingInterval = null;
+    }
+}
+
+function resumePollingAfterSocketDrop() {
+    if (activeChannels.has('room') && !roomStatePollingInterval) {
+        roomStatePollingInterval = setInterval(pollRoomState, 1000);
+    }
+    if (activeChannels.has('wheel') && !wheelStatePollingInterval) {
+        wheelStatePollingInterval = setInterval(pollWheelState, 500);
+    }
+    if (activeChannels.has('game') && !gameStatePollingInterval) {
+        gameStatePollingInterval = setInterval(pollGameState, 1000);
+    }
+}
+
+// ===== 增量同步（?since=）=====
+// 記住上一次的完整狀態，之後只下載變動的欄位（JSON merge patch）
+const deltaStateCache = {};
+
+function applyMergePatch(target, patch) {
+    if (patch === null || typeof patch !== 'object' || Array.isArray(patch)) return patch;
+    const result = (target && typeof target === 'object' && !Array.isArray(target)) ? { ...target } : {};
+    for (const [key, value] of Object.entries(patch)) {
+        if (value === null) {
+            delete result[key];
+        } else {
+            result[key] = applyMergePatch(result[key], value);
+        }
+    }
+    return result;
+}
+
+// 取得狀態（請求失敗回傳 null）
+async function fetchStateDelta(url) {
+    const cached = deltaStateCache[url];
+    const query = cached ? `?since=${cached.version}&epoch=${cached.epoch}` : '';
+
+    const response = await fetch(url + query, { credentials: 'include' });
+    if (!response.ok) {
+        delete deltaStateCache[url];
+        return null;
+    }
+
+    const data = await response.json();
+    const state = data.delta ? applyMergePatch(cached.state, data.patch) : data;
+    deltaStateCache[url] = { state: state, version: state.version, epoch: state.epoch };
+    return state;
+}
+
+// 開始同步房間狀態
 function startRoomStatePolling() {
+    activeChannels.add('room');
+    connectRoomSocket();
+
     // 立即獲取一次
     pollRoomState();
 
-    // 每秒輪詢一次
-    roomStatePollingInterval = setInterval(pollRoomState, 1000);
+    // WebSocket 沒連上時每秒輪詢一次
+    if (!roomSocketConnected && !roomStatePollingInterval) {
+        roomStatePollingInterval = setInterval(pollRoomState, 1000);
+    }
 }
 
 // 停止輪詢
 function stopRoomStatePolling() {
+    activeChannels.delete('room');
     if (roomStatePollingInterval) {
         clearInterval(roomStatePollingInterval);
         roomStatePollingInterval = null;
@@ -237,15 +390,21 @@ function startWheelStatePolling() {
         wheelStatePollingInterval = null;
     }
 
+    activeChannels.add('wheel');
+    connectRoomSocket();
+
     // 立即執行一次
     pollWheelState();
 
-    // 然後每 0.5 秒輪詢一次
-    wheelStatePollingInterval = setInterval(pollWheelState, 500);
+    // WebSocket 沒連上時每 0.5 秒輪詢一次
+    if (!roomSocketConnected) {
+        wheelStatePollingInterval = setInterval(pollWheelState, 500);
+    }
 }
 
 // 停止輪詢轉盤狀態
 function stopWheelStatePolling() {
+    activeChannels.delete('wheel');
     if (wheelStatePollingInterval) {
         clearInterval(wheelStatePollingInterval);
         wheelStatePollingInterval = null;
@@ -265,139 +424,145 @@ async function pollWheelState() {
         }
 
         const wheelState = await response.json();
+        applyWheelState(wheelState);
+    } catch (error) {
+        console.error('❌ 輪詢轉盤狀態錯誤:', error);
+    }
+}
 
-        // 詳細日誌（包含候選人資訊）
-        console.log('📊 [輪詢] 轉盤狀態:', {
-            spinning: wheelState.wheel_spinning,
-            finished: wheelState.wheel_finished,
-            seed: wheelState.spin_seed,
-            winner: wheelState.winner_index,
-            hasSpun: wheelHasSpun,
-            candidates: wheelState.candidates?.length || 0
-        });
-
-        // 如果轉盤開始旋轉，且還沒轉過
-        if (wheelState.wheel_spinning && !wheelHasSpun) {
-            console.log('🎰 [所有玩家] 轉盤開始旋轉！');
-            console.log('   - 種子:', wheelState.spin_seed);
-            console.log('   - 中獎索引:', wheelState.winner_index);
-            console.log('   - 候選人數:', wheelState.candidates?.length);
-
-            wheelHasSpun = true;
-
-            // 更新提示訊息
-            const hostMessage = document.getElementById('hostMessage');
-            const viewerMessage = document.getElementById('viewerMessage');
-            if (hostMessage) hostMessage.style.display = 'none';
-            if (viewerMessage) {
-                viewerMessage.textContent = '🎰 轉盤正在旋轉中...';
-                viewerMessage.style.display = 'block';
-            }
+// 套用轉盤狀態（輪詢與 WebSocket 推播共用）
+function applyWheelState(wheelState) {
+    // 詳細日誌（包含候選人資訊）
+    console.log('📊 [輪詢] 轉盤狀態:', {
+        spinning: wheelState.wheel_spinning,
+        finished: wheelState.wheel_finished,
+        seed: wheelState.spin_seed,
+        winner: wheelState.winner_index,
+        hasSpun: wheelHasSpun,
+        candidates: wheelState.candidates?.length || 0
+    });
 
-            // 驗證必要參數
-            if (wheelState.spin_seed && wheelState.winner_index !== null && wheelState.winner_index !== undefined) {
-                console.log('✅ 啟動同步轉盤動畫');
-                // 使用同步的隨機種子和中獎索引來啟動轉盤動畫
-                startSyncedWheelSpin(wheelState.spin_seed, wheelState.winner_index);
-            } else {
-                console.error('❌ 轉盤參數不完整:', wheelState);
-            }
+    // 如果轉盤開始旋轉，且還沒轉過
+    if (wheelState.wheel_spinning && !wheelHasSpun) {
+        console.log('🎰 [所有玩家] 轉盤開始旋轉！');
+        console.log('   - 種子:', wheelState.spin_seed);
+        console.log('   - 中獎索引:', wheelState.winner_index);
+        console.log('   - 候選人數:', wheelState.candidates?.length);
+
+        wheelHasSpun = true;
+
+        // 更新提示訊息
+        const hostMessage = document.getElementById('hostMessage');
+        const viewerMessage = document.getElementById('viewerMessage');
+        if (hostMessage) hostMessage.style.display = 'none';
+        if (viewerMessage) {
+            viewerMessage.textContent = '🎰 轉盤正在旋轉中...';
+            viewerMessage.style.display = 'block';
         }
 
-        // 如果轉盤已完成
-        if (wheelState.wheel_finished && wheelState.player_order && wheelState.player_order.length > 0) {
-            console.log('✅ [所有玩家] 轉盤完成！');
-            console.log('   - 玩家順序:', wheelState.player_order);
+        // 驗證必要參數
+        if (wheelState.spin_seed && wheelState.winner_index !== null && wheelState.winner_index !== undefined) {
+            console.log('✅ 啟動同步轉盤動畫');
+            // 使用同步的隨機種子和中獎索引來啟動轉盤動畫
+            startSyncedWheelSpin(wheelState.spin_seed, wheelState.winner_index);
+        } else {
+            console.error('❌ 轉盤參數不完整:', wheelState);
+        }
+    }
 
-            stopWheelStatePolling();
+    // 如果轉盤已完成
+    if (wheelState.wheel_finished && wheelState.player_order && wheelState.player_order.length > 0) {
+        console.log('✅ [所有玩家] 轉盤完成！');
+        console.log('   - 玩家順序:', wheelState.player_order);
 
-            // 更新提示訊息
-            const viewerMessage = document.getElementById('viewerMessage');
-            if (viewerMessage) {
-                viewerMessage.textContent = '✅ 抽籤完成！順序如下：';
-                viewerMessage.style.color = 'var(--neon-green)';
-                viewerMessage.style.display = 'block';
-            }
+        stopWheelStatePolling();
 
-            // 顯示結果
-            displayWheelResult(wheelState.player_order);
+        // 更新提示訊息
+        const viewerMessage = document.getElementById('viewerMessage');
+        if (viewerMessage) {
+            viewerMessage.textContent = '✅ 抽籤完成！順序如下：';
+            viewerMessage.style.color = 'var(--neon-green)';
+            viewerMessage.style.display = 'block';
         }
-    } catch (error) {
-        console.error('❌ 輪詢轉盤狀態錯誤:', error);
+
+        // 顯示結果
+        displayWheelResult(wheelState.player_order);
     }
 }
 
 // 輪詢房間狀態
 async function pollRoomState() {
     try {
-        const response = await fetch('/api/room/state', {
-            credentials: 'include'
-        });
+        const state = await fetchStateDelta('/api/room/state');
+        if (!state) return;
+        applyRoomState(state);
+    } catch (error) {
+        console.error('輪詢房間狀態錯誤:', error);
+    }
+}
 
-        const state = await response.json();
-        console.log('📊 [房間輪詢] 遊戲狀態:', {
-            game_started: state.game_started,
-            player_count: state.player_count,
-            my_id: myPlayerId,
-            host_id: state.host_id
-        });
+// 套用房間狀態（輪詢與 WebSocket 推播共用）
+function applyRoomState(state) {
+    console.log('📊 [房間輪詢] 遊戲狀態:', {
+        game_started: state.game_started,
+        player_count: state.player_count,
+        my_id: myPlayerId,
+        host_id: state.host_id
+    });
 
-        // 如果已經不在房間中，返回模式選擇頁
-        if (!state.is_in_room) {
-            stopRoomStatePolling();
-            stopHeartbeat();
-            alert('你已被移出房間');
-            window.location.href = '/mode';
-            return;
-        }
+    // 如果已經不在房間中，返回模式選擇頁
+    if (!state.is_in_room) {
+        stopRoomStatePolling();
+        stopHeartbeat();
+        alert('你已被移出房間');
+        window.location.href = '/mode';
+        return;
+    }
 
-        // 如果遊戲已開始，顯示轉盤區域
-        const wheelSection = document.getElementById('wheelSection');
-        const waitingSection = document.getElementById('waitingSection');
-
-        if (state.game_started && wheelSection && wheelSection.style.display !== 'block') {
-            console.log('🎰 [重要] 遊戲已開始，切換到轉盤畫面！');
-            console.log('   - 我的ID:', myPlayerId);
-            console.log('   - 房主ID:', state.host_id);
-            console.log('   - 我是房主:', myPlayerId === state.host_id);
-
-            if (waitingSection) waitingSection.style.display = 'none';
-            wheelSection.style.display = 'block';
-
-            // 設定轉盤
-            setupWheelFromPlayers(state.players);
-
-            // 判斷是否為房主，只有房主可以轉盤
-            const isHost = (myPlayerId === state.host_id);
-            const spinBtn = document.getElementById('spinBtn');
-            const hostMessage = document.getElementById('hostMessage');
-            const viewerMessage = document.getElementById('viewerMessage');
-
-            if (isHost) {
-                // 房主可以控制轉盤
-                spinBtn.disabled = false;
-                spinBtn.style.opacity = '1';
-                if (hostMessage) hostMessage.style.display = 'block';
-                if (viewerMessage) viewerMessage.style.display = 'none';
-                console.log('✅ 你是房主，可以控制轉盤');
-            } else {
-                // 其他玩家只能觀看
-                spinBtn.disabled = true;
-                spinBtn.style.opacity = '0.5';
-                if (hostMessage) hostMessage.style.display = 'none';
-                if (viewerMessage) viewerMessage.style.display = 'block';
-                console.log('👀 你不是房主，等待房主轉動轉盤');
-            }
+    // 如果遊戲已開始，顯示轉盤區域
+    const wheelSection = document.getElementById('wheelSection');
+    const waitingSection = document.getElementById('waitingSection');
+
+    if (state.game_started && wheelSection && wheelSection.style.display !== 'block') {
+        console.log('🎰 [重要] 遊戲已開始，切換到轉盤畫面！');
+        console.log('   - 我的ID:', myPlayerId);
+        console.log('   - 房主ID:', state.host_id);
+        console.log('   - 我是房主:', myPlayerId === state.host_id);
+
+        if (waitingSection) waitingSection.style.display = 'none';
+        wheelSection.style.display = 'block';
+
+        // 設定轉盤
+        setupWheelFromPlayers(state.players);
 
-            // 停止房間狀態輪詢，改為輪詢轉盤狀態
-            stopRoomStatePolling();
-            startWheelStatePolling();
+        // 判斷是否為房主，只有房主可以轉盤
+        const isHost = (myPlayerId === state.host_id);
+        const spinBtn = document.getElementById('spinBtn');
+        const hostMessage = document.getElementById('hostMessage');
+        const viewerMessage = document.getElementById('viewerMessage');
+
+        if (isHost) {
+            // 房主可以控制轉盤
+            spinBtn.disabled = false;
+            spinBtn.style.opacity = '1';
+            if (hostMessage) hostMessage.style.display = 'block';
+            if (viewerMessage) viewerMessage.style.display = 'none';
+            console.log('✅ 你是房主，可以控制轉盤');
         } else {
-            // 更新 UI
-            updateRoomUI(state);
+            // 其他玩家只能觀看
+            spinBtn.disabled = true;
+            spinBtn.style.opacity = '0.5';
+            if (hostMessage) hostMessage.style.display = 'none';
+            if (viewerMessage) viewerMessage.style.display = 'block';
+            console.log('👀 你不是房主，等待房主轉動轉盤');
         }
-    } catch (error) {
-        console.error('輪詢房間狀態錯誤:', error);
+
+        // 停止房間狀態輪詢，改為輪詢轉盤狀態
+        stopRoomStatePolling();
+        startWheelStatePolling();
+    } else {
+        // 更新 UI
+        updateRoomUI(state);
     }
 }
 
@@ -411,6 +576,13 @@ function updateRoomUI(state) {
         playerCountEl.textContent = state.player_count;
     }
 
+    // 更新房號
+    const roomCodeDisplay = document.getElementById('roomCodeDisplay');
+    if (roomCodeDisplay && state.room_code) {
+        myRoomCode = state.room_code;
+        roomCodeDisplay.textContent = state.room_code;
+    }
+
     // 更新玩家列表
     const playerList = document.getElementById('playerList');
     if (playerList) {
@@ -1060,17 +1232,23 @@ async function initGamePage() {
     startGameStatePolling();
 }
 
-// 開始輪詢遊戲狀態
+// 開始同步遊戲狀態
 function startGameStatePolling() {
+    activeChannels.add('game');
+    connectRoomSocket();
+
     // 立即獲取一次
     pollGameState();
 
-    // 每 1 秒輪詢一次
-    gameStatePollingInterval = setInterval(pollGameState, 1000);
+    // WebSocket 沒連上時每 1 秒輪詢一次
+    if (!roomSocketConnected && !gameStatePollingInterval) {
+        gameStatePollingInterval = setInterval(pollGameState, 1000);
+    }
 }
 
 // 停止輪詢
 function stopGameStatePolling() {
+    activeChannels.delete('game');
     if (gameStatePollingInterval) {
         clearInterval(gameStatePollingInterval);
         gameStatePollingInterval = null;
@@ -1080,182 +1258,182 @@ function stopGameStatePolling() {
 // 輪詢遊戲狀態
 async function pollGameState() {
     try {
-        const response = await fetch('/api/game/state', {
-            credentials: 'include'
-        });
-
-        if (!response.ok) {
+        const state = await fetchStateDelta('/api/game/state');
+        if (!state) {
             console.log('遊戲尚未開始或已結束');
             return;
         }
+        applyGameState(state);
+    } catch (error) {
+        console.error('輪詢遊戲狀態錯誤:', error);
+    }
+}
 
-        const state = await response.json();
-        console.log('🎮 [遊戲狀態]', {
-            turn: state.current_turn_index,
-            round: state.current_round,
-            is_my_turn: state.is_my_turn,
-            dice: state.dice_values,
-            base_wine: state.base_wine_color,
-            game_ended: state.game_ended
-        });
+// 套用遊戲狀態（輪詢與 WebSocket 推播共用）
+function applyGameState(state) {
+    console.log('🎮 [遊戲狀態]', {
+        turn: state.current_turn_index,
+        round: state.current_round,
+        is_my_turn: state.is_my_turn,
+        dice: state.dice_values,
+        base_wine: state.base_wine_color,
+        game_ended: state.game_ended
+    });
 
-        // ✅ 判斷是否為剛開始遊戲的緩衝期 (10秒內)
-        const newGameTime = parseInt(sessionStorage.getItem('new_game_timestamp') || '0');
-        const isNewGameBuffer = (Date.now() - newGameTime < 10000);
-
-        // ✅ 檢查遊戲是否結束（所有玩家同步）
-        if (state.game_ended && state.game_result) {
-            // ✅ 安全檢查：如果是剛開始遊戲 (10秒內)，忽略後端傳來的結束訊號 (可能是舊紀錄)
-            if (isNewGameBuffer) {
-                console.warn('⚠️ 忽略剛開始遊戲時的 game_ended 訊號 (可能是後端未重置)');
-                return; // ✅ 忽略舊的結束訊號，不更新狀態，維持初始畫面
-            } else {
-                console.log('🏁 遊戲結束！所有玩家同步顯示結束畫面');
-                stopGameStatePolling();  // 停止輪詢
-
-                // 強制停用擲骰子按鈕，防止繼續操作
-                const rollBtn = document.getElementById("rollBtn");
-                if (rollBtn) {
-                    rollBtn.disabled = true;
-                    rollBtn.style.opacity = "0.5";
-                    rollBtn.innerText = "遊戲結束";
-                }
+    // ✅ 判斷是否為剛開始遊戲的緩衝期 (10秒內)
+    const newGameTime = parseInt(sessionStorage.getItem('new_game_timestamp') || '0');
+    const isNewGameBuffer = (Date.now() - newGameTime < 10000);
 
-                showGameEndModal(state.game_result);  // 顯示結束畫面
-                return;
+    // ✅ 檢查遊戲是否結束（所有玩家同步）
+    if (state.game_ended && state.game_result) {
+        // ✅ 安全檢查：如果是剛開始遊戲 (10秒內)，忽略後端傳來的結束訊號 (可能是舊紀錄)
+        if (isNewGameBuffer) {
+            console.warn('⚠️ 忽略剛開始遊戲時的 game_ended 訊號 (可能是後端未重置)');
+            return; // ✅ 忽略舊的結束訊號，不更新狀態，維持初始畫面
+        } else {
+            console.log('🏁 遊戲結束！所有玩家同步顯示結束畫面');
+            stopGameStatePolling();  // 停止輪詢
+
+            // 強制停用擲骰子按鈕，防止繼續操作
+            const rollBtn = document.getElementById("rollBtn");
+            if (rollBtn) {
+                rollBtn.disabled = true;
+                rollBtn.style.opacity = "0.5";
+                rollBtn.innerText = "遊戲結束";
             }
-        }
 
-        // 更新當前玩家索引和回合
-        currentPlayerIndex = state.current_turn_index;
-        
-        // ✅ 如果是新遊戲緩衝期，不要從後端同步回合數 (避免同步到舊的 Round 5)
-        if (!isNewGameBuffer) {
-            currentRound = state.current_round;
+            showGameEndModal(state.game_result);  // 顯示結束畫面
+            return;
         }
+    }
 
-        // 同步骰子狀態（所有玩家看到相同的骰子）
-        if (state.dice_values && state.dice_values.length === 2) {
-            // ✅ 如果是新遊戲緩衝期，忽略後端舊的骰子紀錄
-            if (!isNewGameBuffer) {
-                const die1 = document.getElementById("die1");
-                const die2 = document.getElementById("die2");
-                if (die1 && die2) {
-                    die1.dataset.value = state.dice_values[0];
-                    die2.dataset.value = state.dice_values[1];
-                }
-            }
-        }
+    // 更新當前玩家索引和回合
+    currentPlayerIndex = state.current_turn_index;
+    
+    // ✅ 如果是新遊戲緩衝期，不要從後端同步回合數 (避免同步到舊的 Round 5)
+    if (!isNewGameBuffer) {
+        currentRound = state.current_round;
+    }
 
-        // 同步基底酒顏色（所有玩家看到相同的基底）
-        if (state.base_wine_color) {
-            const baseCircle = document.getElementById("baseColorCircle");
-            if (baseCircle) {
-                baseCircle.className = `base-circle base-${state.base_wine_color}`;
+    // 同步骰子狀態（所有玩家看到相同的骰子）
+    if (state.dice_values && state.dice_values.length === 2) {
+        // ✅ 如果是新遊戲緩衝期，忽略後端舊的骰子紀錄
+        if (!isNewGameBuffer) {
+            const die1 = document.getElementById("die1");
+            const die2 = document.getElementById("die2");
+            if (die1 && die2) {
+                die1.dataset.value = state.dice_values[0];
+                die2.dataset.value = state.dice_values[1];
             }
         }
+    }
 
-        // 同步酒堆疊（所有玩家看到相同的酒堆疊）
-        if (state.wine_stack !== undefined) {
-            const stack = document.getElementById("wineStack");
-            if (stack) {
-                // 檢查是否需要更新（避免不必要的重繪）
-                const currentStackLength = stack.children.length;
-                if (currentStackLength !== state.wine_stack.length) {
-                    console.log(`🍷 同步酒堆疊: ${currentStackLength} → ${state.wine_stack.length}`);
-
-                    // 清空並重新繪製
-                    stack.innerHTML = "";
-                    state.wine_stack.forEach(colorKey => {
-                        const colorData = wineColors[colorKey];
-                        if (colorData) {
-                            const div = document.createElement("div");
-                            div.className = "stack-circle";
-                            div.style.backgroundColor = colorData.bg;
-                            div.style.boxShadow = `0 0 10px ${colorData.shadow}`;
-                            stack.appendChild(div);
-                        }
-                    });
-                }
-            }
+    // 同步基底酒顏色（所有玩家看到相同的基底）
+    if (state.base_wine_color) {
+        const baseCircle = document.getElementById("baseColorCircle");
+        if (baseCircle) {
+            baseCircle.className = `base-circle base-${state.base_wine_color}`;
         }
+    }
 
-        // 同步積分（所有玩家看到相同的積分）
-        if (state.player_scores) {
-            for (let i = 0; i < gamePlayers.length; i++) {
-                const player = gamePlayers[i];
-                if (player && player.player_id && state.player_scores[player.player_id] !== undefined) {
-                    const serverScore = state.player_scores[player.player_id];
-                    if (player.score !== serverScore) {
-                        console.log(`📊 同步積分: 玩家 ${i} (${player.name}) ${player.score} → ${serverScore}`);
-                        player.score = serverScore;
-
-                        // 更新 UI
-                        const scoreEl = document.getElementById(`score-${i}`);
-                        if (scoreEl) scoreEl.innerText = player.score;
+    // 同步酒堆疊（所有玩家看到相同的酒堆疊）
+    if (state.wine_stack !== undefined) {
+        const stack = document.getElementById("wineStack");
+        if (stack) {
+            // 檢查是否需要更新（避免不必要的重繪）
+            const currentStackLength = stack.children.length;
+            if (currentStackLength !== state.wine_stack.length) {
+                console.log(`🍷 同步酒堆疊: ${currentStackLength} → ${state.wine_stack.length}`);
+
+                // 清空並重新繪製
+                stack.innerHTML = "";
+                state.wine_stack.forEach(colorKey => {
+                    const colorData = wineColors[colorKey];
+                    if (colorData) {
+                        const div = document.createElement("div");
+                        div.className = "stack-circle";
+                        div.style.backgroundColor = colorData.bg;
+                        div.style.boxShadow = `0 0 10px ${colorData.shadow}`;
+                        stack.appendChild(div);
                     }
-                }
+                });
             }
         }
+    }
 
-        // 更新 UI
-        updateTurnInfo();
-        renderScoreboard();
-        updateRoundDisplay();
-
-        // ✅ 前端額外檢查：酒鬼模式是否達到結束條件 (防止後端 game_ended 延遲或未發送)
-        if (currentGameMode === 'drunk') {
-            // ✅ 同樣加入安全檢查：剛開始遊戲不觸發本地結束判斷
-            const newGameTime = parseInt(sessionStorage.getItem('new_game_timestamp') || '0');
-            if (Date.now() - newGameTime < 10000) {
-                return;
-            }
+    // 同步積分（所有玩家看到相同的積分）
+    if (state.player_scores) {
+        for (let i = 0; i < gamePlayers.length; i++) {
+            const player = gamePlayers[i];
+            if (player && player.player_id && state.player_scores[player.player_id] !== undefined) {
+                const serverScore = state.player_scores[player.player_id];
+                if (player.score !== serverScore) {
+                    console.log(`📊 同步積分: 玩家 ${i} (${player.name}) ${player.score} → ${serverScore}`);
+                    player.score = serverScore;
 
-            const loser = gamePlayers.find(p => p.score >= LOSE_THRESHOLD);
-            if (loser) {
-                console.log('🍺 前端偵測到酒鬼模式結束條件達成 (本地觸發)');
-                stopGameStatePolling();
-
-                // 強制停用擲骰子按鈕
-                const rollBtn = document.getElementById("rollBtn");
-                if (rollBtn) {
-                    rollBtn.disabled = true;
-                    rollBtn.style.opacity = "0.5";
-                    rollBtn.innerText = "遊戲結束";
+                    // 更新 UI
+                    const scoreEl = document.getElementById(`score-${i}`);
+                    if (scoreEl) scoreEl.innerText = player.score;
                 }
-
-                // 建構本地結果物件
-                const result = {
-                    mode: 'drunk',
-                    loser: {
-                        player_name: loser.name,
-                        score: loser.score
-                    },
-                    losers: [{
-                        player_name: loser.name,
-                        score: loser.score
-                    }]
-                };
-                
-                showGameEndModal(result);
-                return;
             }
         }
+    }
 
-        // 控制擲骰子按鈕
-        const rollBtn = document.getElementById("rollBtn");
-        if (rollBtn && !isRolling) {
-            if (state.is_my_turn) {
-                rollBtn.disabled = false;
-                rollBtn.style.opacity = "1";
-            } else {
+    // 更新 UI
+    updateTurnInfo();
+    renderScoreboard();
+    updateRoundDisplay();
+
+    // ✅ 前端額外檢查：酒鬼模式是否達到結束條件 (防止後端 game_ended 延遲或未發送)
+    if (currentGameMode === 'drunk') {
+        // ✅ 同樣加入安全檢查：剛開始遊戲不觸發本地結束判斷
+        const newGameTime = parseInt(sessionStorage.getItem('new_game_timestamp') || '0');
+        if (Date.now() - newGameTime < 10000) {
+            return;
+        }
+
+        const loser = gamePlayers.find(p => p.score >= LOSE_THRESHOLD);
+        if (loser) {
+            console.log('🍺 前端偵測到酒鬼模式結束條件達成 (本地觸發)');
+            stopGameStatePolling();
+
+            // 強制停用擲骰子按鈕
+            const rollBtn = document.getElementById("rollBtn");
+            if (rollBtn) {
                 rollBtn.disabled = true;
                 rollBtn.style.opacity = "0.5";
-                console.log('⏳ 還沒輪到我，等待中...');
+                rollBtn.innerText = "遊戲結束";
             }
+
+            // 建構本地結果物件
+            const result = {
+                mode: 'drunk',
+                loser: {
+                    player_name: loser.name,
+                    score: loser.score
+                },
+                losers: [{
+                    player_name: loser.name,
+                    score: loser.score
+                }]
+            };
+            
+            showGameEndModal(result);
+            return;
+        }
+    }
+
+    // 控制擲骰子按鈕
+    const rollBtn = document.getElementById("rollBtn");
+    if (rollBtn && !isRolling) {
+        if (state.is_my_turn) {
+            rollBtn.disabled = false;
+            rollBtn.style.opacity = "1";
+        } else {
+            rollBtn.disabled = true;
+            rollBtn.style.opacity = "0.5";
+            console.log('⏳ 還沒輪到我，等待中...');
         }
-    } catch (error) {
-        console.error('輪詢遊戲狀態錯誤:', error);
     }
 }
 
@@ -1657,7 +1835,7 @@ async function handleAddRandomColor(diceSum) {
             // 隨機選擇顏色加入酒杯
             const keys = Object.keys(wineColors);
             const randomKey = keys[Math.floor(Math.random() * keys.length)];
-            showPopup(`電腦選了：${getColorName(randomKey)}\n幫浦已啟動 ${data.duration || 0}秒`);
+            showPopup(`電腦選了：${getColorName(randomKey)}\n出酒 ${data.volume_ml || 0} ml`);
             addColorToStack(randomKey);
             setTimeout(nextTurn, 1000);
         } else {
@@ -1700,7 +1878,7 @@ window.pickColor = async function(key) {
 
         if (data.success) {
             console.log('🎮 遊戲事件觸發成功:', data);
-            showPopup(`已選擇 ${getColorName(key)}\n幫浦已啟動 ${data.duration || 0}秒`);
+            showPopup(`已選擇 ${getColorName(key)}\n出酒 ${data.volume_ml || 0} ml`);
             addColorToStack(key);
             setTimeout(nextTurn, 500);
         } else {
@@ -1951,8 +2129,7 @@ window.onload = async function() {
                 // 如果在遊戲頁面，開始遊戲狀態輪詢
                 if (currentPage === 'game') {
                     startHeartbeat();
-                    pollGameState();
-                    setInterval(pollGameState, 1000);
+                    startGameStatePolling();
                 }
             }
         }
@@ -1995,8 +2172,9 @@ async function fullResetGame() {
         }
     }
 
-    // 3. 清除 Cookie (確保不抓到舊的 player_id)
+    // 3. 清除 Cookie (確保不抓到舊的 player_id / 房號)
     document.cookie = "player_id=; expires=Thu, 01 Jan 1970 00:00:00 UTC; path=/;";
+    document.cookie = "room_code=; expires=Thu, 01 Jan 1970 00:00:00 UTC; path=/;";
     
     // 4. 停止所有計時器
     stopRoomStatePolling();
@@ -23,5 +23,6 @@ CORS_ORIGINS = [
 ]
 
 # 遊戲設定
+DICE_MODES_DIR = BASE_DIR / "data" / "dice_modes"  # 骰子模式設定檔（每個模式一個 JSON）
 DEFAULT_ROUNDS = 5  # 闔家歡模式預設回合數
 DRUNK_MODE_MAX_DRINKS = 3  # 酒鬼模式最大杯數
@@ -7,6 +7,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.config import PROJECT_NAME, VERSION, API_V1_PREFIX, CORS_ORIGINS
 from app.database import engine, Base
 from app.routers import game, questions
+from app.utils.metrics import PrometheusMiddleware, metrics_response
 
 # 創建資料庫表
 Base.metadata.create_all(bind=engine)
@@ -27,6 +28,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 每個路由的延遲 / 狀態碼指標
+app.add_middleware(PrometheusMiddleware)
+
 # 註冊路由
 app.include_router(game.router, prefix=f"{API_V1_PREFIX}/game", tags=["game"])
 app.include_router(questions.router, prefix=f"{API_V1_PREFIX}/questions", tags=["questions"])
@@ -38,6 +42,12 @@ async def health_check():
     return {"status": "ok", "message": "醉加損友 API 運行正常"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus 抓取端點"""
+    return metrics_response()
+
+
 @app.get("/")
 async def root():
     """根路徑"""
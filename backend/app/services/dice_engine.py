@@ -1,52 +1,115 @@
 """
 骰子事件引擎
+
+遊戲模式由 data/dice_modes/*.json 註冊，新增派對模式不需要改程式碼。
+每個模式載入時預先展開成 36 格（骰子1, 骰子2）結果表，擲骰只剩一次陣列索引。
 """
+import json
 import random
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from app.config import DICE_MODES_DIR
 from app.models.game import GameMode
 
+UNKNOWN_EVENT = "unknown"
+UNKNOWN_DESCRIPTION = "未知事件"
+
+
+class DiceModeError(ValueError):
+    """骰子模式設定檔格式不正確"""
+
+
+def _mode_key(mode: Union[GameMode, str]) -> str:
+    return mode.value if isinstance(mode, GameMode) else str(mode)
+
+
+def compile_outcomes(spec: Dict[str, Any], descriptions: Dict[str, str]) -> List[Dict[str, Any]]:
+    """
+    把模式設定展開成 36 格結果表，索引為 (dice1 - 1) * 6 + (dice2 - 1)
+
+    spec 格式：
+    {
+        "mode": "family",
+        "double_event": "drink_reset",          # 可省略：對子也依點數決定
+        "totals": {"3": "lsa_quiz", ...},
+        "descriptions": {"lsa_quiz": "LSA 知識大考驗", ...}
+    }
+    """
+    totals: Dict[int, str] = {}
+    for key, event in spec.get("totals", {}).items():
+        try:
+            total = int(key)
+        except ValueError:
+            raise DiceModeError(f"{spec.get('mode')}: 點數 {key!r} 不是整數")
+        if not 2 <= total <= 12:
+            raise DiceModeError(f"{spec.get('mode')}: 點數 {total} 超出範圍 2~12")
+        totals[total] = event
+
+    double_event: Optional[str] = spec.get("double_event")
+
+    outcomes: List[Dict[str, Any]] = []
+    for dice1 in range(1, 7):
+        for dice2 in range(1, 7):
+            total = dice1 + dice2
+            is_double = dice1 == dice2
+            if is_double and double_event:
+                event = double_event
+            else:
+                event = totals.get(total, UNKNOWN_EVENT)
+            outcomes.append({
+                "total": total,
+                "is_double": is_double,
+                "event": event,
+                "description": descriptions.get(event, UNKNOWN_DESCRIPTION),
+            })
+    return outcomes
+
 
 class DiceEngine:
     """骰子事件引擎"""
 
-    # 闔家歡模式事件映射
-    FAMILY_EVENTS = {
-        3: "lsa_quiz",        # LSA 問答
-        5: "lsa_quiz",        # LSA 問答
-        4: "random_drink",    # 隨機加酒
-        8: "random_drink",    # 隨機加酒
-        6: "rock_paper",      # 黑白切
-        7: "choose_drink",    # 選擇顏色
-        9: "drink_reset",     # 喝酒重置
-        10: "truth_dare",     # 真心話大冒險
-        11: "truth_dare",     # 真心話大冒險
-    }
+    # 模式 -> 36 格結果表
+    _outcomes: Dict[str, List[Dict[str, Any]]] = {}
 
-    # 酒鬼模式事件映射
-    ALCOHOLIC_EVENTS = {
-        3: "never_have_i",    # 我有你沒有
-        5: "arm_wrestling",   # 掰手腕
-        4: "random_drink",    # 隨機加酒
-        8: "random_drink",    # 隨機加酒
-        6: "rock_paper",      # 黑白切
-        7: "choose_drink",    # 選擇顏色
-        9: "dragon_gate",     # 射龍門
-        10: "truth_dare",     # 真心話大冒險
-        11: "truth_dare",     # 真心話大冒險
-    }
+    # 事件描述（所有已註冊模式合併）
+    EVENT_DESCRIPTIONS: Dict[str, str] = {}
 
-    # 事件描述
-    EVENT_DESCRIPTIONS = {
-        "lsa_quiz": "LSA 知識大考驗",
-        "random_drink": "電腦隨機加一種酒",
-        "rock_paper": "黑白切對決",
-        "choose_drink": "選擇加入的酒色",
-        "drink_reset": "喝酒囉！積分+1，換新基底",
-        "drink_penalty": "擲出對子！罰喝一杯",
-        "truth_dare": "真心話大冒險",
-        "never_have_i": "我有你沒有",
-        "arm_wrestling": "掰手腕對決",
-        "dragon_gate": "射龍門",
-    }
+    @classmethod
+    def register_mode(cls, spec: Dict[str, Any]):
+        """註冊（或覆蓋）一個遊戲模式"""
+        mode = spec.get("mode")
+        if not mode or not isinstance(mode, str):
+            raise DiceModeError("骰子模式設定需要 mode 名稱")
+        if not isinstance(spec.get("totals"), dict):
+            raise DiceModeError(f"{mode}: 需要 totals 設定")
+
+        descriptions = {**cls.EVENT_DESCRIPTIONS, **spec.get("descriptions", {})}
+        outcomes = compile_outcomes(spec, descriptions)
+        cls.EVENT_DESCRIPTIONS.update(spec.get("descriptions", {}))
+        cls._outcomes[mode] = outcomes
+
+    @classmethod
+    def load_modes(cls, directory: Path = DICE_MODES_DIR):
+        """載入資料夾中所有模式設定檔（依檔名排序）"""
+        for path in sorted(Path(directory).glob("*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                try:
+                    spec = json.load(f)
+                except json.JSONDecodeError as e:
+                    raise DiceModeError(f"{path.name}: 不是合法的 JSON: {e}") from e
+            cls.register_mode(spec)
+
+    @classmethod
+    def modes(cls) -> List[str]:
+        return list(cls._outcomes)
+
+    @classmethod
+    def _table(cls, mode: Union[GameMode, str]) -> List[Dict[str, Any]]:
+        key = _mode_key(mode)
+        if key not in cls._outcomes:
+            raise DiceModeError(f"未註冊的遊戲模式: {key}")
+        return cls._outcomes[key]
 
     @staticmethod
     def roll(mode: GameMode) -> dict:
@@ -59,33 +122,29 @@ class DiceEngine:
         Returns:
             包含骰子結果和事件的字典
         """
-        dice1 = random.randint(1, 6)
-        dice2 = random.randint(1, 6)
-        total = dice1 + dice2
-        is_double = dice1 == dice2
-
-        # 判斷事件類型
-        if is_double:
-            # 對子的特殊處理
-            event = "drink_reset" if mode == GameMode.FAMILY else "drink_penalty"
-        else:
-            # 根據模式選擇事件映射表
-            events = DiceEngine.FAMILY_EVENTS if mode == GameMode.FAMILY else DiceEngine.ALCOHOLIC_EVENTS
-            event = events.get(total, "unknown")
-
-        # 獲取事件描述
-        description = DiceEngine.EVENT_DESCRIPTIONS.get(event, "未知事件")
-
-        return {
-            "dice1": dice1,
-            "dice2": dice2,
-            "total": total,
-            "is_double": is_double,
-            "event": event,
-            "description": description
-        }
+        table = DiceEngine._table(mode)
+        index = random.randrange(36)
+        return {"dice1": index // 6 + 1, "dice2": index % 6 + 1, **table[index]}
+
+    @staticmethod
+    def roll_many(mode: GameMode, n: int) -> List[dict]:
+        """
+        一次擲 n 次（模擬 / 統計用）
+
+        Returns:
+            與 roll() 相同格式的結果列表
+        """
+        table = DiceEngine._table(mode)
+        return [
+            {"dice1": index // 6 + 1, "dice2": index % 6 + 1, **table[index]}
+            for index in random.choices(range(36), k=n)
+        ]
 
     @staticmethod
     def get_event_description(event: str) -> str:
         """獲取事件描述"""
-        return DiceEngine.EVENT_DESCRIPTIONS.get(event, "未知事件")
+        return DiceEngine.EVENT_DESCRIPTIONS.get(event, UNKNOWN_DESCRIPTION)
+
+
+# 啟動時載入所有模式
+DiceEngine.load_modes()
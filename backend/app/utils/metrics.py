@@ -0,0 +1,69 @@
+"""
+Prometheus 指標
+
+每個路由的延遲直方圖、狀態碼計數與進行中請求數，由 /metrics 輸出
+"""
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from starlette.responses import Response
+
+# 延遲分桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# 沒有對到任何路由的請求統一成一個標籤，避免標籤數量爆炸
+UNMATCHED_ROUTE = "<unmatched>"
+
+registry = CollectorRegistry()
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP 請求處理時間（秒）",
+    ["method", "route"], buckets=LATENCY_BUCKETS, registry=registry,
+)
+REQUESTS = Counter(
+    "http_requests", "HTTP 請求數（依狀態碼）",
+    ["method", "route", "status"], registry=registry,
+)
+# 進行中的請求在路由比對之前就開始計，所以只分 method
+IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "處理中的 HTTP 請求數",
+    ["method"], registry=registry,
+)
+
+
+class PrometheusMiddleware:
+    """純 ASGI middleware；路由標籤使用路由樣板而不是實際網址"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        in_progress = IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            route_path = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            REQUEST_LATENCY.labels(method, route_path).observe(elapsed)
+            REQUESTS.labels(method, route_path, str(status)).inc()
+
+
+def metrics_response() -> Response:
+    """Prometheus 文字格式的 /metrics 回應"""
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,71 @@
+import heapq
+import itertools
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class DeadlineHeap:
+    """
+    到期時間 min-heap（心跳逾時用）
+
+    - touch(key, deadline)：更新到期時間；延後時只改 dict，O(1)，不碰 heap
+    - pop_due(now)：取出真正到期的 key；heap 裡的舊時間點被取出時，
+      若 dict 中的到期時間已經延後就重新放回去（lazy 更新）
+    - discard(key)：移除；heap 中殘留的項目取出時直接略過
+
+    所以每位玩家在 heap 裡最多只有一筆有效項目，心跳再頻繁也不會讓 heap 變大；
+    心跳晚到（超過到期時間但還沒被取出）也會以新的時間為準。
+    不是執行緒安全的，呼叫端需自行持鎖（房間鎖）。
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._deadlines: Dict[Hashable, float] = {}
+        self._seq = itertools.count()
+
+    def touch(self, key: Hashable, deadline: float):
+        current = self._deadlines.get(key)
+        self._deadlines[key] = deadline
+        # 新的 key 或到期時間提前：需要一筆更早的 heap 項目
+        if current is None or deadline < current:
+            heapq.heappush(self._heap, (deadline, next(self._seq), key))
+
+    def discard(self, key: Hashable):
+        self._deadlines.pop(key, None)
+
+    def deadline(self, key: Hashable) -> Optional[float]:
+        return self._deadlines.get(key)
+
+    def next_deadline(self) -> Optional[float]:
+        """最早可能到期的時間（可能是已延後的舊項目，只會偏早不會偏晚）"""
+        while self._heap and self._heap[0][2] not in self._deadlines:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float) -> List[Hashable]:
+        """取出所有 deadline <= now 的 key（依到期順序）"""
+        due: List[Hashable] = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            current = self._deadlines.get(key)
+            if current is None:
+                continue  # 已移除
+            if current > deadline:
+                if current > now:
+                    # 期間內有心跳：以新的到期時間重新排入
+                    heapq.heappush(self._heap, (current, next(self._seq), key))
+                    continue
+            elif current < deadline:
+                continue  # 有更早的項目在 heap 裡，這筆是多餘的
+            del self._deadlines[key]
+            due.append(key)
+        return due
+
+    def clear(self):
+        self._heap.clear()
+        self._deadlines.clear()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
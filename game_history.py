@@ -0,0 +1,255 @@
+import json
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from log_config import get_logger
+from state_sync import apply_merge_patch, make_merge_patch
+
+logger = get_logger("room")
+
+# =========================
+# 遊戲紀錄設定
+# =========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每一局一個 NDJSON 檔：<房號>-<開始時間>-<亂數>.ndjson
+# GAME_HISTORY_DIR= （空字串）可以關閉
+HISTORY_DIR = os.getenv("GAME_HISTORY_DIR", os.path.join(BASE_DIR, "data", "games"))
+
+# 最多保留幾局（超過時刪掉最舊的）
+HISTORY_KEEP = 500
+
+# 會讓這一局結束（關檔）的事件
+CLOSING_EVENTS = ("game_end", "reset")
+
+_GAME_ID_RE = re.compile(r"^[A-Z0-9]+-\d{8}-\d{6}-[0-9a-f]{6}$")
+
+_STOP = object()
+
+
+def new_game_id(room_code: str) -> str:
+    return f"{room_code}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def is_valid_game_id(game_id: str) -> bool:
+    """只接受 new_game_id 產生的格式（避免路徑跳脫）"""
+    return bool(_GAME_ID_RE.match(game_id))
+
+
+class GameHistory:
+    """
+    每局遊戲的事件紀錄（event sourcing）
+
+    檔案格式（一行一筆）：
+        {"seq": 1, "ts": ..., "type": "roll", "data": {...}, "v": 12, "patch": {...}}
+    - 同一次房間變更中的多個事件，只有最後一筆帶 patch（那次變更造成的狀態差異）
+    - 每局第一筆（或重啟後第一筆）帶完整 "state" 而不是 patch
+    - 重播到第 N 筆 = 依序套用第 1..N 筆的 state / patch
+
+    record() 只把事件丟進佇列；計算 patch 與寫檔都在背景執行緒
+    """
+
+    def __init__(self, directory: Optional[str] = HISTORY_DIR, keep: int = HISTORY_KEEP):
+        self.directory = directory or None
+        self.keep = keep
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._flushed = threading.Condition()
+        self._submitted = 0
+        self._written = 0
+
+        # 以下只在背景執行緒使用
+        self._files: Dict[str, Any] = {}
+        self._states: Dict[str, Dict[str, Any]] = {}
+        self._seq: Dict[str, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def path(self, game_id: str) -> str:
+        return os.path.join(self.directory, f"{game_id}.ndjson")
+
+    # =========================
+    # 對外 API
+    # =========================
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="game-history", daemon=True)
+        self._thread.start()
+
+    def record(self, events: List[Tuple[str, float, str, Dict[str, Any]]], version: int, state: Dict[str, Any]):
+        """
+        events: [(game_id, 時間, 事件種類, 資料), ...]（同一次房間變更）
+        state: 變更後的完整房間狀態（新建立的物件）
+        """
+        if self._thread is None or not events:
+            return
+        with self._flushed:
+            self._submitted += 1
+        self._queue.put((events, version, state))
+
+    def flush(self, timeout: float = 2.0) -> bool:
+        """等背景執行緒把目前為止送出的事件都寫進檔案"""
+        if self._thread is None:
+            return True
+        with self._flushed:
+            target = self._submitted
+            return self._flushed.wait_for(lambda: self._written >= target, timeout)
+
+    def close(self):
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def list_games(self, room_code: Optional[str] = None) -> List[Dict[str, Any]]:
+        """列出紀錄（新的在前）"""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return []
+        prefix = f"{room_code}-" if room_code else ""
+        games = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".ndjson") or not name.startswith(prefix):
+                continue
+            game_id = name[: -len(".ndjson")]
+            stat = os.stat(os.path.join(self.directory, name))
+            games.append({"game_id": game_id, "size": stat.st_size, "updated_at": stat.st_mtime})
+        games.sort(key=lambda g: g["game_id"].split("-", 1)[1], reverse=True)
+        return games
+
+    def iter_lines(self, game_id: str, chunk_size: int = 64 * 1024) -> Iterator[bytes]:
+        """逐段讀出原始 NDJSON（匯出用，不會一次載入整個檔案）"""
+        with open(self.path(game_id), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def iter_events(self, game_id: str) -> Iterator[Dict[str, Any]]:
+        with open(self.path(game_id), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    break  # 最後一行寫到一半
+
+    def replay(self, game_id: str, seq: Optional[int] = None) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]], int]:
+        """
+        重播到第 seq 筆（None = 最後一筆）
+        回傳 (當時的事件, 當時的房間狀態, 版本)；逐行讀取，記憶體只保留目前狀態
+        同一次變更中較前面的事件沒有自己的狀態，會算到那次變更結束為止
+        """
+        state: Optional[Dict[str, Any]] = None
+        version = 0
+        event = None
+        for entry in self.iter_events(game_id):
+            reached = event is not None and seq is not None and event["seq"] >= seq
+            if reached and "v" in event:
+                break
+            if "state" in entry:
+                state = entry["state"]
+            elif "patch" in entry and state is not None:
+                state = apply_merge_patch(state, entry["patch"])
+            version = entry.get("v", version)
+            if not reached:
+                event = entry
+            elif "v" in entry:
+                break  # 那次變更的最後一筆已經套用
+        return event, state, version
+
+    # =========================
+    # 背景寫入
+    # =========================
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            written = 0
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                    continue
+                try:
+                    self._write(*item)
+                except OSError:
+                    logger.exception("遊戲紀錄寫入失敗")
+                written += 1
+
+            for f in self._files.values():
+                f.flush()
+            with self._flushed:
+                self._written += written
+                self._flushed.notify_all()
+
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _open(self, game_id: str):
+        f = self._files.get(game_id)
+        if f is None:
+            path = self.path(game_id)
+            if game_id not in self._seq:
+                # 重啟後接著寫：序號從檔案現有的行數繼續
+                count = 0
+                if os.path.exists(path):
+                    with open(path, "rb") as existing:
+                        count = sum(1 for _ in existing)
+                self._seq[game_id] = count
+            f = open(path, "a", encoding="utf-8")
+            self._files[game_id] = f
+        return f
+
+    def _write(self, events: List[Tuple[str, float, str, Dict[str, Any]]], version: int, state: Dict[str, Any]):
+        # 同一批事件的最後一筆（同一局）帶狀態差異
+        last_index = {game_id: i for i, (game_id, _, _, _) in enumerate(events)}
+        for i, (game_id, ts, event_type, data) in enumerate(events):
+            f = self._open(game_id)
+            self._seq[game_id] += 1
+            entry: Dict[str, Any] = {"seq": self._seq[game_id], "ts": round(ts, 3), "type": event_type, "data": data}
+            if last_index[game_id] == i:
+                entry["v"] = version
+                previous = self._states.get(game_id)
+                if previous is None:
+                    entry["state"] = state
+                else:
+                    entry["patch"] = make_merge_patch(previous, state)
+                self._states[game_id] = state
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+
+            if event_type in CLOSING_EVENTS:
+                self._finish(game_id)
+
+    def _finish(self, game_id: str):
+        f = self._files.pop(game_id, None)
+        if f is not None:
+            f.close()
+        self._states.pop(game_id, None)
+        self._seq.pop(game_id, None)
+        self._prune()
+
+    def _prune(self):
+        games = self.list_games()
+        for game in games[self.keep:]:
+            if game["game_id"] in self._files:
+                continue
+            try:
+                os.remove(self.path(game["game_id"]))
+            except FileNotFoundError:
+                pass
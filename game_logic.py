@@ -1,136 +1,326 @@
-import random
-from typing import Optional, Dict, Any
-
-# =========================
-# 遊戲模式常數
-# =========================
-FAMILY_MODE = "family"
-DRUNK_MODE = "drunk"
-
-# =========================
-# 可用幫浦（邏輯層只知道編號）
-# =========================
-AVAILABLE_PUMPS = [1, 2, 3, 4]
-
-# =========================
-# 遊戲規則（秒數）
-# =========================
-GAME_RULES = {
-    FAMILY_MODE: {
-        "game_start": 0.5,
-        "score": {
-            (4, 8): 0.4,
-            (7,): 0.6,
-        },
-        "after_drink": 0.7,
-    },
-    DRUNK_MODE: {
-        "game_start": 0.5,
-        "score": {
-            (4, 8): 0.6,
-            (7,): 0.7,
-        },
-        "after_drink": 0.7,
-    }
-}
-
-# =========================
-# 工具：隨機選一顆基底幫浦
-# =========================
-def choose_base_pump() -> int:
-    return random.choice(AVAILABLE_PUMPS)
-
-
-# =========================
-# 核心：純規則判斷
-# =========================
-def resolve_game_event(
-    mode: str,
-    event: str,
-    score: Optional[int] = None,
-    base_pump_id: Optional[int] = None
-) -> Dict[str, Any]:
-    """
-    純規則函式（不控制硬體）
-
-    參數：
-    - mode: 遊戲模式（family / drunk）
-    - event: 事件類型（game_start / score / after_drink）
-    - score: 點數（僅 score 事件需要）
-    - base_pump_id: 基底幫浦編號（1-4），如果未提供則隨機選擇
-
-    回傳格式：
-    {
-        success: bool,
-        pump_id: int | None,
-        duration: float | None,
-        message: str
-    }
-    """
-
-    # 檢查模式
-    if mode not in GAME_RULES:
-        return {
-            "success": False,
-            "pump_id": None,
-            "duration": None,
-            "message": "未知的遊戲模式"
-        }
-
-    rules = GAME_RULES[mode]
-
-    # 如果沒有提供 base_pump_id，隨機選擇一個（向下兼容）
-    if base_pump_id is None:
-        base_pump_id = choose_base_pump()
-
-    # ---------- 遊戲開始 ----------
-    if event == "game_start":
-        return {
-            "success": True,
-            "pump_id": base_pump_id,
-            "duration": rules["game_start"],
-            "message": "遊戲開始倒基底酒"
-        }
-
-    # ---------- 點數結算 ----------
-    if event == "score":
-        if score is None:
-            return {
-                "success": False,
-                "pump_id": None,
-                "duration": None,
-                "message": "score 事件需要提供點數"
-            }
-
-        for score_group, sec in rules["score"].items():
-            if score in score_group:
-                return {
-                    "success": True,
-                    "pump_id": base_pump_id,
-                    "duration": sec,
-                    "message": f"點數 {score} 觸發倒酒"
-                }
-
-        return {
-            "success": False,
-            "pump_id": None,
-            "duration": None,
-            "message": f"點數 {score} 不觸發倒酒"
-        }
-
-    # ---------- 喝完酒 ----------
-    if event == "after_drink":
-        return {
-            "success": True,
-            "pump_id": base_pump_id,
-            "duration": rules["after_drink"],
-            "message": "喝完酒後補基底"
-        }
-
-    # ---------- 未知事件 ----------
-    return {
-        "success": False,
-        "pump_id": None,
-        "duration": None,
-        "message": "未知的遊戲事件"
-    }
+import json
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+from log_config import get_logger
+from pump_selection import PumpSelector
+
+logger = get_logger("rules")
+
+# =========================
+# 遊戲模式常數
+# =========================
+FAMILY_MODE = "family"
+DRUNK_MODE = "drunk"
+
+# =========================
+# 可用幫浦（邏輯層只知道編號）
+# =========================
+AVAILABLE_PUMPS = [1, 2, 3, 4]
+
+# =========================
+# 遊戲規則（ml）
+# 實際出水秒數由 PumpController 依各幫浦校正值換算
+# 規則檔不存在時使用這份內建預設值
+# =========================
+GAME_RULES = {
+    FAMILY_MODE: {
+        "game_start": 12.5,
+        "score": {
+            (4, 8): 10.0,
+            (7,): 15.0,
+        },
+        "after_drink": 17.5,
+    },
+    DRUNK_MODE: {
+        "game_start": 12.5,
+        "score": {
+            (4, 8): 15.0,
+            (7,): 17.5,
+        },
+        "after_drink": 17.5,
+    }
+}
+
+# =========================
+# 規則檔設定
+# =========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RULES_FILE = os.getenv("GAME_RULES_FILE", os.path.join(BASE_DIR, "data", "game_rules.json"))
+
+# 最多多久檢查一次規則檔有沒有被修改（秒）
+RULES_RELOAD_INTERVAL = 1.0
+
+# 事件種類（查表用的索引）
+GAME_EVENTS = ("game_start", "score", "after_drink")
+EVENT_INDEX = {event: i for i, event in enumerate(GAME_EVENTS)}
+
+# 兩顆骰子的點數範圍
+MIN_SCORE = 2
+MAX_SCORE = 12
+
+# 單次倒酒上限（ml），避免規則檔打錯字倒出一整杯
+MAX_POUR_ML = 100.0
+
+EVENT_MESSAGES = {
+    "game_start": "遊戲開始倒基底酒",
+    "after_drink": "喝完酒後補基底",
+}
+
+
+class RuleValidationError(ValueError):
+    """規則檔格式或內容不正確"""
+
+
+def _check_volume(value: Any, where: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise RuleValidationError(f"{where}: 出酒量必須是數字")
+    if not 0 < value <= MAX_POUR_ML:
+        raise RuleValidationError(f"{where}: 出酒量必須介於 0 ~ {MAX_POUR_ML} ml")
+    return float(value)
+
+
+def rules_from_json(data: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    把規則檔內容轉成與 GAME_RULES 相同的結構（並驗證）
+
+    規則檔格式：
+    {
+        "modes": {
+            "family": {
+                "game_start": 12.5,
+                "after_drink": 17.5,
+                "score": [{"scores": [4, 8], "volume_ml": 10.0}, ...]
+            }
+        }
+    }
+    """
+    modes = data.get("modes") if isinstance(data, dict) else None
+    if not isinstance(modes, dict) or not modes:
+        raise RuleValidationError("規則檔需要非空的 modes")
+
+    rules: Dict[str, Dict[str, Any]] = {}
+    for mode, mode_rules in modes.items():
+        if not isinstance(mode_rules, dict):
+            raise RuleValidationError(f"{mode}: 規則必須是物件")
+        unknown = set(mode_rules) - set(GAME_EVENTS)
+        if unknown:
+            raise RuleValidationError(f"{mode}: 未知的事件 {sorted(unknown)}")
+
+        score_groups = mode_rules.get("score", [])
+        if not isinstance(score_groups, list):
+            raise RuleValidationError(f"{mode}.score: 必須是陣列")
+        score_rules: Dict[Tuple[int, ...], float] = {}
+        for i, group in enumerate(score_groups):
+            where = f"{mode}.score[{i}]"
+            if not isinstance(group, dict) or not isinstance(group.get("scores"), list) or not group["scores"]:
+                raise RuleValidationError(f"{where}: 需要非空的 scores 陣列")
+            scores = group["scores"]
+            if any(isinstance(s, bool) or not isinstance(s, int) for s in scores):
+                raise RuleValidationError(f"{where}: scores 必須是整數")
+            score_rules[tuple(scores)] = _check_volume(group.get("volume_ml"), where)
+
+        rules[mode] = {"score": score_rules}
+        for event in ("game_start", "after_drink"):
+            if event in mode_rules:
+                rules[mode][event] = _check_volume(mode_rules[event], f"{mode}.{event}")
+    return rules
+
+
+class CompiledRules:
+    """
+    預先展開的規則表
+
+    table[mode][event_index][score] -> 出酒量（ml）或 None（不倒）
+    非 score 事件只用 score=0 那一格；查詢不管有幾組點數都是固定成本
+    """
+
+    def __init__(self, rules: Dict[str, Dict[str, Any]], source: str = "builtin"):
+        self.source = source
+        self.loaded_at = time.time()
+        self.rules = rules
+        self.table: Dict[str, List[List[Optional[float]]]] = {}
+
+        for mode, mode_rules in rules.items():
+            rows: List[List[Optional[float]]] = [[None] * (MAX_SCORE + 1) for _ in GAME_EVENTS]
+            for event in ("game_start", "after_drink"):
+                if mode_rules.get(event) is not None:
+                    rows[EVENT_INDEX[event]][0] = float(mode_rules[event])
+
+            score_row = rows[EVENT_INDEX["score"]]
+            for scores, volume_ml in mode_rules.get("score", {}).items():
+                for score in scores:
+                    if not MIN_SCORE <= score <= MAX_SCORE:
+                        raise RuleValidationError(f"{mode}: 點數 {score} 超出範圍 {MIN_SCORE}~{MAX_SCORE}")
+                    if score_row[score] is not None:
+                        raise RuleValidationError(f"{mode}: 點數 {score} 重複設定")
+                    score_row[score] = float(volume_ml)
+            self.table[mode] = rows
+
+    def lookup(self, mode: str, event: str, score: Optional[int] = None) -> Optional[float]:
+        rows = self.table[mode]
+        row = rows[EVENT_INDEX[event]]
+        if event != "score":
+            return row[0]
+        if score is None or not MIN_SCORE <= score <= MAX_SCORE:
+            return None
+        return row[score]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "modes": {
+                mode: {
+                    "game_start": mode_rules.get("game_start"),
+                    "after_drink": mode_rules.get("after_drink"),
+                    "score": [
+                        {"scores": list(scores), "volume_ml": volume_ml}
+                        for scores, volume_ml in mode_rules.get("score", {}).items()
+                    ],
+                }
+                for mode, mode_rules in self.rules.items()
+            },
+        }
+
+
+class RuleBook:
+    """
+    目前生效的規則（支援熱更新）
+
+    - 啟動時載入並驗證規則檔；檔案不存在就用內建的 GAME_RULES，格式錯誤直接報錯
+    - 之後每次查詢最多每 RULES_RELOAD_INTERVAL 秒檢查一次檔案 mtime，
+      有變就重新載入；新檔案驗證失敗時保留舊規則並記錄錯誤
+    """
+
+    def __init__(self, path: Optional[str] = RULES_FILE, reload_interval: float = RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        self._compiled = self._load()
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime if self.path else None
+        except FileNotFoundError:
+            return None
+
+    def _load(self) -> CompiledRules:
+        mtime = self._file_mtime()
+        self._mtime = mtime
+        self._checked_at = time.monotonic()
+        if mtime is None:
+            return CompiledRules(GAME_RULES)
+        with open(self.path, "r", encoding="utf-8") as f:
+            try:
+                data = json.load(f)
+            except json.JSONDecodeError as e:
+                raise RuleValidationError(f"規則檔不是合法的 JSON: {e}") from e
+        return CompiledRules(rules_from_json(data), source=self.path)
+
+    def current(self) -> CompiledRules:
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return self._compiled
+
+        with self._lock:
+            if now - self._checked_at < self.reload_interval:
+                return self._compiled
+            self._checked_at = now
+            if self._file_mtime() == self._mtime:
+                return self._compiled
+            try:
+                self._compiled = self._load()
+                logger.info("遊戲規則已重新載入: %s", self._compiled.source)
+            except (OSError, RuleValidationError) as e:
+                # 檔案改壞了：保留舊規則，等下次修改再試
+                self._mtime = self._file_mtime()
+                logger.error("遊戲規則重新載入失敗，沿用舊規則: %s", e)
+        return self._compiled
+
+
+# 全域實例（啟動時驗證規則檔）
+rule_book = RuleBook()
+
+
+# =========================
+# 工具：選一顆基底幫浦
+# 策略可替換（random / least_run_time / most_remaining / weighted），
+# main.py 啟動時綁定酒瓶用量；沒綁定時等同隨機
+# =========================
+pump_selector = PumpSelector(AVAILABLE_PUMPS)
+
+def choose_base_pump(exclude: Optional[int] = None) -> int:
+    """依目前策略選一顆基底幫浦（exclude：避免連續選到同一顆）"""
+    return pump_selector.choose(exclude)
+
+
+# =========================
+# 核心：純規則判斷
+# =========================
+def resolve_game_event(
+    mode: str,
+    event: str,
+    score: Optional[int] = None,
+    base_pump_id: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    純規則函式（不控制硬體）
+
+    參數：
+    - mode: 遊戲模式（family / drunk）
+    - event: 事件類型（game_start / score / after_drink）
+    - score: 點數（僅 score 事件需要）
+    - base_pump_id: 基底幫浦編號（1-4），如果未提供則隨機選擇
+
+    回傳格式：
+    {
+        success: bool,
+        pump_id: int | None,
+        volume_ml: float | None,
+        message: str
+    }
+    """
+    rules = rule_book.current()
+
+    # 檢查模式
+    if mode not in rules.table:
+        return _no_pour("未知的遊戲模式")
+
+    # ---------- 未知事件 ----------
+    if event not in EVENT_INDEX:
+        return _no_pour("未知的遊戲事件")
+
+    # ---------- 點數結算 ----------
+    if event == "score" and score is None:
+        return _no_pour("score 事件需要提供點數")
+
+    volume_ml = rules.lookup(mode, event, score)
+    if volume_ml is None:
+        if event == "score":
+            return _no_pour(f"點數 {score} 不觸發倒酒")
+        return _no_pour("此模式沒有設定這個事件")
+
+    # 如果沒有提供 base_pump_id，依幫浦選擇策略挑一個（向下兼容）
+    if base_pump_id is None:
+        base_pump_id = choose_base_pump()
+
+    return {
+        "success": True,
+        "pump_id": base_pump_id,
+        "volume_ml": volume_ml,
+        "message": f"點數 {score} 觸發倒酒" if event == "score" else EVENT_MESSAGES[event]
+    }
+
+
+def _no_pour(message: str) -> Dict[str, Any]:
+    return {
+        "success": False,
+        "pump_id": None,
+        "volume_ml": None,
+        "message": message
+    }
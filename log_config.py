@@ -0,0 +1,167 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+# =========================
+# 子系統
+# =========================
+# 每個子系統一個 logger：cheers.room / cheers.wheel / cheers.pump / cheers.rules
+ROOT_LOGGER = "cheers"
+SUBSYSTEMS = ("room", "wheel", "pump", "rules")
+
+# =========================
+# 環境變數設定
+# =========================
+# LOG_LEVEL=INFO               全域等級
+# LOG_LEVEL_ROOM=WARNING       個別子系統等級（ROOM / WHEEL / PUMP / RULES）
+# LOG_SAMPLE_ROOM=0.1          只保留 10% 的 DEBUG / INFO（WARNING 以上一律保留）
+# LOG_FORMAT=json              一行一個 JSON（預設為文字）
+DEFAULT_LEVEL = "INFO"
+
+# 背景寫入佇列上限；滿了就丟棄並計數，絕不讓請求等待寫 log
+LOG_QUEUE_SIZE = 10000
+
+# LogRecord 內建欄位（其他欄位視為 extra 結構化資料）
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+def get_logger(subsystem: str) -> logging.Logger:
+    """取得子系統 logger（room / wheel / pump / rules）"""
+    return logging.getLogger(f"{ROOT_LOGGER}.{subsystem}")
+
+
+def _extras(record: logging.LogRecord) -> Dict[str, Any]:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_FIELDS}
+
+
+class SamplingFilter(logging.Filter):
+    """只保留 rate 比例的 DEBUG / INFO 紀錄（WARNING 以上一律保留）"""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    把紀錄丟進佇列就返回，訊息在背景執行緒才格式化
+
+    呼叫端用 logger.info("... %s", value) 的延遲格式化寫法；
+    參數要傳不可變的值（例如 tuple(list)），因為真正格式化時房間狀態可能已經改變
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # 例外的 traceback 只能在當下展開，其餘留給背景執行緒
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class TextFormatter(logging.Formatter):
+    """時間 等級 logger 訊息 key=value ..."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        extras = _extras(record)
+        if extras:
+            line += " " + " ".join(f"{key}={value}" for key, value in extras.items())
+        return line
+
+
+class JSONFormatter(logging.Formatter):
+    """一行一個 JSON 物件（給 docker log driver / log 收集器用）"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **_extras(record),
+        }
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[NonBlockingQueueHandler] = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(env: Optional[Dict[str, str]] = None) -> NonBlockingQueueHandler:
+    """
+    設定全域 logging：所有紀錄經由佇列交給背景執行緒寫到 stderr
+    可以重複呼叫（只會設定一次）
+    """
+    global _listener, _handler
+    env = os.environ if env is None else env
+
+    with _setup_lock:
+        if _handler is not None:
+            return _handler
+
+        output = logging.StreamHandler(sys.stderr)
+        output.setFormatter(JSONFormatter() if env.get("LOG_FORMAT", "").lower() == "json" else TextFormatter())
+
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+        _handler = NonBlockingQueueHandler(log_queue)
+        _listener = QueueListener(log_queue, output, respect_handler_level=False)
+
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(_handler)
+        root.setLevel(env.get("LOG_LEVEL", DEFAULT_LEVEL).upper())
+
+        for subsystem in SUBSYSTEMS:
+            logger = get_logger(subsystem)
+            level = env.get(f"LOG_LEVEL_{subsystem.upper()}")
+            if level:
+                logger.setLevel(level.upper())
+            rate = env.get(f"LOG_SAMPLE_{subsystem.upper()}")
+            if rate is not None and float(rate) < 1.0:
+                logger.addFilter(SamplingFilter(float(rate)))
+
+        _listener.start()
+        return _handler
+
+
+def shutdown_logging():
+    """停止背景執行緒並寫完佇列中剩下的紀錄"""
+    global _listener, _handler
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+        if _handler is not None:
+            logging.getLogger().removeHandler(_handler)
+        _listener = None
+        _handler = None
+
+
+def dropped_count() -> int:
+    """佇列滿了被丟棄的紀錄數"""
+    return _handler.dropped if _handler is not None else 0
@@ -1,21 +1,55 @@
-from fastapi import FastAPI, HTTPException, Response, Cookie
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request, Response, Cookie, Depends, Query, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Callable
+from contextlib import contextmanager
+import copy
+import functools
 import os
+import asyncio
+import threading
+import time
 import uvicorn
 import random
 import uuid
 from datetime import datetime, timedelta
+from log_config import setup_logging, shutdown_logging, get_logger
+
+# 先設定 logging（背景執行緒寫出），之後 import 的模組初始化時的紀錄才不會遺失
+setup_logging()
+
 import db  # 引入 db.py
-from pump_controller import pump_controller
-from game_logic import resolve_game_event
+from pump_hardware import pump_hardware
+from pump_executor import PumpExecutor, PourJob
+from pump_calibration import PumpCalibration, fit_calibration
+from pump_selection import POLICIES
+from recipe_engine import COLOR_PUMPS, build_pour_plan, recipe_to_ingredients, stack_to_ingredients
+from game_logic import choose_base_pump, pump_selector, resolve_game_event, rule_book
+from room_registry import RoomRegistry, DEFAULT_ROOM_CODE, ROOM_SWEEP_INTERVAL
+from room_events import RoomBroadcaster, RoomSubscriber
+from state_sync import StateHistory
+from deadline_heap import DeadlineHeap
+from waiting_queue import WaitingQueue
+from room_journal import RoomJournal, RESTORE_BUDGET_MS
+from game_history import GameHistory, new_game_id, is_valid_game_id
+from metrics import CollectorRegistry, GameCollector, HTTPMetrics, PrometheusMiddleware, metrics_response
 
 app=FastAPI() # API物件
 
+room_log = get_logger("room")
+wheel_log = get_logger("wheel")
+pump_log = get_logger("pump")
+
 # === 遊戲房間管理 ===
+
+# 超過多久（秒）沒有心跳的玩家會被移除（避免誤踢，設得比較寬鬆）
+PLAYER_HEARTBEAT_TIMEOUT = 600
+
+# 背景逾時檢查最長間隔（秒）；實際會睡到最早到期的時間點
+PLAYER_EXPIRY_INTERVAL = 5.0
+
 class Player:
     def __init__(self, player_id: str, player_name: str):
         self.player_id = player_id
@@ -23,8 +57,33 @@ class Player:
         self.joined_at = datetime.now()
         self.last_heartbeat = datetime.now()
 
+def mutator(method):
+    """標記會改變房間狀態的方法：執行完畢後通知訂閱者"""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.mutate():
+            return method(self, *args, **kwargs)
+    return wrapper
+
 class GameRoom:
-    def __init__(self):
+    def __init__(self, room_code: str = DEFAULT_ROOM_CODE):
+        self.room_code = room_code  # 房號
+        self.lock = threading.RLock()  # 每個房間各自一把鎖，不同桌互不干擾
+        self.last_active = time.monotonic()  # 最後一次被存取的時間（閒置回收用）
+
+        # 狀態版本：每次 mutator 執行完就 +1（ETag / 條件式輪詢用）
+        self.epoch = uuid.uuid4().hex[:8]  # 房間實例識別，避免重啟或重建房間後版本號撞號
+        self.version = 0
+
+        # 狀態變更通知（WebSocket 推播等）
+        self.listeners: List[Callable[["GameRoom"], None]] = []
+        self._mutation_depth = 0
+        self._fingerprint_before: Optional[tuple] = None  # 最外層 mutate 區塊開始時的狀態
+
+        # 這一局的事件紀錄（mutate 區塊內累積，由 listener 取走寫入 GameHistory）
+        self.game_id: Optional[str] = None  # 開始遊戲時產生，結束 / 重置後清掉
+        self.pending_events: List[tuple] = []
+
         self.players: dict[str, Player] = {}  # player_id -> Player
         self.host_id: Optional[str] = None
         self.game_started = False
@@ -33,7 +92,10 @@ class GameRoom:
         self.player_order: List[str] = []  # 轉盤抽出的順序
 
         # 排隊系統
-        self.waiting_queue: List[Player] = []  # 等待進入的玩家列表
+        self.waiting_queue = WaitingQueue()  # 等待進入的玩家（依 ID 查詢 / 移除 O(1)，查排名 O(log n)）
+
+        # 心跳逾時（遊戲中與排隊中的玩家都在裡面，由背景工作定期取出到期的玩家）
+        self.heartbeat_deadlines = DeadlineHeap()
 
         # 遊戲狀態
         self.current_turn_index = 0  # 當前輪到的玩家索引
@@ -58,20 +120,75 @@ class GameRoom:
         self.last_action = None  # 最後的動作（用於顯示訊息）
         self.current_opponent = None  # 當前對手名字（用於黑白切/對決）
         self.wine_stack: List[str] = []  # 加入的酒堆疊 (顏色列表)
+        self.last_pour: Optional[Dict[str, Any]] = None  # 最近一次倒酒工作的狀態（非同步執行）
+        self.reservoir_alerts: List[Dict[str, Any]] = []  # 快空 / 已空的酒瓶（整台機器共用，不持久化）
 
         # 積分管理
         self.player_scores: dict[str, int] = {}  # player_id -> score
 
+        # 最近幾個版本的狀態差異（?since= 增量同步用）
+        self.state_history = StateHistory(self.get_state())
+
+    @contextmanager
+    def mutate(self):
+        """
+        修改房間狀態的區塊：持有房間鎖，最外層區塊結束時若狀態真的有變（或有待寫入的事件）
+        才遞增版本並通知所有 listener（可巢狀使用；沒改到任何欄位的區塊不會讓 ETag 失效）
+        """
+        with self.lock:
+            if self._mutation_depth == 0:
+                self._fingerprint_before = self._fingerprint()
+            self._mutation_depth += 1
+            try:
+                yield self
+            finally:
+                self._mutation_depth -= 1
+                if self._mutation_depth == 0:
+                    before, self._fingerprint_before = self._fingerprint_before, None
+                    if self.pending_events or self._fingerprint() != before:
+                        self.version += 1
+                        self.state_history.record(self.version, self.get_state())
+                        for listener in self.listeners:
+                            listener(self)
+
+    def _fingerprint(self) -> tuple:
+        """判斷 mutate 區塊有沒有改到東西用：可持久化的完整狀態 + 不持久化的酒瓶警示"""
+        return self.to_snapshot(), list(self.reservoir_alerts)
+
+    def get_state_since(self, since: int, epoch: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        since 版本之後變動的欄位（JSON merge patch）
+        房間實例不同或落後太多（超出緩衝區）時回傳 None，呼叫端應改給完整快照
+        """
+        if epoch is not None and epoch != self.epoch:
+            return None
+        return self.state_history.since(since, self.version)
+
+    def log_event(self, event_type: str, **data):
+        """記錄遊戲事件（在 mutate 區塊內呼叫；沒有進行中的一局時忽略）"""
+        if self.game_id is not None:
+            self.pending_events.append((self.game_id, time.time(), event_type, data))
+
+    def take_events(self) -> List[tuple]:
+        events, self.pending_events = self.pending_events, []
+        return events
+
+    def etag(self, player_id: Optional[str] = None) -> str:
+        """目前狀態的 ETag（回應內含「我是誰」欄位，所以同一版本對不同玩家要不同）"""
+        return f'W/"{self.room_code}-{self.epoch}-{self.version}-{player_id or "-"}"'
+
+    @mutator
     def add_player(self, player_name: str) -> tuple[bool, str, str, str]:
         """加入玩家，返回 (成功, player_id, 訊息, 狀態)"""
         player_id = str(uuid.uuid4())
         player = Player(player_id, player_name)
+        self.heartbeat_deadlines.touch(player_id, time.monotonic() + PLAYER_HEARTBEAT_TIMEOUT)
 
         # 如果房間已滿，加入排隊列表
         if len(self.players) >= self.max_players:
             self.waiting_queue.append(player)
             queue_position = len(self.waiting_queue)
-            print(f"📝 玩家加入排隊: {player_name} (ID: {player_id}), 排隊位置: {queue_position}")
+            room_log.info("📝 玩家加入排隊: %s，排隊位置: %d", player_name, queue_position, extra={"room": self.room_code, "player_id": player_id})
             return True, player_id, f"房間已滿，你是第 {queue_position} 位排隊玩家", "in_queue"
 
         # 房間未滿，直接加入
@@ -84,11 +201,13 @@ class GameRoom:
         if self.host_id is None:
             self.host_id = player_id
 
-        print(f"✅ 玩家加入房間: {player_name} (ID: {player_id})")
+        room_log.info("✅ 玩家加入房間: %s", player_name, extra={"room": self.room_code, "player_id": player_id})
         return True, player_id, "成功加入房間", "in_game"
 
+    @mutator
     def remove_player(self, player_id: str):
         """移除玩家"""
+        self.heartbeat_deadlines.discard(player_id)
         # 檢查是否在遊戲中
         if player_id in self.players:
             player_name = self.players[player_id].player_name
@@ -98,7 +217,7 @@ class GameRoom:
             # 清除玩家積分
             if player_id in self.player_scores:
                 del self.player_scores[player_id]
-            print(f"👋 玩家離開: {player_name} (ID: {player_id})")
+            room_log.info("👋 玩家離開: %s", player_name, extra={"room": self.room_code, "player_id": player_id})
 
             # 如果房主離開，將房主轉移給下一個玩家
             if was_host:
@@ -106,62 +225,61 @@ class GameRoom:
                     new_host_id = next(iter(self.players.keys()))
                     self.host_id = new_host_id
                     new_host_name = self.players[new_host_id].player_name
-                    print(f"👑 房主轉移: {player_name} → {new_host_name} (ID: {new_host_id})")
+                    room_log.info("👑 房主轉移: %s → %s", player_name, new_host_name, extra={"room": self.room_code, "player_id": new_host_id})
                 else:
                     self.host_id = None
                     self.game_started = False
                     self.player_order = []
-                    print(f"🏠 房間清空，重置遊戲狀態")
+                    room_log.info("🏠 房間清空，重置遊戲狀態", extra={"room": self.room_code})
 
             # 如果有排隊玩家，提升第一個進入房間
             if self.waiting_queue:
-                next_player = self.waiting_queue.pop(0)
+                next_player = self.waiting_queue.popleft()
                 self.players[next_player.player_id] = next_player
                 # 初始化新玩家積分為 0
                 self.player_scores[next_player.player_id] = 0
-                print(f"⬆️ 排隊玩家進入房間: {next_player.player_name} (ID: {next_player.player_id})")
+                room_log.info("⬆️ 排隊玩家進入房間: %s", next_player.player_name, extra={"room": self.room_code, "player_id": next_player.player_id})
 
         # 檢查是否在排隊列表中
         else:
-            self.waiting_queue = [p for p in self.waiting_queue if p.player_id != player_id]
-            print(f"📝 玩家離開排隊: (ID: {player_id})")
+            self.waiting_queue.remove(player_id)
+            room_log.info("📝 玩家離開排隊", extra={"room": self.room_code, "player_id": player_id})
 
     def update_heartbeat(self, player_id: str):
-        """更新玩家心跳"""
-        if player_id in self.players:
-            self.players[player_id].last_heartbeat = datetime.now()
-        else:
-            # 更新排隊中玩家的心跳
-            for player in self.waiting_queue:
-                if player.player_id == player_id:
-                    player.last_heartbeat = datetime.now()
-                    break
-
-    def remove_inactive_players(self):
-        """移除超過10分鐘沒有心跳的玩家（避免誤踢）"""
-        now = datetime.now()
-
-        # 清理遊戲中的不活躍玩家
-        inactive_players = [
-            pid for pid, player in self.players.items()
-            if (now - player.last_heartbeat).total_seconds() > 600  # 10 分鐘 = 600 秒
-        ]
-        for pid in inactive_players:
-            player = self.players.get(pid)
-            if player:
-                print(f"⚠️ 移除不活躍玩家: {player.player_name} (ID: {pid})")
-                self.remove_player(pid)
-
-        # 清理排隊中的不活躍玩家
-        self.waiting_queue = [
-            player for player in self.waiting_queue
-            if (now - player.last_heartbeat).total_seconds() <= 600
-        ]
+        """更新玩家心跳（只延後到期時間，O(1)）"""
+        if player_id not in self.heartbeat_deadlines:
+            return  # 已經被移除或不存在
+        self.heartbeat_deadlines.touch(player_id, time.monotonic() + PLAYER_HEARTBEAT_TIMEOUT)
+        player = self.players.get(player_id) or self.waiting_queue.get(player_id)
+        if player is not None:
+            player.last_heartbeat = datetime.now()
+
+    def remove_inactive_players(self, now: Optional[float] = None) -> List[str]:
+        """
+        移除心跳逾時的玩家（由背景工作呼叫，請求處理不做清理）
+        只處理已到期的玩家，沒有人到期時只看一眼 heap 頂端
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            next_deadline = self.heartbeat_deadlines.next_deadline()
+            if next_deadline is None or next_deadline > now:
+                return []
+
+            expired = self.heartbeat_deadlines.pop_due(now)
+            if expired:
+                with self.mutate():
+                    for pid in expired:
+                        player = self.players.get(pid) or self.waiting_queue.get(pid)
+                        name = player.player_name if player else None
+                        room_log.warning("⚠️ 移除不活躍玩家: %s", name, extra={"room": self.room_code, "player_id": pid})
+                        self.remove_player(pid)
+            return expired
 
     def can_start_game(self) -> bool:
         """檢查是否可以開始遊戲"""
         return len(self.players) >= self.min_players and not self.game_started
 
+    @mutator
     def start_game(self, player_order: List[str]):
         """開始遊戲"""
         self.game_started = True
@@ -187,14 +305,14 @@ class GameRoom:
             }
 
         # 檢查是否在排隊中
-        for idx, player in enumerate(self.waiting_queue):
-            if player.player_id == player_id:
-                return {
-                    "status": "in_queue",
-                    "screen": None,
-                    "is_host": False,
-                    "queue_position": idx + 1
-                }
+        queue_position = self.waiting_queue.position(player_id)
+        if queue_position is not None:
+            return {
+                "status": "in_queue",
+                "screen": None,
+                "is_host": False,
+                "queue_position": queue_position
+            }
 
         # 玩家不在系統中
         return {
@@ -204,8 +322,11 @@ class GameRoom:
             "queue_position": None
         }
 
+    @mutator
     def reset(self):
         """重置房間"""
+        self.log_event("reset")
+        self.game_id = None
         self.players.clear()
         self.waiting_queue.clear()
         self.host_id = None
@@ -229,6 +350,7 @@ class GameRoom:
         self.last_action = None
         self.current_opponent = None
         self.wine_stack.clear()
+        self.heartbeat_deadlines.clear()
         # 清空積分
         self.player_scores.clear()
 
@@ -240,12 +362,15 @@ class GameRoom:
             return None
         return self.player_order[self.current_turn_index]
 
+    @mutator
     def next_turn(self):
         """進入下一個玩家的回合"""
         if not self.game_started or not self.player_order:
             return
         self.current_turn_index = (self.current_turn_index + 1) % len(self.player_order)
+        self.log_event("next_turn", turn_index=self.current_turn_index, player_id=self.player_order[self.current_turn_index])
 
+    @mutator
     def update_score(self, player_id: str, delta: int) -> tuple[bool, int, str]:
         """更新玩家積分，返回 (成功, 新積分, 訊息)"""
         if player_id not in self.players:
@@ -258,12 +383,14 @@ class GameRoom:
         # 更新積分
         self.player_scores[player_id] += delta
         new_score = self.player_scores[player_id]
+        self.log_event("score", player_id=player_id, delta=delta, score=new_score)
 
         player_name = self.players[player_id].player_name
-        print(f"📊 積分更新: {player_name} ({delta:+d}) → {new_score}")
+        room_log.info("📊 積分更新: %s (%+d) → %d", player_name, delta, new_score, extra={"room": self.room_code, "player_id": player_id})
 
         return True, new_score, "積分更新成功"
 
+    @mutator
     def start_wheel_spin(self) -> tuple[bool, str, int]:
         """開始轉盤（只有房主可以呼叫）"""
         if self.wheel_spinning or self.wheel_finished:
@@ -286,6 +413,7 @@ class GameRoom:
 
         return True, "轉盤開始", self.spin_seed
 
+    @mutator
     def finish_wheel_spin(self) -> List[str]:
         """完成轉盤，返回玩家順序"""
         self.wheel_spinning = False
@@ -300,9 +428,22 @@ class GameRoom:
         
         ordered_ids = player_ids[idx:] + player_ids[:idx]
         self.player_order = ordered_ids
+        self.log_event("turn_order", player_order=ordered_ids)
 
         return ordered_ids
 
+    @mutator
+    def update_pour(self, job: PourJob):
+        """記錄倒酒工作進度（排入 / 完成時呼叫）"""
+        self.last_pour = {
+            "job_id": job.job_id,
+            "status": job.status,
+            "actions": job.actions,
+            "error": job.error,
+            "wall_time": job.wall_time
+        }
+        self.log_event("pour", job_id=job.job_id, status=job.status, actions=job.actions, error=job.error)
+
     def get_wheel_state(self):
         """獲取轉盤狀態"""
         # 如果轉盤正在進行或已完成，使用快照；否則使用當前玩家
@@ -338,6 +479,9 @@ class GameRoom:
         current_player_id = self.get_current_player_id()
 
         return {
+            "room_code": self.room_code,
+            "epoch": self.epoch,
+            "version": self.version,
             "player_count": len(self.players),
             "players": [
                 {
@@ -362,19 +506,209 @@ class GameRoom:
             # 共享遊戲畫面（所有玩家看到相同內容）
             "base_wine_color": self.base_wine_color,
             "base_pump_id": self.base_pump_id,
-            "dice_values": self.dice_values,
+            "dice_values": list(self.dice_values),
             "current_question": self.current_question,
             "current_answer": self.current_answer,
             "last_action": self.last_action,
             "current_opponent": self.current_opponent,
             "opponent_name": self.current_opponent,
-            "wine_stack": self.wine_stack,
+            "wine_stack": list(self.wine_stack),
+            "last_pour": self.last_pour,
+            "reservoir_alerts": list(self.reservoir_alerts),  # 快空 / 已空的酒瓶
             # 玩家積分（所有玩家看到相同積分）
-            "player_scores": self.player_scores
+            "player_scores": dict(self.player_scores)
         }
 
-# 全域遊戲房間實例
-game_room = GameRoom()
+    # 持久化用的完整狀態（RoomJournal 以 merge patch 記錄，None 代表刪除，所以還原時一律用 .get()）
+    PERSISTED_FIELDS = (
+        "host_id", "game_started", "max_players", "min_players", "player_order",
+        "current_turn_index", "current_round", "game_mode", "game_ended", "game_result",
+        "wheel_spinning", "wheel_finished", "winner_index", "spin_seed",
+        "base_wine_color", "base_pump_id", "current_question", "current_answer",
+        "last_action", "current_opponent", "last_pour", "game_id",
+    )
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """
+        可還原房間的完整狀態（全部是新建立的物件）
+        玩家與排隊名單用 dict 保存（依插入順序），這樣有人加入或離開時 patch 只有一個欄位
+        """
+        snapshot = {field: copy.deepcopy(getattr(self, field)) for field in self.PERSISTED_FIELDS}
+        snapshot.update({
+            "epoch": self.epoch,
+            "players": {
+                pid: {"name": p.player_name, "joined_at": p.joined_at.isoformat()}
+                for pid, p in self.players.items()
+            },
+            "waiting_queue": {
+                p.player_id: {"name": p.player_name, "joined_at": p.joined_at.isoformat()}
+                for p in self.waiting_queue
+            },
+            "wheel_candidates": [[p.player_id, p.player_name] for p in self.wheel_candidates],
+            "dice_values": list(self.dice_values),
+            "wine_stack": list(self.wine_stack),
+            "player_scores": dict(self.player_scores),
+        })
+        return snapshot
+
+    def restore_snapshot(self, version: int, snapshot: Dict[str, Any], resume: bool = True):
+        """
+        從持久化資料還原（還原前房間是空的）
+        resume=False：只重建當時的狀態（遊戲紀錄重播用），不處理中斷的倒酒工作
+        """
+        now = time.monotonic()
+
+        def make_player(pid: str, info: Dict[str, Any]) -> Player:
+            player = Player(pid, info.get("name") or "")
+            if info.get("joined_at"):
+                player.joined_at = datetime.fromisoformat(info["joined_at"])
+            # 手機重新連上前給一個完整的逾時週期
+            self.heartbeat_deadlines.touch(pid, now + PLAYER_HEARTBEAT_TIMEOUT)
+            return player
+
+        with self.lock:
+            # 欄位不存在 = 值為 None（或舊版資料沒有），沿用剛建立的房間的預設值
+            for field in self.PERSISTED_FIELDS:
+                setattr(self, field, snapshot.get(field, getattr(self, field)))
+
+            self.players = {pid: make_player(pid, info) for pid, info in (snapshot.get("players") or {}).items()}
+            self.waiting_queue.clear()
+            for pid, info in (snapshot.get("waiting_queue") or {}).items():
+                self.waiting_queue.append(make_player(pid, info))
+            self.wheel_candidates = [
+                self.players.get(pid) or Player(pid, name)
+                for pid, name in snapshot.get("wheel_candidates") or []
+            ]
+            self.dice_values = list(snapshot.get("dice_values") or [1, 1])
+            self.wine_stack = list(snapshot.get("wine_stack") or [])
+            self.player_scores = dict(snapshot.get("player_scores") or {})
+
+            # 同一個 epoch + version 代表完全相同的狀態，瀏覽器手上的 ETag 仍然有效
+            self.epoch = snapshot.get("epoch") or self.epoch
+            self.version = version
+            self.state_history.reset(self.get_state())
+
+            # 重啟前沒倒完的工作已經不存在了
+            if resume and self.last_pour and self.last_pour.get("status") in ("queued", "running"):
+                with self.mutate():
+                    self.last_pour = {**self.last_pour, "status": "failed", "error": "伺服器重新啟動，倒酒中斷"}
+
+# 房間狀態推播（WebSocket）
+room_broadcaster = RoomBroadcaster()
+
+# 非阻塞倒酒執行器（整台機器共用一組幫浦）
+pump_executor = PumpExecutor(pump_hardware)
+pump_calibration = pump_hardware.controller.calibration
+pump_reservoirs = pump_hardware.controller.reservoirs
+pump_watchdog = pump_hardware.controller.watchdog
+
+# event loop 多久向幫浦看門狗報一次平安（秒）；超過 HEARTBEAT_TIMEOUT 沒報就關閉所有幫浦
+WATCHDOG_HEARTBEAT_INTERVAL = 0.5
+
+# 房間狀態持久化（重啟後還原玩家、積分與回合順序）
+room_journal = RoomJournal()
+
+# 每一局的事件紀錄（重播 / 匯出）
+game_history = GameHistory()
+
+def _persist_room(room: GameRoom):
+    # 在房間鎖內：快照只建一次，I/O 都在背景執行緒
+    snapshot = room.to_snapshot()
+    room_journal.record(room.room_code, room.version, snapshot)
+    events = room.take_events()
+    if events:
+        game_history.record(events, room.version, snapshot)
+
+def _create_room(room_code: str) -> GameRoom:
+    room = GameRoom(room_code)
+    room.reservoir_alerts = _reservoir_alerts()
+    room.state_history.reset(room.get_state())
+    room.listeners.append(room_broadcaster.notify)
+    room.listeners.append(_persist_room)
+    return room
+
+# 全域房間註冊表（房號 -> GameRoom）
+room_registry = RoomRegistry(_create_room)
+
+# 酒瓶剩餘量警示：加上顏色後放進每個房間的狀態（跟著 ETag / 推播送到前端）
+PUMP_COLORS = {pump_id: color for color, pump_id in COLOR_PUMPS.items()}
+
+def _reservoir_alerts(alerts: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+    if alerts is None:
+        alerts = pump_reservoirs.alerts()
+    return [{**alert, "color": PUMP_COLORS.get(alert["pump_id"])} for alert in alerts]
+
+def _update_reservoir_alerts(alerts: List[Dict[str, Any]]):
+    # 在 ReservoirTracker 背景執行緒中呼叫（只有警示等級改變時）
+    alerts = _reservoir_alerts(alerts)
+    for room in room_registry.rooms():
+        with room.mutate():
+            room.reservoir_alerts = alerts
+
+pump_reservoirs.listeners.append(_update_reservoir_alerts)
+
+# 基底幫浦選擇策略依酒瓶用量挑幫浦
+pump_selector.bind(pump_reservoirs.status)
+
+def restore_rooms():
+    """啟動時從快照 + journal 還原所有房間"""
+    started = time.perf_counter()
+    saved = room_journal.load_all()
+    for code, (version, snapshot) in saved.items():
+        try:
+            room_registry.restore(code).restore_snapshot(version, snapshot)
+        except Exception:
+            room_log.exception("房間還原失敗", extra={"room": code})
+            room_registry.remove(code)
+    elapsed = (time.perf_counter() - started) * 1000
+    if saved:
+        room_log.info("♻️ 已還原 %d 個房間，耗時 %.1f ms", len(saved), elapsed)
+    if elapsed > RESTORE_BUDGET_MS:
+        room_log.warning("房間還原超過預算 %.0f ms（%.1f ms）", RESTORE_BUDGET_MS, elapsed)
+
+def get_room(
+    room: Optional[str] = Query(None),
+    room_code: Optional[str] = Cookie(None)
+) -> GameRoom:
+    """依房號取得房間：query 參數優先，其次 cookie，都沒有則使用預設房間"""
+    code = room or room_code
+    if not code:
+        return room_registry.default_room()
+
+    found = room_registry.get(code)
+    if found is None:
+        raise HTTPException(status_code=404, detail=f"房間 {code} 不存在")
+    return found
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """檢查 If-None-Match 是否已經是最新版本"""
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return etag in (tag.strip() for tag in if_none_match.split(","))
+
+def not_modified(etag: str) -> Response:
+    """狀態沒變：回傳空的 304"""
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache", "Vary": "Cookie"})
+
+def set_etag(response: Response, etag: str):
+    """讓瀏覽器快取回應，之後每次輪詢都用 If-None-Match 重新驗證"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["Vary"] = "Cookie"
+
+def set_room_cookie(response: Response, room_code: str):
+    """用 cookie 記住玩家所在的房號"""
+    response.set_cookie(
+        key="room_code",
+        value=room_code,
+        max_age=3600,
+        path="/",
+        httponly=False,
+        samesite="lax"
+    )
 
 # 設定 CORS，允許前端存取 API
 app.add_middleware(
@@ -385,6 +719,23 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Prometheus 指標：每個路由的延遲 / 狀態碼，以及抓取時才讀的房間與幫浦狀態
+metrics_registry = CollectorRegistry()
+app.add_middleware(PrometheusMiddleware, metrics=HTTPMetrics(metrics_registry))
+metrics_registry.register(GameCollector(
+    rooms=room_registry.rooms,
+    pump_states=pump_hardware.controller.pump_states,
+    hardware_metrics=pump_hardware.metrics,
+    pending_jobs=pump_executor.pending_count,
+    reservoirs=lambda: pump_reservoirs.status(),
+    watchdog=pump_watchdog.metrics,
+))
+
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus 抓取端點"""
+    return metrics_response(metrics_registry)
+
 @app.get("/")
 def index():
     # 取得目前檔案 (main.py) 的目錄，並指向 PartyGame/index.html
@@ -432,6 +783,7 @@ def get_lsa_question():
 
 class JoinRoomRequest(BaseModel):
     player_name: str
+    room_code: Optional[str] = None  # 房號（不提供則加入預設房間）
 
 class StartGameRequest(BaseModel):
     player_id: str
@@ -442,15 +794,30 @@ class HeartbeatRequest(BaseModel):
 class WheelSpinRequest(BaseModel):
     player_id: str
 
+@app.post("/api/room/create")
+def create_room(response: Response):
+    """開一個新房間（新的一桌），回傳房號"""
+    room = room_registry.create()
+    set_room_cookie(response, room.room_code)
+    room_log.info("🏠 建立新房間", extra={"room": room.room_code})
+    return {"success": True, "room_code": room.room_code}
+
 @app.post("/api/room/join")
 def join_room(request: JoinRoomRequest, response: Response):
     """玩家加入房間"""
-    # 清理不活躍的玩家
-    game_room.remove_inactive_players()
+    if request.room_code:
+        room = room_registry.get(request.room_code)
+        if room is None:
+            raise HTTPException(status_code=404, detail=f"房間 {request.room_code} 不存在")
+    else:
+        room = room_registry.default_room()
 
-    success, player_id, message, status = game_room.add_player(request.player_name)
+    with room.mutate():
+        success, player_id, message, status = room.add_player(request.player_name)
+
+        if not success:
+            raise HTTPException(status_code=400, detail=message)
 
-    if success:
         # 設定 cookie 來記住玩家 ID
         response.set_cookie(
             key="player_id",
@@ -460,29 +827,30 @@ def join_room(request: JoinRoomRequest, response: Response):
             httponly=False,  # 允許 JavaScript 讀取
             samesite="lax"
         )
+        set_room_cookie(response, room.room_code)
 
         # 取得玩家狀態
-        player_status = game_room.get_player_status(player_id)
+        player_status = room.get_player_status(player_id)
 
         return {
             "success": True,
             "player_id": player_id,
+            "room_code": room.room_code,
             "message": message,
             "status": status,
             "queue_position": player_status["queue_position"],
-            "room_state": game_room.get_state()
+            "room_state": room.get_state()
         }
-    else:
-        raise HTTPException(status_code=400, detail=message)
 
 @app.post("/api/room/leave")
-def leave_room(request: HeartbeatRequest):
+def leave_room(request: HeartbeatRequest, room: GameRoom = Depends(get_room)):
     """玩家離開房間"""
-    game_room.remove_player(request.player_id)
+    with room.mutate():
+        room.remove_player(request.player_id)
     return {"success": True, "message": "已離開房間"}
 
 @app.get("/api/player/state")
-def get_player_state(player_id: Optional[str] = Cookie(None)):
+def get_player_state(player_id: Optional[str] = Cookie(None), room: GameRoom = Depends(get_room)):
     """取得玩家狀態（用於頁面載入時檢查）"""
     if not player_id:
         return {
@@ -492,60 +860,107 @@ def get_player_state(player_id: Optional[str] = Cookie(None)):
             "queue_position": None
         }
 
-    # 清理不活躍的玩家
-    game_room.remove_inactive_players()
+    with room.lock:
+        return room.get_player_status(player_id)
 
-    return game_room.get_player_status(player_id)
+def state_or_delta(
+    room: GameRoom,
+    personal: Dict[str, Any],
+    since: Optional[int],
+    epoch: Optional[str]
+) -> Dict[str, Any]:
+    """
+    有帶 since 且緩衝區還找得到時，只回傳變動的欄位：
+    {"delta": true, "since": ..., "version": ..., "patch": {...}}
+    否則回傳完整狀態（與原本格式相同）
+    """
+    if since is not None:
+        patch = room.get_state_since(since, epoch)
+        if patch is not None:
+            patch.update(personal)
+            return {
+                "delta": True,
+                "since": since,
+                "version": room.version,
+                "epoch": room.epoch,
+                "patch": patch
+            }
+
+    state = room.get_state()
+    state.update(personal)
+    return state
 
 @app.get("/api/room/state")
-def get_room_state(player_id: Optional[str] = Cookie(None)):
-    """獲取房間狀態（用於輪詢）"""
-    # 清理不活躍的玩家
-    game_room.remove_inactive_players()
-
-    state = game_room.get_state()
-
-    # 檢查請求的玩家是否還在房間中
-    if player_id:
-        state["is_in_room"] = player_id in game_room.players
-        state["is_host"] = player_id == game_room.host_id
-        state["my_player_id"] = player_id
-    else:
-        state["is_in_room"] = False
-        state["is_host"] = False
-        state["my_player_id"] = None
+def get_room_state(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0),
+    epoch: Optional[str] = Query(None),
+    player_id: Optional[str] = Cookie(None),
+    room: GameRoom = Depends(get_room)
+):
+    """獲取房間狀態（用於輪詢，支援 If-None-Match 與 ?since= 增量同步）"""
+    with room.lock:
+        etag = room.etag(player_id)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        # 檢查請求的玩家是否還在房間中
+        if player_id:
+            personal = {
+                "is_in_room": player_id in room.players,
+                "is_host": player_id == room.host_id,
+                "my_player_id": player_id
+            }
+        else:
+            personal = {
+                "is_in_room": False,
+                "is_host": False,
+                "my_player_id": None
+            }
 
+        state = state_or_delta(room, personal, since, epoch)
+
+    set_etag(response, etag)
     return state
 
 @app.post("/api/room/heartbeat")
-def heartbeat(request: HeartbeatRequest):
+def heartbeat(request: HeartbeatRequest, room: GameRoom = Depends(get_room)):
     """玩家心跳，保持連線"""
-    game_room.update_heartbeat(request.player_id)
+    with room.lock:
+        room.update_heartbeat(request.player_id)
     return {"success": True}
 
 @app.post("/api/room/start")
-def start_game(request: StartGameRequest):
+def start_game(request: StartGameRequest, room: GameRoom = Depends(get_room)):
     """房主開始遊戲（進入轉盤畫面）"""
-    # 檢查是否為房主
-    if request.player_id != game_room.host_id:
-        raise HTTPException(status_code=403, detail="只有房主可以開始遊戲")
-
-    # 檢查是否可以開始
-    if not game_room.can_start_game():
-        raise HTTPException(
-            status_code=400,
-            detail=f"需要至少 {game_room.min_players} 人才能開始遊戲"
+    with room.mutate():
+        # 檢查是否為房主
+        if request.player_id != room.host_id:
+            raise HTTPException(status_code=403, detail="只有房主可以開始遊戲")
+
+        # 檢查是否可以開始
+        if not room.can_start_game():
+            raise HTTPException(
+                status_code=400,
+                detail=f"需要至少 {room.min_players} 人才能開始遊戲"
+            )
+
+        # 只設定遊戲已開始，不設定玩家順序（順序由轉盤決定）
+        room.game_started = True
+        room.game_id = new_game_id(room.room_code)
+        room.log_event(
+            "game_start",
+            mode=room.game_mode,
+            players={pid: p.player_name for pid, p in room.players.items()},
         )
 
-    # 只設定遊戲已開始，不設定玩家順序（順序由轉盤決定）
-    game_room.game_started = True
-
-    # 重置轉盤狀態，確保新遊戲可以轉動
-    game_room.wheel_spinning = False
-    game_room.wheel_finished = False
-    game_room.winner_index = None
-    game_room.spin_seed = None
-    game_room.wheel_candidates = []
+        # 重置轉盤狀態，確保新遊戲可以轉動
+        room.wheel_spinning = False
+        room.wheel_finished = False
+        room.winner_index = None
+        room.spin_seed = None
+        room.wheel_candidates = []
 
     return {
         "success": True,
@@ -553,105 +968,166 @@ def start_game(request: StartGameRequest):
     }
 
 @app.post("/api/room/reset")
-def reset_room():
+def reset_room(room: GameRoom = Depends(get_room)):
     """重置房間（用於測試或結束遊戲後）"""
-    game_room.reset()
+    with room.mutate():
+        room.reset()
     return {"success": True, "message": "房間已重置"}
 
 # --- 轉盤 API 端點 ---
 
 @app.post("/api/wheel/spin")
-def spin_wheel(request: WheelSpinRequest):
+def spin_wheel(request: WheelSpinRequest, room: GameRoom = Depends(get_room)):
     """開始轉盤（只有房主可以呼叫）"""
-    # 檢查是否為房主
-    if request.player_id != game_room.host_id:
-        raise HTTPException(status_code=403, detail="只有房主可以轉動轉盤")
-
-    # 檢查遊戲是否已開始
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
+    with room.mutate():
+        # 檢查是否為房主
+        if request.player_id != room.host_id:
+            raise HTTPException(status_code=403, detail="只有房主可以轉動轉盤")
 
-    # 開始轉盤
-    success, message, seed = game_room.start_wheel_spin()
+        # 檢查遊戲是否已開始
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
 
-    if not success:
-        raise HTTPException(status_code=400, detail=message)
+        # 開始轉盤
+        success, message, seed = room.start_wheel_spin()
 
-    return {
-        "success": True,
-        "message": message,
-        "spin_seed": seed,
-        "winner_index": game_room.winner_index
-    }
+        if not success:
+            raise HTTPException(status_code=400, detail=message)
 
-@app.post("/api/wheel/finish")
-def finish_wheel():
-    """完成轉盤，設定玩家順序"""
-    # 如果已經完成，直接返回成功（允許多個客戶端呼叫）
-    if game_room.wheel_finished:
+        wheel_log.info("🎡 轉盤開始（%d 人）", len(room.wheel_candidates), extra={"room": room.room_code, "seed": seed})
         return {
             "success": True,
-            "message": "轉盤已完成",
-            "player_order": game_room.get_wheel_state()["player_order"]
+            "message": message,
+            "spin_seed": seed,
+            "winner_index": room.winner_index
         }
 
-    # 如果還在旋轉中，完成它
-    if game_room.wheel_spinning:
-        ordered_ids = game_room.finish_wheel_spin()
-        return {
-            "success": True,
-            "message": "轉盤完成",
-            "player_order": game_room.get_wheel_state()["player_order"]
-        }
+@app.post("/api/wheel/finish")
+def finish_wheel(room: GameRoom = Depends(get_room)):
+    """完成轉盤，設定玩家順序"""
+    with room.lock:
+        # 如果已經完成，直接返回成功（允許多個客戶端呼叫）
+        if room.wheel_finished:
+            return {
+                "success": True,
+                "message": "轉盤已完成",
+                "player_order": room.get_wheel_state()["player_order"]
+            }
+
+        # 如果還在旋轉中，完成它
+        if room.wheel_spinning:
+            room.finish_wheel_spin()
+            wheel_log.info("🎡 轉盤完成", extra={"room": room.room_code})
+            return {
+                "success": True,
+                "message": "轉盤完成",
+                "player_order": room.get_wheel_state()["player_order"]
+            }
 
     # 如果既沒在旋轉也沒完成，表示狀態錯誤
     raise HTTPException(status_code=400, detail="轉盤狀態錯誤")
 
 @app.get("/api/wheel/state")
-def get_wheel_state():
-    """獲取轉盤狀態（用於輪詢同步）"""
-    return game_room.get_wheel_state()
+def get_wheel_state(request: Request, response: Response, room: GameRoom = Depends(get_room)):
+    """獲取轉盤狀態（用於輪詢同步，支援 If-None-Match）"""
+    with room.lock:
+        etag = room.etag()
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        wheel_state = room.get_wheel_state()
+
+    set_etag(response, etag)
+    return wheel_state
 
 class NextTurnRequest(BaseModel):
     player_id: str
 
 @app.post("/api/game/next-turn")
-def next_turn(request: NextTurnRequest):
+def next_turn(request: NextTurnRequest, room: GameRoom = Depends(get_room)):
     """進入下一個玩家的回合（只有當前玩家可以呼叫）"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
+    with room.mutate():
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
 
-    # 檢查是否輪到該玩家（只有當前玩家才能結束自己的回合）
-    current_player_id = game_room.get_current_player_id()
-    if request.player_id != current_player_id:
-        raise HTTPException(status_code=403, detail="還沒輪到你，不能切換回合")
+        # 檢查是否輪到該玩家（只有當前玩家才能結束自己的回合）
+        current_player_id = room.get_current_player_id()
+        if request.player_id != current_player_id:
+            raise HTTPException(status_code=403, detail="還沒輪到你，不能切換回合")
 
-    game_room.next_turn()
+        room.next_turn()
 
-    return {
-        "success": True,
-        "current_turn_index": game_room.current_turn_index,
-        "current_player_id": game_room.get_current_player_id()
-    }
+        return {
+            "success": True,
+            "current_turn_index": room.current_turn_index,
+            "current_player_id": room.get_current_player_id()
+        }
 
 @app.get("/api/game/state")
-def get_game_state(player_id: Optional[str] = Cookie(None)):
-    """獲取遊戲狀態（包含當前輪到誰）"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
-
-    state = game_room.get_state()
+def get_game_state(
+    request: Request,
+    response: Response,
+    since: Optional[int] = Query(None, ge=0),
+    epoch: Optional[str] = Query(None),
+    player_id: Optional[str] = Cookie(None),
+    room: GameRoom = Depends(get_room)
+):
+    """獲取遊戲狀態（包含當前輪到誰，支援 If-None-Match 與 ?since= 增量同步）"""
+    with room.lock:
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
+
+        etag = room.etag(player_id)
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        # 檢查是否輪到請求的玩家
+        if player_id:
+            personal = {
+                "is_my_turn": player_id == room.get_current_player_id(),
+                "my_player_id": player_id
+            }
+        else:
+            personal = {
+                "is_my_turn": False,
+                "my_player_id": None
+            }
 
-    # 檢查是否輪到請求的玩家
-    if player_id:
-        state["is_my_turn"] = player_id == game_room.get_current_player_id()
-        state["my_player_id"] = player_id
-    else:
-        state["is_my_turn"] = False
-        state["my_player_id"] = None
+        state = state_or_delta(room, personal, since, epoch)
 
+    set_etag(response, etag)
     return state
 
+# --- 即時推播（WebSocket） ---
+
+@app.websocket("/ws/room")
+async def room_socket(websocket: WebSocket, room: Optional[str] = None):
+    """
+    訂閱房間狀態：連線後立即收到一次完整狀態，之後每次房間狀態改變就推播
+    訊息格式：{"type": "state", "room": <同 /api/room/state>, "wheel": <同 /api/wheel/state>}
+    """
+    code = room or websocket.cookies.get("room_code")
+    target = room_registry.get(code) if code else room_registry.default_room()
+    if target is None:
+        await websocket.close(code=4404)
+        return
+
+    await websocket.accept()
+    player_id = websocket.query_params.get("player_id") or websocket.cookies.get("player_id")
+    subscriber = RoomSubscriber(websocket, player_id)
+    room_broadcaster.subscribe(target, subscriber)
+    sender = asyncio.create_task(subscriber.run(room_broadcaster, target))
+
+    try:
+        room_broadcaster.push(target, [subscriber])
+        # 前端不需要送資料上來，這裡只用來偵測斷線
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        room_broadcaster.unsubscribe(target, subscriber)
+        sender.cancel()
+
 # --- 遊戲動作 API 端點（同步所有玩家） ---
 
 class RollDiceRequest(BaseModel):
@@ -669,118 +1145,121 @@ class SetQuestionRequest(BaseModel):
     answer: Optional[str] = None
 
 @app.post("/api/game/roll-dice")
-def roll_dice(request: RollDiceRequest):
+def roll_dice(request: RollDiceRequest, room: GameRoom = Depends(get_room)):
     """玩家擲骰子（同步到所有玩家）"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
-
-    # 檢查是否輪到該玩家
-    if request.player_id != game_room.get_current_player_id():
-        raise HTTPException(status_code=403, detail="還沒輪到你")
-
-    # 更新骰子值（所有玩家將看到相同的骰子）
-    game_room.dice_values = [request.dice1, request.dice2]
-    game_room.last_action = f"擲出 {request.dice1} 和 {request.dice2}"
-
-    print(f"🎲 玩家擲骰子: {request.dice1}, {request.dice2}")
-
-    # 預先隨機選擇一個對手（為了黑白切/對決模式），避免前端顯示 undefined
-    # 這樣即使前端沒有呼叫 pick-opponent，也能顯示一個隨機對手
-    candidates = [p for pid, p in game_room.players.items() if pid != request.player_id]
-    if candidates:
-        opponent = random.choice(candidates)
-        game_room.current_opponent = opponent.player_name
-    else:
-        game_room.current_opponent = "無其他玩家"
+    with room.mutate():
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
+
+        # 檢查是否輪到該玩家
+        if request.player_id != room.get_current_player_id():
+            raise HTTPException(status_code=403, detail="還沒輪到你")
+
+        # 更新骰子值（所有玩家將看到相同的骰子）
+        room.dice_values = [request.dice1, request.dice2]
+        room.last_action = f"擲出 {request.dice1} 和 {request.dice2}"
+
+        room_log.debug("🎲 玩家擲骰子: %d, %d", request.dice1, request.dice2, extra={"room": room.room_code, "player_id": request.player_id})
+
+        # 預先隨機選擇一個對手（為了黑白切/對決模式），避免前端顯示 undefined
+        # 這樣即使前端沒有呼叫 pick-opponent，也能顯示一個隨機對手
+        candidates = [p for pid, p in room.players.items() if pid != request.player_id]
+        if candidates:
+            opponent = random.choice(candidates)
+            room.current_opponent = opponent.player_name
+        else:
+            room.current_opponent = "無其他玩家"
+        room.log_event("roll", player_id=request.player_id, dice=list(room.dice_values), opponent=room.current_opponent)
 
-    return {
-        "success": True,
-        "dice_values": game_room.dice_values,
-        "sum": request.dice1 + request.dice2,
-        "current_opponent": game_room.current_opponent,
-        "opponent_name": game_room.current_opponent
-    }
+        return {
+            "success": True,
+            "dice_values": room.dice_values,
+            "sum": request.dice1 + request.dice2,
+            "current_opponent": room.current_opponent,
+            "opponent_name": room.current_opponent
+        }
 
 @app.post("/api/game/set-base-wine")
-def set_base_wine(request: SetBaseWineRequest):
+def set_base_wine(request: SetBaseWineRequest, room: GameRoom = Depends(get_room)):
     """設定基底酒（所有玩家看到相同基底）"""
     # 移除遊戲開始檢查，允許隨時設定基底酒
-
-    # 如果沒有提供顏色，後端隨機選擇
-    if request.color:
-        chosen_color = request.color
-        print(f"🎯 使用指定基底酒: {chosen_color}")
-    else:
-        import random
-        wine_colors = ['red', 'blue', 'yellow', 'green']
-
-        # 避免連續選到相同顏色（至少嘗試選擇不同的）
-        if game_room.base_wine_color and len(wine_colors) > 1:
-            available_colors = [c for c in wine_colors if c != game_room.base_wine_color]
-            chosen_color = random.choice(available_colors)
-            print(f"🎲 後端隨機選擇基底酒（避免重複）: {chosen_color} (上次: {game_room.base_wine_color})")
+    with room.mutate():
+        # 如果沒有提供顏色，後端隨機選擇
+        if request.color:
+            chosen_color = request.color
+            room_log.debug("🎯 使用指定基底酒: %s", chosen_color, extra={"room": room.room_code})
         else:
-            chosen_color = random.choice(wine_colors)
-            print(f"🎲 後端隨機選擇基底酒: {chosen_color}")
+            wine_colors = ['red', 'blue', 'yellow', 'green']
 
-    # 同時隨機選擇一個基底幫浦（1-4），並同步到所有玩家
-    import random
-
-    # 避免連續選到相同幫浦
-    if game_room.base_pump_id and game_room.base_pump_id in [1, 2, 3, 4]:
-        available_pumps = [p for p in [1, 2, 3, 4] if p != game_room.base_pump_id]
-        game_room.base_pump_id = random.choice(available_pumps)
-        print(f"🎲 後端隨機選擇基底幫浦（避免重複）: {game_room.base_pump_id}")
-    else:
-        game_room.base_pump_id = random.choice([1, 2, 3, 4])
-        print(f"🎲 後端隨機選擇基底幫浦: {game_room.base_pump_id}")
+            # 避免連續選到相同顏色（至少嘗試選擇不同的）
+            if room.base_wine_color and len(wine_colors) > 1:
+                available_colors = [c for c in wine_colors if c != room.base_wine_color]
+                chosen_color = random.choice(available_colors)
+                room_log.debug("🎲 後端隨機選擇基底酒（避免重複）: %s (上次: %s)", chosen_color, room.base_wine_color, extra={"room": room.room_code})
+            else:
+                chosen_color = random.choice(wine_colors)
+                room_log.debug("🎲 後端隨機選擇基底酒: %s", chosen_color, extra={"room": room.room_code})
+
+        # 同時選擇一個基底幫浦（1-4），並同步到所有玩家
+        # 依幫浦選擇策略（考慮酒瓶剩餘量 / 運轉時間），避免連續選到相同幫浦
+        previous_pump = room.base_pump_id
+        room.base_pump_id = choose_base_pump(exclude=previous_pump)
+        room_log.debug(
+            "🎲 後端選擇基底幫浦: %d (上次: %s，策略: %s)", room.base_pump_id, previous_pump, pump_selector.policy_name,
+            extra={"room": room.room_code},
+        )
 
-    game_room.base_wine_color = chosen_color
-    game_room.wine_stack.clear()  # 清空酒堆疊
-    print(f"🍷 設定基底酒: {chosen_color}（幫浦 {game_room.base_pump_id}），清空酒堆疊")
+        room.base_wine_color = chosen_color
+        room.wine_stack.clear()  # 清空酒堆疊
+        room.log_event("base_wine", color=chosen_color, pump_id=room.base_pump_id)
+        room_log.info("🍷 設定基底酒: %s（幫浦 %d），清空酒堆疊", chosen_color, room.base_pump_id, extra={"room": room.room_code})
 
-    return {
-        "success": True,
-        "base_wine_color": game_room.base_wine_color,
-        "base_pump_id": game_room.base_pump_id,
-        "wine_stack": game_room.wine_stack
-    }
+        return {
+            "success": True,
+            "base_wine_color": room.base_wine_color,
+            "base_pump_id": room.base_pump_id,
+            "wine_stack": list(room.wine_stack)
+        }
 
 class AddWineRequest(BaseModel):
     player_id: str
     color: str
 
 @app.post("/api/game/add-wine")
-def add_wine_to_stack(request: AddWineRequest):
+def add_wine_to_stack(request: AddWineRequest, room: GameRoom = Depends(get_room)):
     """添加酒到堆疊（所有玩家看到相同的酒堆疊）"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
+    with room.mutate():
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
 
-    game_room.wine_stack.append(request.color)
-    print(f"🍷 添加酒到堆疊: {request.color}，目前堆疊: {game_room.wine_stack}")
+        room.wine_stack.append(request.color)
+        room.log_event("add_wine", player_id=request.player_id, color=request.color)
+        room_log.debug("🍷 添加酒到堆疊: %s，目前 %d 杯", request.color, len(room.wine_stack), extra={"room": room.room_code})
 
-    return {
-        "success": True,
-        "color": request.color,
-        "wine_stack": game_room.wine_stack
-    }
+        return {
+            "success": True,
+            "color": request.color,
+            "wine_stack": list(room.wine_stack)
+        }
 
 @app.post("/api/game/set-question")
-def set_question(request: SetQuestionRequest):
+def set_question(request: SetQuestionRequest, room: GameRoom = Depends(get_room)):
     """設定當前題目（所有玩家看到相同題目）"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
+    with room.mutate():
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
 
-    game_room.current_question = request.question
-    game_room.current_answer = request.answer
+        room.current_question = request.question
+        room.current_answer = request.answer
+        room.log_event("question", question=request.question, answer=request.answer)
 
-    print(f"❓ 設定題目: {request.question}")
+        room_log.debug("❓ 設定題目: %s", request.question, extra={"room": room.room_code})
 
-    return {
-        "success": True,
-        "question": game_room.current_question,
-        "answer": game_room.current_answer
-    }
+        return {
+            "success": True,
+            "question": room.current_question,
+            "answer": room.current_answer
+        }
 
 class UpdateScoreRequest(BaseModel):
     player_id: str
@@ -791,38 +1270,41 @@ class IncrementRoundRequest(BaseModel):
     new_round: int
 
 @app.post("/api/game/update-score")
-def update_score(request: UpdateScoreRequest):
+def update_score(request: UpdateScoreRequest, room: GameRoom = Depends(get_room)):
     """更新玩家積分（同步到所有玩家）"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
+    with room.mutate():
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
 
-    # 更新積分
-    success, new_score, message = game_room.update_score(request.player_id, request.score_delta)
+        # 更新積分
+        success, new_score, message = room.update_score(request.player_id, request.score_delta)
 
-    if not success:
-        raise HTTPException(status_code=400, detail=message)
+        if not success:
+            raise HTTPException(status_code=400, detail=message)
 
-    # 檢查遊戲是否結束（酒鬼模式：有人喝滿3杯）
-    if game_room.game_mode == 'drunk' and new_score >= 3:
-        game_room.game_ended = True
-        player_name = game_room.players[request.player_id].player_name if request.player_id in game_room.players else "玩家"
-        
-        # 找出贏家（除了輸家以外的所有人）和輸家
-        winners = []
-        losers = [{"player_id": request.player_id, "player_name": player_name, "score": new_score}]
-        
-        for pid, p in game_room.players.items():
-            if pid != request.player_id:
-                score = game_room.player_scores.get(pid, 0)
-                winners.append({"player_id": pid, "player_name": p.player_name, "score": score})
-
-        game_room.game_result = {
-            "mode": "drunk",
-            "winners": winners,
-            "losers": losers,
-            "message": f"{player_name} 已經喝了 3 杯！遊戲結束！"
-        }
-        print(f"🏁 遊戲結束！{player_name} 喝了 {new_score} 杯")
+        # 檢查遊戲是否結束（酒鬼模式：有人喝滿3杯）
+        if room.game_mode == 'drunk' and new_score >= 3:
+            room.game_ended = True
+            player_name = room.players[request.player_id].player_name if request.player_id in room.players else "玩家"
+
+            # 找出贏家（除了輸家以外的所有人）和輸家
+            winners = []
+            losers = [{"player_id": request.player_id, "player_name": player_name, "score": new_score}]
+
+            for pid, p in room.players.items():
+                if pid != request.player_id:
+                    score = room.player_scores.get(pid, 0)
+                    winners.append({"player_id": pid, "player_name": p.player_name, "score": score})
+
+            room.game_result = {
+                "mode": "drunk",
+                "winners": winners,
+                "losers": losers,
+                "message": f"{player_name} 已經喝了 3 杯！遊戲結束！"
+            }
+            room.log_event("game_end", result=room.game_result)
+            room.game_id = None
+            room_log.info("🏁 遊戲結束！%s 喝了 %d 杯", player_name, new_score, extra={"room": room.room_code})
 
     return {
         "success": True,
@@ -833,24 +1315,31 @@ def update_score(request: UpdateScoreRequest):
     }
 
 @app.post("/api/game/increment-round")
-def increment_round(request: IncrementRoundRequest):
+def increment_round(request: IncrementRoundRequest, room: GameRoom = Depends(get_room)):
     """增加回合數（闔家歡模式專用）"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
+    with room.mutate():
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
 
-    # 只在闔家歡模式更新回合
-    if game_room.game_mode == 'family':
-        game_room.current_round = request.new_round
-        print(f"🍺 回合更新: {request.new_round}")
+        # 只在闔家歡模式更新回合
+        if room.game_mode != 'family':
+            return {
+                "success": False,
+                "message": "酒鬼模式不使用回合制"
+            }
+
+        room.current_round = request.new_round
+        room.log_event("round", round=request.new_round)
+        room_log.debug("🍺 回合更新: %d", request.new_round, extra={"room": room.room_code})
 
         # 檢查遊戲是否結束（闔家歡模式：完成5回合）
-        if game_room.current_round > 5:
-            game_room.game_ended = True
+        if room.current_round > 5:
+            room.game_ended = True
 
             # 計算最高分和最低分
             max_score = -999
             min_score = 999
-            for player_id, score in game_room.player_scores.items():
+            for player_id, score in room.player_scores.items():
                 if score > max_score:
                     max_score = score
                 if score < min_score:
@@ -859,15 +1348,15 @@ def increment_round(request: IncrementRoundRequest):
             # 找出贏家和輸家
             winners = []
             losers = []
-            for player_id, score in game_room.player_scores.items():
-                if player_id in game_room.players:
-                    player_name = game_room.players[player_id].player_name
+            for player_id, score in room.player_scores.items():
+                if player_id in room.players:
+                    player_name = room.players[player_id].player_name
                     if score == max_score:
                         winners.append({"player_id": player_id, "player_name": player_name, "score": score})
                     if score == min_score:
                         losers.append({"player_id": player_id, "player_name": player_name, "score": score})
 
-            game_room.game_result = {
+            room.game_result = {
                 "mode": "family",
                 "max_score": max_score,
                 "min_score": min_score,
@@ -875,52 +1364,51 @@ def increment_round(request: IncrementRoundRequest):
                 "losers": losers,
                 "message": f"已完成 5 回合！遊戲結束！"
             }
-            print(f"🏁 遊戲結束！完成 5 回合")
+            room.log_event("game_end", result=room.game_result)
+            room.game_id = None
+            room_log.info("🏁 遊戲結束！完成 5 回合", extra={"room": room.room_code})
 
         return {
             "success": True,
-            "current_round": game_room.current_round,
-            "message": f"回合已更新為 {game_room.current_round}"
-        }
-    else:
-        return {
-            "success": False,
-            "message": "酒鬼模式不使用回合制"
+            "current_round": room.current_round,
+            "message": f"回合已更新為 {room.current_round}"
         }
 
 class PickOpponentRequest(BaseModel):
     player_id: str
 
 @app.post("/api/game/pick-opponent")
-def pick_opponent(request: PickOpponentRequest):
+def pick_opponent(request: PickOpponentRequest, room: GameRoom = Depends(get_room)):
     """隨機選擇一個對手（用於黑白切/對決），解決顯示 undefined 的問題"""
-    if not game_room.game_started:
-        raise HTTPException(status_code=400, detail="遊戲尚未開始")
+    with room.mutate():
+        if not room.game_started:
+            raise HTTPException(status_code=400, detail="遊戲尚未開始")
 
-    # 取得當前玩家名字
-    current_player_name = game_room.players[request.player_id].player_name if request.player_id in game_room.players else "玩家"
+        # 取得當前玩家名字
+        current_player_name = room.players[request.player_id].player_name if request.player_id in room.players else "玩家"
 
-    # 篩選出除了自己以外的潛在對手
-    candidates = [p for pid, p in game_room.players.items() if pid != request.player_id]
+        # 篩選出除了自己以外的潛在對手
+        candidates = [p for pid, p in room.players.items() if pid != request.player_id]
 
-    if candidates:
-        # 隨機選擇一位對手
-        opponent = random.choice(candidates)
-        game_room.current_opponent = opponent.player_name
-        
-        # 更新最後動作，讓所有人都看到
-        game_room.last_action = f"{current_player_name} 的對手是 {opponent.player_name}！"
-        print(f"⚔️ 對決配對: {current_player_name} vs {opponent.player_name}")
-    else:
-        game_room.current_opponent = "無其他玩家"
-        game_room.last_action = "沒有其他玩家可以對戰！"
+        if candidates:
+            # 隨機選擇一位對手
+            opponent = random.choice(candidates)
+            room.current_opponent = opponent.player_name
 
-    return {
-        "success": True,
-        "opponent_name": game_room.current_opponent,
-        "current_opponent": game_room.current_opponent,
-        "message": f"對手是 {game_room.current_opponent}"
-    }
+            # 更新最後動作，讓所有人都看到
+            room.last_action = f"{current_player_name} 的對手是 {opponent.player_name}！"
+            room.log_event("opponent", player_id=request.player_id, opponent=opponent.player_name)
+            room_log.debug("⚔️ 對決配對: %s vs %s", current_player_name, opponent.player_name, extra={"room": room.room_code})
+        else:
+            room.current_opponent = "無其他玩家"
+            room.last_action = "沒有其他玩家可以對戰！"
+
+        return {
+            "success": True,
+            "opponent_name": room.current_opponent,
+            "current_opponent": room.current_opponent,
+            "message": f"對手是 {room.current_opponent}"
+        }
 
 # =========================================================
 # 遊戲事件（唯一推薦的「正式遊戲流程」入口）
@@ -933,85 +1421,96 @@ class GameEventRequest(BaseModel):
 def _decision_to_actions(decision: Dict[str, Any]) -> List[Dict[str, float]]:
     """
     相容處理：resolve_game_event 可能回傳兩種格式
-    A) {"success": True, "actions": [{"pump_id":1,"duration":0.5}, ...]}
-    B) {"success": True, "pump_id": 1, "duration": 0.5}
-    這裡統一轉成 actions list
+    A) {"success": True, "actions": [{"pump_id":1,"volume_ml":12.5}, ...]}
+    B) {"success": True, "pump_id": 1, "volume_ml": 12.5}
+    這裡統一轉成 actions list（舊格式的 duration 秒數也接受，直接照秒數倒）
     """
     if not decision.get("success"):
         return []
 
+    def to_action(a: Dict[str, Any]) -> Optional[Dict[str, float]]:
+        if "pump_id" not in a:
+            return None
+        if a.get("volume_ml") is not None:
+            return {"pump_id": int(a["pump_id"]), "volume_ml": float(a["volume_ml"])}
+        if a.get("duration") is not None:
+            return {"pump_id": int(a["pump_id"]), "duration": float(a["duration"])}
+        return None
+
     if isinstance(decision.get("actions"), list) and decision["actions"]:
-        # 確保每個 action 都有 pump_id / duration
-        actions: List[Dict[str, float]] = []
-        for a in decision["actions"]:
-            if "pump_id" in a and "duration" in a:
-                actions.append({"pump_id": int(a["pump_id"]), "duration": float(a["duration"])})
-        return actions
+        # 確保每個 action 都有 pump_id 與 volume_ml / duration
+        return [action for action in map(to_action, decision["actions"]) if action is not None]
 
     # fallback: 單顆
-    if "pump_id" in decision and "duration" in decision:
-        return [{"pump_id": int(decision["pump_id"]), "duration": float(decision["duration"])}]
-
-    return []
+    action = to_action(decision)
+    return [action] if action is not None else []
 
 
 @app.post("/api/game/reset")
-def reset_game():
+def reset_game(room: GameRoom = Depends(get_room)):
     """重置遊戲狀態，準備開始新的一局"""
     try:
-        # 重置房間狀態（包括回合數、積分、遊戲記錄等）
-        # 但保留玩家列表，讓同一批玩家可以繼續玩
-        game_room.game_started = False
-        game_room.player_order = []
-        game_room.current_turn_index = 0
-        game_room.current_round = 1  # 回合數重置為 1
-        game_room.game_ended = False
-        game_room.game_result = None
-        
-        # 重置轉盤狀態
-        game_room.wheel_spinning = False
-        game_room.wheel_finished = False
-        game_room.winner_index = None
-        game_room.spin_seed = None
-        game_room.wheel_candidates = []
-        
-        # 重置遊戲共享狀態
-        game_room.base_wine_color = None
-        game_room.base_pump_id = None
-        game_room.dice_values = [1, 1]
-        game_room.current_question = None
-        game_room.current_answer = None
-        game_room.last_action = None
-        game_room.current_opponent = None
-        game_room.wine_stack.clear()
-        
-        # 重置所有玩家的積分為 0
-        for player_id in game_room.players.keys():
-            game_room.player_scores[player_id] = 0
-        
-        print("🔄 遊戲狀態已重置，準備開始新的一局")
-        
+        with room.mutate():
+            # 重置房間狀態（包括回合數、積分、遊戲記錄等）
+            # 但保留玩家列表，讓同一批玩家可以繼續玩
+            room.game_started = False
+            room.player_order = []
+            room.current_turn_index = 0
+            room.current_round = 1  # 回合數重置為 1
+            room.game_ended = False
+            room.game_result = None
+
+            # 重置轉盤狀態
+            room.wheel_spinning = False
+            room.wheel_finished = False
+            room.winner_index = None
+            room.spin_seed = None
+            room.wheel_candidates = []
+
+            # 重置遊戲共享狀態
+            room.base_wine_color = None
+            room.base_pump_id = None
+            room.dice_values = [1, 1]
+            room.current_question = None
+            room.current_answer = None
+            room.last_action = None
+            room.current_opponent = None
+            room.wine_stack.clear()
+
+            # 重置所有玩家的積分為 0
+            for player_id in room.players.keys():
+                room.player_scores[player_id] = 0
+
+            # 還沒結束就被重置的一局也要關檔
+            room.log_event("reset")
+            room.game_id = None
+
+        room_log.info("🔄 遊戲狀態已重置，準備開始新的一局", extra={"room": room.room_code})
+
         return {
             "success": True,
             "message": "遊戲狀態已重置",
-            "current_round": game_room.current_round
+            "current_round": room.current_round
         }
     except Exception as e:
-        print(f"❌ 重置遊戲失敗: {e}")
+        room_log.exception("❌ 重置遊戲失敗", extra={"room": room.room_code})
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/game/event")
-def game_event(request: GameEventRequest):
+def game_event(request: GameEventRequest, room: GameRoom = Depends(get_room)):
     """
     遊戲事件入口：前端只送 event / mode / score
-    後端用 game_logic 決定要啟動哪顆幫浦、幾秒，然後呼叫 pump_controller
+    後端用 game_logic 決定要啟動哪顆幫浦、倒幾 ml，然後交給倒酒執行器
     """
-    # 使用房間的基底幫浦編號，確保所有玩家使用相同的幫浦
+    # 使用房間的基底幫浦編號，確保同一桌的玩家使用相同的幫浦
+    with room.lock:
+        base_pump_id = room.base_pump_id
+
     decision = resolve_game_event(
         mode=request.mode,
         event=request.event,
         score=request.score,
-        base_pump_id=game_room.base_pump_id
+        base_pump_id=base_pump_id
     )
 
     if not decision.get("success"):
@@ -1020,23 +1519,160 @@ def game_event(request: GameEventRequest):
 
     actions = _decision_to_actions(decision)
     if not actions:
-        raise HTTPException(status_code=500, detail="game_logic 回傳格式不正確（找不到 actions 或 pump_id/duration）")
+        raise HTTPException(status_code=500, detail="game_logic 回傳格式不正確（找不到 actions 或 pump_id/volume_ml）")
 
-    # 執行幫浦
-    for action in actions:
-        pump_controller.pump_out(action["pump_id"], action["duration"])
+    # 交給倒酒執行器（ml 在這裡依校正值換算成秒數），計畫被接受就立刻回應；
+    # 完成時會更新房間的 last_pour（並推播）
+    job = pump_executor.submit(actions, room_code=room.room_code, on_done=room.update_pour)
+    room.update_pour(job)
 
     # 回傳決策結果（前端可用來顯示顏色/提示）
     # 也把 actions 填回去，讓回傳格式固定
     decision["actions"] = actions
+    decision["duration"] = max(a["duration"] for a in actions)
+    decision["job_id"] = job.job_id
+    decision["job_status"] = job.status
     return decision
 
+@app.get("/api/game/rules")
+def get_game_rules():
+    """目前生效的倒酒規則（修改 data/game_rules.json 後會自動重新載入）"""
+    return {"success": True, "rules": rule_book.current().to_dict()}
+
+class PourDrinkRequest(BaseModel):
+    recipe_name: Optional[str] = None      # 具名酒譜（見 recipe_engine.RECIPES）
+    colors: Optional[List[str]] = None     # 直接指定顏色清單；兩者都沒給就用房間的基底酒 + 酒堆疊
+    include_base: bool = True              # 使用房間酒堆疊時，是否連同基底酒一起倒
+
+@app.post("/api/game/pour-drink")
+def pour_drink(request: PourDrinkRequest, room: GameRoom = Depends(get_room)):
+    """
+    整杯一次倒：把酒譜 / 酒堆疊算成一個多幫浦的倒酒計畫，整杯只排一個工作
+    """
+    try:
+        if request.recipe_name:
+            ingredients = recipe_to_ingredients(request.recipe_name)
+        elif request.colors:
+            ingredients = stack_to_ingredients(request.colors)
+        else:
+            with room.lock:
+                base_color = room.base_wine_color if request.include_base else None
+                # 基底酒從遊戲選定的基底幫浦倒（與 /api/game/event 相同），不是依顏色對應
+                ingredients = stack_to_ingredients(
+                    room.wine_stack, base_color=base_color, base_pump_id=room.base_pump_id
+                )
+
+        plan = build_pour_plan(
+            ingredients,
+            seconds_for=pump_hardware.seconds_for_volume,
+            max_concurrent=pump_executor.max_concurrent,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = pump_executor.submit(plan["actions"], room_code=room.room_code, on_done=room.update_pour)
+    room.update_pour(job)
+    pump_log.info(
+        "🍸 整杯倒酒: %.1f ml，%d 顆幫浦，預估 %.2f 秒",
+        plan["total_ml"], len(plan["actions"]), plan["estimated_time"],
+        extra={"room": room.room_code, "job_id": job.job_id},
+    )
+
+    return {
+        "success": True,
+        **plan,
+        "job_id": job.job_id,
+        "job_status": job.status,
+    }
+
+# =========================================================
+# 遊戲紀錄（每局的事件 log：列表 / 重播 / 匯出）
+# =========================================================
+def _history_file(game_id: str) -> str:
+    if not game_history.enabled:
+        raise HTTPException(status_code=404, detail="遊戲紀錄未啟用")
+    if not is_valid_game_id(game_id):
+        raise HTTPException(status_code=400, detail="遊戲編號格式錯誤")
+    path = game_history.path(game_id)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="找不到這一局的紀錄")
+    return path
+
+@app.get("/api/game/history")
+def list_game_history(room: GameRoom = Depends(get_room)):
+    """這個房間的遊戲紀錄（新的在前；進行中的一局 finished=False）"""
+    with room.lock:
+        current = room.game_id
+    games = game_history.list_games(room.room_code)
+    for game in games:
+        game["finished"] = game["game_id"] != current
+    return {"success": True, "current_game_id": current, "games": games}
+
+@app.get("/api/game/history/{game_id}/replay")
+def replay_game_history(game_id: str, seq: Optional[int] = Query(None, ge=1)):
+    """重播到第 seq 筆事件（不給 = 最後一筆），回傳當時的事件與房間狀態（格式同 /api/room/state）"""
+    _history_file(game_id)
+    game_history.flush()
+    event, snapshot, version = game_history.replay(game_id, seq)
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="這一局還沒有可重播的狀態")
+
+    # 重建一個獨立的房間（不註冊、沒有 listener），不影響正在進行的遊戲
+    replayed = GameRoom(game_id.split("-", 1)[0])
+    replayed.restore_snapshot(version, snapshot, resume=False)
+    return {
+        "success": True,
+        "game_id": game_id,
+        "seq": event["seq"] if event else 0,
+        "event": event and {k: event[k] for k in ("seq", "ts", "type", "data")},
+        "version": version,
+        "state": replayed.get_state(),
+    }
+
+@app.get("/api/game/history/{game_id}/export")
+def export_game_history(game_id: str):
+    """匯出整局事件（NDJSON，邊讀邊送，不會整個檔案載入記憶體）"""
+    _history_file(game_id)
+    game_history.flush()
+    return StreamingResponse(
+        game_history.iter_lines(game_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{game_id}.ndjson"'},
+    )
+
 # =========================================================
 # （可保留）硬體測試用 API：直接控制幫浦 / LED
 # =========================================================
 class PumpRequest(BaseModel):
     player_id: int           # 幫浦編號: 1-4；若 stop 用 0 表示全部
     duration: Optional[float] = None
+    volume_ml: Optional[float] = None   # 有給就依校正值換算秒數（優先於 duration）
+
+class CalibrationRequest(BaseModel):
+    flow_rate: Optional[float] = None       # ml/s
+    dead_volume_ml: Optional[float] = None
+    startup_lag: Optional[float] = None     # 秒
+
+class CalibrationSample(BaseModel):
+    duration: float        # 校正時跑了幾秒
+    measured_ml: float     # 量杯量到幾 ml
+
+class CalibrationMeasureRequest(BaseModel):
+    samples: List[CalibrationSample]
+
+class CalibrationRunRequest(BaseModel):
+    duration: float = 4.0
+
+class ReservoirConfigRequest(BaseModel):
+    capacity_ml: Optional[float] = None         # 酒瓶容量
+    low_threshold_ml: Optional[float] = None    # 剩餘量低於這個值就警示
+
+class PumpPolicyRequest(BaseModel):
+    policy: str   # random / least_run_time / most_remaining / weighted
+
+class ReservoirRefillRequest(BaseModel):
+    volume_ml: Optional[float] = None   # 換瓶後的剩餘量（不給 = 整瓶）
+    reset_totals: bool = False          # 連同累計運轉時間 / 出水量歸零（換幫浦時用）
 
 class LEDRequest(BaseModel):
     player_id: int
@@ -1044,29 +1680,206 @@ class LEDRequest(BaseModel):
 
 @app.post("/api/pump/out")
 def pump_out_api(request: PumpRequest):
-    """測試用：直接控制幫浦出水"""
+    """測試用：直接控制幫浦出水（排入倒酒執行器，立即回傳工作編號）"""
     try:
-        pump_controller.pump_out(request.player_id, request.duration or 1.0)
-        return {"success": True, "message": f"幫浦 {request.player_id} 已運行"}
+        if request.volume_ml is not None:
+            action = {"pump_id": request.player_id, "volume_ml": request.volume_ml}
+        else:
+            action = {"pump_id": request.player_id, "duration": request.duration or 1.0}
+        job = pump_executor.submit([action])
+        return {"success": True, "message": f"幫浦 {request.player_id} 已排入", "job_id": job.job_id, "actions": job.actions}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/pump/jobs/{job_id}")
+def get_pump_job(job_id: str):
+    """查詢倒酒工作狀態"""
+    job = pump_executor.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="找不到倒酒工作")
+    return job.to_dict()
+
+# --- 幫浦校正 ---
+# 流程：POST .../run 固定跑幾秒 → 用量杯量 → POST .../measure 回填實測值
+# （可以跑不同秒數多量幾次，兩筆以上會一併算出啟動延遲）
+
+@app.get("/api/pump/calibration")
+def get_pump_calibration():
+    """各幫浦目前的校正值"""
+    return {"success": True, "calibration": pump_calibration.to_dict()}
+
+@app.put("/api/pump/calibration/{pump_id}")
+def set_pump_calibration(pump_id: int, request: CalibrationRequest):
+    """直接設定校正值（沒給的欄位沿用目前的值）"""
+    try:
+        current = pump_calibration.get(pump_id).to_dict()
+        current.update(request.model_dump(exclude_none=True))
+        calibration = PumpCalibration.from_dict(current)
+        pump_calibration.set(pump_id, calibration)
+        return {"success": True, "pump_id": pump_id, "calibration": calibration.to_dict()}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/pump/calibration/{pump_id}/run")
+def run_pump_calibration(pump_id: int, request: CalibrationRunRequest):
+    """校正用：依秒數出水（不經換算），之後用量杯量出實際 ml"""
+    if request.duration <= 0:
+        raise HTTPException(status_code=400, detail="duration 必須大於 0")
+    try:
+        job = pump_executor.submit([{"pump_id": pump_id, "duration": request.duration}])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "pump_id": pump_id, "duration": request.duration, "job_id": job.job_id}
+
+@app.post("/api/pump/calibration/{pump_id}/measure")
+def measure_pump_calibration(pump_id: int, request: CalibrationMeasureRequest):
+    """回填實測值，重新計算流量（兩筆以上不同秒數時一併計算啟動延遲）"""
+    try:
+        current = pump_calibration.get(pump_id)
+        calibration = fit_calibration([sample.model_dump() for sample in request.samples], current)
+        pump_calibration.set(pump_id, calibration)
+        return {
+            "success": True,
+            "pump_id": pump_id,
+            "previous": current.to_dict(),
+            "calibration": calibration.to_dict(),
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/pump/reservoirs")
+def get_pump_reservoirs():
+    """各幫浦酒瓶剩餘量與累計運轉時間 / 出水量"""
+    return {"success": True, "reservoirs": pump_reservoirs.status(), "alerts": _reservoir_alerts()}
+
+@app.put("/api/pump/reservoirs/{pump_id}")
+def set_pump_reservoir(pump_id: int, request: ReservoirConfigRequest):
+    """設定酒瓶容量 / 警示門檻"""
+    try:
+        status = pump_reservoirs.configure(pump_id, request.capacity_ml, request.low_threshold_ml)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "pump_id": pump_id, **status[pump_id]}
+
+@app.post("/api/pump/reservoirs/{pump_id}/refill")
+def refill_pump_reservoir(pump_id: int, request: ReservoirRefillRequest):
+    """換瓶 / 補酒後呼叫：剩餘量回到整瓶（或指定的量）"""
+    try:
+        status = pump_reservoirs.refill(pump_id, request.volume_ml, request.reset_totals)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pump_log.info("🍾 幫浦 %d 換瓶，剩餘 %.0f ml", pump_id, status[pump_id]["remaining_ml"])
+    return {"success": True, "pump_id": pump_id, **status[pump_id]}
+
+@app.get("/api/pump/selection-policy")
+def get_pump_selection_policy():
+    """目前的基底幫浦選擇策略"""
+    return {"success": True, "policy": pump_selector.policy_name, "available": list(POLICIES)}
+
+@app.put("/api/pump/selection-policy")
+def set_pump_selection_policy(request: PumpPolicyRequest):
+    """切換基底幫浦選擇策略（不重啟）"""
+    try:
+        pump_selector.set_policy(request.policy)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pump_log.info("🔀 基底幫浦選擇策略: %s", request.policy)
+    return {"success": True, "policy": pump_selector.policy_name}
+
+@app.get("/api/pump/metrics")
+async def get_pump_metrics():
+    """硬體執行緒佇列深度 / 等待時間，以及倒酒工作數量"""
+    return {
+        "hardware": pump_hardware.metrics(),
+        "executor": {
+            "pending_jobs": pump_executor.pending_count(),
+            "max_concurrent": pump_executor.max_concurrent,
+        },
+        # 看門狗：強制關閉次數、心跳、各幫浦近期佔空比
+        "watchdog": pump_watchdog.metrics(),
+        # 模擬模式才有：依流量模型估算的累積出水量（ml）
+        "simulation": {
+            "enabled": pump_hardware.controller.simulation,
+            "dispensed_ml": pump_hardware.controller.dispensed_ml(),
+        },
+    }
+
 @app.post("/api/pump/stop")
-def emergency_stop_api(request: PumpRequest):
-    """緊急停止幫浦"""
+async def emergency_stop_api(request: PumpRequest):
+    """
+    緊急停止幫浦
+    - async endpoint：直接在 event loop 執行，不需要等 threadpool 有空位
+    - 同時取消倒酒工作，停止後不會有幫浦被再次啟動
+    """
     try:
         if request.player_id == 0:
-            pump_controller.emergency_stop()
-            return {"success": True, "message": "所有幫浦已緊急停止"}
-        pump_controller.stop(request.player_id)
-        return {"success": True, "message": f"幫浦 {request.player_id} 已停止"}
+            result = await pump_executor.emergency_stop()
+            return {"success": True, "message": "所有幫浦已緊急停止", **result}
+        result = await pump_executor.stop_pump(request.player_id)
+        return {"success": True, "message": f"幫浦 {request.player_id} 已停止", **result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# --- 房間背景巡檢（回收閒置房間） ---
+
+async def _room_sweep_loop():
+    while True:
+        await asyncio.sleep(ROOM_SWEEP_INTERVAL)
+        for code in room_registry.evict_idle():
+            room_journal.remove(code)
+            room_log.info("🧹 回收閒置房間", extra={"room": code})
+
+# --- 玩家心跳逾時（唯一做清理的地方） ---
+
+async def _player_expiry_loop():
+    """睡到最早到期的時間點（最多 PLAYER_EXPIRY_INTERVAL 秒），再移除逾時玩家"""
+    while True:
+        now = time.monotonic()
+        next_deadline = now + PLAYER_EXPIRY_INTERVAL
+        for room in room_registry.rooms():
+            try:
+                room.remove_inactive_players(now)
+            except Exception:
+                room_log.exception("心跳逾時檢查失敗", extra={"room": room.room_code})
+            deadline = room.heartbeat_deadlines.next_deadline()
+            if deadline is not None:
+                next_deadline = min(next_deadline, deadline)
+        await asyncio.sleep(max(0.0, next_deadline - time.monotonic()))
+
+# --- 幫浦看門狗心跳（event loop 卡住時由看門狗關閉幫浦） ---
+
+async def _watchdog_heartbeat_loop():
+    while True:
+        pump_watchdog.heartbeat()
+        await asyncio.sleep(WATCHDOG_HEARTBEAT_INTERVAL)
+
+@app.on_event("startup")
+async def startup_event():
+    room_broadcaster.bind_loop(asyncio.get_running_loop())
+    # journal 要先啟動：還原時把中斷的倒酒標成失敗也是一次變更，必須寫回磁碟
+    room_journal.start()
+    restore_rooms()
+    game_history.start()
+    pump_reservoirs.start()
+    pump_hardware.start()
+    pump_executor.start(asyncio.get_running_loop())
+    app.state.room_sweep_task = asyncio.create_task(_room_sweep_loop())
+    app.state.player_expiry_task = asyncio.create_task(_player_expiry_loop())
+    app.state.watchdog_heartbeat_task = asyncio.create_task(_watchdog_heartbeat_loop())
+
 # 清理GPIO資源（當應用關閉時）
 @app.on_event("shutdown")
-def shutdown_event():
-    pump_controller.cleanup()
+async def shutdown_event():
+    for name in ("room_sweep_task", "player_expiry_task", "watchdog_heartbeat_task"):
+        task = getattr(app.state, name, None)
+        if task:
+            task.cancel()
+    await pump_executor.shutdown()
+    pump_hardware.shutdown()
+    pump_reservoirs.close()  # 幫浦都停了才寫入最後的用量
+    room_journal.close()
+    game_history.close()
+    shutdown_logging()
 
 
 # 為靜態資源創建明確的路由（避免 mount at "/" 覆蓋其他路由）
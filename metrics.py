@@ -0,0 +1,182 @@
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from prometheus_client.registry import Collector
+from starlette.responses import Response
+
+# =========================
+# HTTP 指標
+# =========================
+# 延遲分桶（秒）：輪詢正常在幾 ms 內，超過 1 秒代表 1 秒輪詢已經跟不上
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# 沒有對到任何路由的請求（404 掃描等）統一成一個標籤，避免標籤數量爆炸
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class HTTPMetrics:
+    """每個路由的延遲直方圖、狀態碼計數與進行中請求數"""
+
+    def __init__(self, registry: CollectorRegistry, namespace: str = ""):
+        self.latency = Histogram(
+            "http_request_duration_seconds", "HTTP 請求處理時間（秒）",
+            ["method", "route"], namespace=namespace, buckets=LATENCY_BUCKETS, registry=registry,
+        )
+        self.requests = Counter(
+            "http_requests", "HTTP 請求數（依狀態碼）",
+            ["method", "route", "status"], namespace=namespace, registry=registry,
+        )
+        # 進行中的請求在路由比對之前就開始計，所以只分 method
+        self.in_progress = Gauge(
+            "http_requests_in_progress", "處理中的 HTTP 請求數",
+            ["method"], namespace=namespace, registry=registry,
+        )
+
+
+class PrometheusMiddleware:
+    """
+    純 ASGI middleware（不用 BaseHTTPMiddleware，避免多包一層 task 的成本）
+
+    路由標籤用路由樣板（例如 /api/pump/jobs/{job_id}），不是實際網址
+    WebSocket 與 lifespan 不統計
+    """
+
+    def __init__(self, app: Callable, metrics: HTTPMetrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+        in_progress = self.metrics.in_progress.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            # 路由比對後 router 會把 route 寫回同一個 scope
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            self.metrics.latency.labels(method, route_path).observe(elapsed)
+            self.metrics.requests.labels(method, route_path, str(status)).inc()
+
+
+def metrics_response(registry: CollectorRegistry) -> Response:
+    """Prometheus 文字格式的 /metrics 回應"""
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+# =========================
+# 遊戲 / 幫浦狀態（抓取時才讀，平常請求零成本）
+# =========================
+class GameCollector(Collector):
+    """
+    每次 /metrics 被抓取時讀一次房間與幫浦狀態
+
+    - rooms: 回傳目前所有房間（GameRoom 快照）
+    - pump_states: {pump_id: off/forward/reverse}
+    - hardware_metrics / pending_jobs: 幫浦執行緒與倒酒工作佇列
+    - reservoirs: {pump_id: {"remaining_ml", "run_seconds", "dispensed_ml", ...}}（酒瓶用量）
+    - watchdog: PumpWatchdog.metrics()（強制關閉次數、佔空比）
+    """
+
+    def __init__(
+        self,
+        rooms: Callable[[], Iterable[Any]],
+        pump_states: Callable[[], dict],
+        hardware_metrics: Optional[Callable[[], dict]] = None,
+        pending_jobs: Optional[Callable[[], int]] = None,
+        reservoirs: Optional[Callable[[], dict]] = None,
+        watchdog: Optional[Callable[[], dict]] = None,
+        namespace: str = "cheers",
+    ):
+        self.rooms = rooms
+        self.pump_states = pump_states
+        self.hardware_metrics = hardware_metrics
+        self.pending_jobs = pending_jobs
+        self.reservoirs = reservoirs
+        self.watchdog = watchdog
+        self.namespace = namespace
+
+    def _name(self, name: str) -> str:
+        return f"{self.namespace}_{name}"
+
+    def collect(self):
+        rooms = list(self.rooms())
+        room_count = GaugeMetricFamily(self._name("rooms"), "目前房間數")
+        room_count.add_metric([], len(rooms))
+        players = GaugeMetricFamily(self._name("room_players"), "房間內玩家數", labels=["room"])
+        queue = GaugeMetricFamily(self._name("room_queue_length"), "房間排隊人數", labels=["room"])
+        version = GaugeMetricFamily(self._name("room_version"), "房間狀態版本（每次變更 +1）", labels=["room"])
+        started = GaugeMetricFamily(self._name("room_game_started"), "房間是否遊戲中", labels=["room"])
+        for room in rooms:
+            # 只讀幾個整數，不拿房間鎖
+            players.add_metric([room.room_code], len(room.players))
+            queue.add_metric([room.room_code], len(room.waiting_queue))
+            version.add_metric([room.room_code], room.version)
+            started.add_metric([room.room_code], 1 if room.game_started else 0)
+        yield from (room_count, players, queue, version, started)
+
+        running = GaugeMetricFamily(self._name("pump_running"), "幫浦是否運轉中（1=運轉）", labels=["pump"])
+        for pump_id, state in sorted(self.pump_states().items()):
+            running.add_metric([str(pump_id)], 0 if state == "off" else 1)
+        yield running
+
+        if self.hardware_metrics is not None:
+            hw = self.hardware_metrics()
+            depth = GaugeMetricFamily(self._name("pump_queue_depth"), "幫浦硬體執行緒佇列深度", labels=["lane"])
+            for lane, value in hw.get("queue_depth", {}).items():
+                depth.add_metric([lane], value)
+            yield depth
+            commands = CounterMetricFamily(self._name("pump_commands"), "幫浦指令累計數", labels=["result"])
+            for key in ("executed", "skipped_starts", "failed"):
+                commands.add_metric([key], hw.get(key, 0))
+            yield commands
+            wait = GaugeMetricFamily(self._name("pump_max_wait_ms"), "幫浦指令最長排隊時間（ms）")
+            wait.add_metric([], hw.get("max_wait_ms", 0.0))
+            yield wait
+
+        if self.pending_jobs is not None:
+            pending = GaugeMetricFamily(self._name("pour_jobs_pending"), "尚未完成的倒酒工作數")
+            pending.add_metric([], self.pending_jobs())
+            yield pending
+
+        if self.reservoirs is not None:
+            remaining = GaugeMetricFamily(self._name("pump_reservoir_remaining_ml"), "酒瓶估計剩餘量（ml）", labels=["pump"])
+            run_time = CounterMetricFamily(self._name("pump_run_seconds"), "幫浦累計運轉時間（秒）", labels=["pump"])
+            dispensed = CounterMetricFamily(self._name("pump_dispensed_ml"), "幫浦累計估計出水量（ml）", labels=["pump"])
+            for pump_id, status in sorted(self.reservoirs().items()):
+                remaining.add_metric([str(pump_id)], status["remaining_ml"])
+                run_time.add_metric([str(pump_id)], status["run_seconds"])
+                dispensed.add_metric([str(pump_id)], status["dispensed_ml"])
+            yield from (remaining, run_time, dispensed)
+
+        if self.watchdog is not None:
+            wd = self.watchdog()
+            overruns = CounterMetricFamily(self._name("pump_watchdog_overruns"), "看門狗因逾時強制關閉幫浦的次數", labels=["pump"])
+            refusals = CounterMetricFamily(self._name("pump_duty_refusals"), "超過佔空比被拒絕啟動的次數", labels=["pump"])
+            duty = GaugeMetricFamily(self._name("pump_duty_cycle"), "幫浦近期佔空比（0~1）", labels=["pump"])
+            for pump_id in sorted(wd.get("duty_cycle", {})):
+                overruns.add_metric([str(pump_id)], wd["overruns"].get(pump_id, 0))
+                refusals.add_metric([str(pump_id)], wd["duty_refusals"].get(pump_id, 0))
+                duty.add_metric([str(pump_id)], wd["duty_cycle"][pump_id])
+            trips = CounterMetricFamily(self._name("pump_watchdog_heartbeat_trips"), "主程式沒有心跳而關閉幫浦的次數")
+            trips.add_metric([], wd.get("heartbeat_trips", 0))
+            max_overrun = GaugeMetricFamily(self._name("pump_watchdog_max_overrun_ms"), "強制關閉時超出預期的最長時間（ms）")
+            max_overrun.add_metric([], wd.get("max_overrun_ms", 0.0))
+            yield from (overruns, refusals, duty, trips, max_overrun)
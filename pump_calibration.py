@@ -0,0 +1,153 @@
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+# =========================
+# 校正檔位置（可用環境變數覆寫）
+# =========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CALIBRATION_FILE = os.getenv("PUMP_CALIBRATION_FILE", os.path.join(BASE_DIR, "data", "pump_calibration.json"))
+
+# 預設值：25 ml/s、沒有死體積與啟動延遲
+# （換算回秒數剛好等於舊版 GAME_RULES 的秒數：0.5 秒 = 12.5 ml）
+DEFAULT_FLOW_RATE = 25.0
+DEFAULT_DEAD_VOLUME = 0.0
+DEFAULT_STARTUP_LAG = 0.0
+
+
+class PumpCalibration:
+    """
+    單顆幫浦的校正曲線
+
+    出水秒數 = startup_lag + (volume_ml + dead_volume_ml) / flow_rate
+    - flow_rate：穩定出水時的流量（ml/s）
+    - dead_volume_ml：每次出水要先填滿、不會進杯子的管路體積
+    - startup_lag：通電到開始穩定出水的延遲（秒）
+    """
+
+    def __init__(
+        self,
+        flow_rate: float = DEFAULT_FLOW_RATE,
+        dead_volume_ml: float = DEFAULT_DEAD_VOLUME,
+        startup_lag: float = DEFAULT_STARTUP_LAG,
+    ):
+        if flow_rate <= 0:
+            raise ValueError("flow_rate 必須大於 0")
+        if dead_volume_ml < 0 or startup_lag < 0:
+            raise ValueError("dead_volume_ml / startup_lag 不能是負數")
+        self.flow_rate = float(flow_rate)
+        self.dead_volume_ml = float(dead_volume_ml)
+        self.startup_lag = float(startup_lag)
+
+    def seconds_for(self, volume_ml: float) -> float:
+        if volume_ml <= 0:
+            return 0.0
+        return self.startup_lag + (volume_ml + self.dead_volume_ml) / self.flow_rate
+
+    def volume_for(self, seconds: float) -> float:
+        """反向換算：跑 seconds 秒大約會倒出多少 ml"""
+        return max(0.0, (seconds - self.startup_lag) * self.flow_rate - self.dead_volume_ml)
+
+    def to_dict(self) -> Dict[str, float]:
+        return {
+            "flow_rate": self.flow_rate,
+            "dead_volume_ml": self.dead_volume_ml,
+            "startup_lag": self.startup_lag,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "PumpCalibration":
+        return cls(
+            flow_rate=data.get("flow_rate", DEFAULT_FLOW_RATE),
+            dead_volume_ml=data.get("dead_volume_ml", DEFAULT_DEAD_VOLUME),
+            startup_lag=data.get("startup_lag", DEFAULT_STARTUP_LAG),
+        )
+
+
+def fit_calibration(samples: List[Dict[str, float]], current: PumpCalibration) -> PumpCalibration:
+    """
+    依實測資料計算新的校正值
+
+    samples: [{"duration": 跑了幾秒, "measured_ml": 量到幾 ml}, ...]
+    - 只有一筆（或秒數都相同）：沿用目前的 dead_volume / startup_lag，只重算流量
+    - 兩筆以上不同秒數：最小平方法擬合 ml = flow * t + b，
+      截距扣掉目前的 dead_volume 後視為 startup_lag
+    """
+    points = [(float(s["duration"]), float(s["measured_ml"])) for s in samples]
+    if not points:
+        raise ValueError("至少需要一筆校正資料")
+    if any(t <= 0 or ml < 0 for t, ml in points):
+        raise ValueError("duration 必須大於 0，measured_ml 不能是負數")
+
+    durations = {t for t, _ in points}
+    if len(durations) == 1:
+        total_time = sum(t for t, _ in points) - len(points) * current.startup_lag
+        total_ml = sum(ml for _, ml in points) + len(points) * current.dead_volume_ml
+        if total_time <= 0 or total_ml <= 0:
+            raise ValueError("校正資料不足以計算流量")
+        return PumpCalibration(total_ml / total_time, current.dead_volume_ml, current.startup_lag)
+
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_ml = sum(ml for _, ml in points) / n
+    var_t = sum((t - mean_t) ** 2 for t, _ in points)
+    cov = sum((t - mean_t) * (ml - mean_ml) for t, ml in points)
+    flow_rate = cov / var_t
+    if flow_rate <= 0:
+        raise ValueError("校正資料不合理（出水量沒有隨時間增加）")
+    intercept = mean_ml - flow_rate * mean_t
+    startup_lag = max(0.0, (-intercept - current.dead_volume_ml) / flow_rate)
+    return PumpCalibration(flow_rate, current.dead_volume_ml, startup_lag)
+
+
+class CalibrationStore:
+    """
+    各幫浦校正值（JSON 檔持久化）
+
+    - 讀取是 dict 查詢；更新時整份寫到暫存檔再 os.replace，避免寫到一半斷電
+    - 檔案不存在時全部使用預設值
+    """
+
+    def __init__(self, pump_ids: Iterable[int], path: Optional[str] = CALIBRATION_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._calibrations: Dict[int, PumpCalibration] = {pump_id: PumpCalibration() for pump_id in pump_ids}
+        self.load()
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            for key, value in data.get("pumps", {}).items():
+                pump_id = int(key)
+                if pump_id in self._calibrations:
+                    self._calibrations[pump_id] = PumpCalibration.from_dict(value)
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"pumps": {str(pump_id): c.to_dict() for pump_id, c in self._calibrations.items()}}
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    def get(self, pump_id: int) -> PumpCalibration:
+        if pump_id not in self._calibrations:
+            raise ValueError(f"無效的 pump_id: {pump_id}")
+        return self._calibrations[pump_id]
+
+    def set(self, pump_id: int, calibration: PumpCalibration):
+        if pump_id not in self._calibrations:
+            raise ValueError(f"無效的 pump_id: {pump_id}")
+        with self._lock:
+            self._calibrations[pump_id] = calibration
+        self.save()
+
+    def to_dict(self) -> Dict[int, Dict[str, float]]:
+        return {pump_id: c.to_dict() for pump_id, c in self._calibrations.items()}
@@ -1,18 +1,28 @@
+import os
 import time
-import logging
-from typing import Dict
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from log_config import get_logger
+from pump_calibration import CalibrationStore
+from pump_reservoir import ReservoirTracker
+from pump_watchdog import PumpWatchdog
 
 # =========================
 # GPIO 嘗試載入（支援模擬）
+# PUMP_SIMULATION=1 可以在樹莓派上也強制使用模擬
 # =========================
 try:
+    if os.getenv("PUMP_SIMULATION") == "1":
+        raise ImportError("PUMP_SIMULATION=1")
     import RPi.GPIO as GPIO
     SIMULATION_MODE = False
 except (ImportError, RuntimeError):
+    GPIO = None
     SIMULATION_MODE = True
 
-logging.basicConfig(level=logging.INFO)
-logger = logging.getLogger(__name__)
+logger = get_logger("pump")
 
 
 # =========================
@@ -27,26 +37,215 @@ PUMP_PINS: Dict[int, Dict[str, int]] = {
 }
 
 
+# =========================
+# 模擬模式設定
+# =========================
+# 模擬用的幫浦流量（ml/s）
+SIMULATED_FLOW_RATES: Dict[int, float] = {pump_id: 25.0 for pump_id in PUMP_PINS}
+
+# 每個腳位 / 幫浦保留的時間軸筆數
+SIM_TIMELINE_SIZE = 1000
+
+# 模擬時鐘相對真實時間的倍速：非同步倒酒執行器的計時也依這個倍速縮短，
+# 一杯 4 秒的酒在模擬模式下 0.2 秒倒完（PUMP_SIM_SPEED=1 可還原成真實時間）
+# 代價是排程延遲也被放大（20 倍時約 ±0.5 ml）；要比對出水量時用 1
+SIM_SPEED = float(os.getenv("PUMP_SIM_SPEED", "20"))
+
+# 幫浦狀態（由 IN1 / IN2 組合而來）
+PUMP_OFF = "off"
+PUMP_FORWARD = "forward"
+PUMP_REVERSE = "reverse"
+
+
+class RealClock:
+    """真實時間（接實際硬體時使用）"""
+
+    speed = 1.0
+
+    def now(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """
+    模擬用時鐘
+
+    - 平常以 speed 倍速跟著真實時間走：非同步倒酒執行器把計時除以 speed，
+      模擬時間量出來的出水秒數仍然正確
+    - sleep() / advance() 不真的等待，直接把時鐘往前撥：
+      阻塞式的 pump_out() 瞬間完成，整場遊戲幾秒內就能跑完
+    """
+
+    def __init__(self, speed: float = SIM_SPEED):
+        if speed <= 0:
+            raise ValueError("speed 必須大於 0")
+        self.speed = speed
+        self._origin = time.monotonic()
+        self._offset = 0.0
+        self._lock = threading.Lock()
+
+    def now(self) -> float:
+        with self._lock:
+            return (time.monotonic() - self._origin) * self.speed + self._offset
+
+    def sleep(self, seconds: float):
+        self.advance(seconds)
+
+    def advance(self, seconds: float):
+        if seconds < 0:
+            raise ValueError("時間不能倒退")
+        with self._lock:
+            self._offset += seconds
+
+
+class SimulatedGPIO:
+    """
+    RPi.GPIO 的模擬版（只實作 PumpController 用到的部分）
+
+    每個腳位記錄 (時間, 電位) 時間軸，時間取自 VirtualClock
+    """
+
+    BCM = "BCM"
+    OUT = "OUT"
+    HIGH = 1
+    LOW = 0
+
+    def __init__(self, clock: VirtualClock):
+        self.clock = clock
+        self.mode: Optional[str] = None
+        self.levels: Dict[int, int] = {}
+        self.timelines: Dict[int, Deque[Tuple[float, int]]] = {}
+        self._lock = threading.Lock()
+
+    def setmode(self, mode: str):
+        self.mode = mode
+
+    def setwarnings(self, flag: bool):
+        pass
+
+    def setup(self, pin: int, mode: str, initial: int = LOW):
+        self.output(pin, initial)
+
+    def output(self, pin: int, value: int):
+        value = self.HIGH if value else self.LOW
+        with self._lock:
+            if self.levels.get(pin) == value:
+                return
+            self.levels[pin] = value
+            self.timelines.setdefault(pin, deque(maxlen=SIM_TIMELINE_SIZE)).append((self.clock.now(), value))
+
+    def input(self, pin: int) -> int:
+        return self.levels.get(pin, self.LOW)
+
+    def cleanup(self):
+        with self._lock:
+            self.levels.clear()
+
+    def pin_timeline(self, pin: int) -> List[Tuple[float, int]]:
+        with self._lock:
+            return list(self.timelines.get(pin, ()))
+
+
+class FlowModel:
+    """
+    模擬出水量：幫浦正轉期間以固定流量累積 ml
+    - 只在狀態改變時結算，不需要保留完整時間軸
+    """
+
+    def __init__(self, clock: VirtualClock, flow_rates: Optional[Dict[int, float]] = None):
+        self.clock = clock
+        self.flow_rates = dict(flow_rates or SIMULATED_FLOW_RATES)
+        self._state: Dict[int, str] = {}
+        self._since: Dict[int, float] = {}
+        self._dispensed: Dict[int, float] = {}
+        self.timelines: Dict[int, Deque[Tuple[float, str]]] = {}
+        self._lock = threading.Lock()
+
+    def update(self, pump_id: int, state: str):
+        with self._lock:
+            now = self.clock.now()
+            previous = self._state.get(pump_id, PUMP_OFF)
+            if previous == state:
+                return
+            self._settle(pump_id, now)
+            self._state[pump_id] = state
+            self._since[pump_id] = now
+            self.timelines.setdefault(pump_id, deque(maxlen=SIM_TIMELINE_SIZE)).append((now, state))
+
+    def _settle(self, pump_id: int, now: float):
+        if self._state.get(pump_id) == PUMP_FORWARD:
+            elapsed = now - self._since[pump_id]
+            self._dispensed[pump_id] = self._dispensed.get(pump_id, 0.0) + elapsed * self.flow_rates.get(pump_id, 0.0)
+            self._since[pump_id] = now
+
+    def dispensed_ml(self, pump_id: int) -> float:
+        """累積出水量（含正在出水中的部分）"""
+        with self._lock:
+            self._settle(pump_id, self.clock.now())
+            return self._dispensed.get(pump_id, 0.0)
+
+    def timeline(self, pump_id: int) -> List[Tuple[float, str]]:
+        with self._lock:
+            return list(self.timelines.get(pump_id, ()))
+
+    def reset(self):
+        with self._lock:
+            now = self.clock.now()
+            self._dispensed.clear()
+            self.timelines.clear()
+            for pump_id, state in self._state.items():
+                self._since[pump_id] = now
+                self.timelines.setdefault(pump_id, deque(maxlen=SIM_TIMELINE_SIZE)).append((now, state))
+
+
 class PumpController:
     """
     純硬體控制層
     - 不知道遊戲規則
     - 不知道 FastAPI
+    - 模擬模式下改用 SimulatedGPIO + VirtualClock，並以 FlowModel 估算出水量
+    - 依 CalibrationStore 把 ml 換算成出水秒數
+    - 每次停止時把運轉時間 / 估計出水量累加到 ReservoirTracker（酒瓶剩餘量）
+    - 每次啟動先向 PumpWatchdog 登記期限；逾時 / 主程式沒心跳時由看門狗直接關閉
     """
 
-    def __init__(self):
+    def __init__(
+        self,
+        simulation: Optional[bool] = None,
+        flow_rates: Optional[Dict[int, float]] = None,
+        calibration: Optional[CalibrationStore] = None,
+        reservoirs: Optional[ReservoirTracker] = None,
+        watchdog: Optional[PumpWatchdog] = None,
+    ):
         self.initialized = False
-        if not SIMULATION_MODE:
-            self._init_gpio()
+        self.states: Dict[int, str] = {pump_id: PUMP_OFF for pump_id in PUMP_PINS}
+        self.calibration = calibration or CalibrationStore(PUMP_PINS.keys())
+        self.reservoirs = reservoirs or ReservoirTracker(PUMP_PINS.keys())
+        self._running_since: Dict[int, float] = {}  # pump_id -> 這次開始轉動的時間
+        self.watchdog = watchdog or PumpWatchdog(PUMP_PINS.keys(), force_off=self.force_off)
+        self.simulation = SIMULATION_MODE if simulation is None else simulation
+        if self.simulation:
+            self.clock = VirtualClock()
+            self.gpio = SimulatedGPIO(self.clock)
+            self.flow: Optional[FlowModel] = FlowModel(self.clock, flow_rates)
+        else:
+            self.clock = RealClock()
+            self.gpio = GPIO
+            self.flow = None
+        self._init_gpio()
 
     def _init_gpio(self):
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
+        self.gpio.setmode(self.gpio.BCM)
+        self.gpio.setwarnings(False)
 
         for pump_id, pins in PUMP_PINS.items():
-            GPIO.setup(pins["in1"], GPIO.OUT, initial=GPIO.LOW)
-            GPIO.setup(pins["in2"], GPIO.OUT, initial=GPIO.LOW)
-            logger.info(f"幫浦 {pump_id} 初始化完成")
+            self.gpio.setup(pins["in1"], self.gpio.OUT, initial=self.gpio.LOW)
+            self.gpio.setup(pins["in2"], self.gpio.OUT, initial=self.gpio.LOW)
+            if not self.simulation:
+                logger.info("幫浦 %d 初始化完成", pump_id)
 
         self.initialized = True
 
@@ -59,38 +258,108 @@ class PumpController:
 
         pins = PUMP_PINS[pump_id]
 
-        if SIMULATION_MODE:
-            logger.info(
-                f"[模擬] 幫浦{pump_id} "
-                f"IN1={'HIGH' if in1 else 'LOW'}, "
-                f"IN2={'HIGH' if in2 else 'LOW'}"
+        if self.simulation:
+            logger.debug(
+                "[模擬] 幫浦%d IN1=%s, IN2=%s",
+                pump_id, "HIGH" if in1 else "LOW", "HIGH" if in2 else "LOW",
             )
-            return
 
-        GPIO.output(pins["in1"], GPIO.HIGH if in1 else GPIO.LOW)
-        GPIO.output(pins["in2"], GPIO.HIGH if in2 else GPIO.LOW)
+        self.gpio.output(pins["in1"], self.gpio.HIGH if in1 else self.gpio.LOW)
+        self.gpio.output(pins["in2"], self.gpio.HIGH if in2 else self.gpio.LOW)
+
+        if in1 and not in2:
+            state = PUMP_FORWARD
+        elif in2 and not in1:
+            state = PUMP_REVERSE
+        else:
+            state = PUMP_OFF
+        previous = self.states.get(pump_id, PUMP_OFF)
+        self.states[pump_id] = state
+        if self.flow is not None:
+            self.flow.update(pump_id, state)
+        if state != previous:
+            self._account_run(pump_id, previous, state)
+            if state == PUMP_OFF:
+                self.watchdog.disarm(pump_id)
+
+    def _account_run(self, pump_id: int, previous: str, state: str):
+        """馬達狀態改變時結算上一段運轉（只在硬體執行緒中呼叫）"""
+        now = self.clock.now()
+        since = self._running_since.pop(pump_id, None)
+        if since is not None:
+            elapsed = now - since
+            volume_ml = 0.0
+            if previous == PUMP_FORWARD:
+                # 從瓶子抽走的量：扣掉啟動延遲後以流量估算（管路死體積也是從瓶子抽的，不扣）
+                cal = self.calibration.get(pump_id)
+                volume_ml = max(0.0, elapsed - cal.startup_lag) * cal.flow_rate
+            self.reservoirs.record_run(pump_id, elapsed, volume_ml)
+        if state != PUMP_OFF:
+            self._running_since[pump_id] = now
 
     # =========================
     # 對外 API（給 main.py 用）
     # =========================
-    def pump_out(self, pump_id: int, duration: float):
+    def start(self, pump_id: int, expected_seconds: Optional[float] = None):
         """
-        啟動幫浦出水（單方向）
+        啟動幫浦出水（不阻塞，由呼叫端負責計時並呼叫 stop）
+        expected_seconds：預計出水秒數（本控制器時鐘的秒數），看門狗換算成真實時間設定期限
+        （不給就用 MAX_RUN_SECONDS）
+        超過佔空比時丟 PumpDutyCycleError，幫浦不會啟動
         """
-        logger.info(f"幫浦 {pump_id} 出水 {duration} 秒")
+        if pump_id not in PUMP_PINS:
+            raise ValueError(f"無效的 pump_id: {pump_id}")
+        # 看門狗用真實時間：模擬模式的倍速時鐘要換算回真實秒數
+        real_seconds = None if expected_seconds is None else expected_seconds / self.clock.speed
+        self.watchdog.arm(pump_id, real_seconds)
+        logger.info("幫浦 %d 啟動", pump_id)
 
         # 正轉（依你實際接線，必要時對調）
         self._set_motor(pump_id, True, False)
-        time.sleep(duration)
-        self.stop(pump_id)
+
+    def pump_out(self, pump_id: int, duration: float):
+        """
+        啟動幫浦出水（單方向，阻塞直到倒完；模擬模式下瞬間完成）
+        """
+        logger.info("幫浦 %d 出水 %.3f 秒", pump_id, duration)
+
+        self.start(pump_id, duration)
+        try:
+            self.clock.sleep(duration)
+        finally:
+            self.stop(pump_id)
+
+    def seconds_for_volume(self, pump_id: int, volume_ml: float) -> float:
+        """依校正曲線把 ml 換算成出水秒數（純計算，不碰 GPIO）"""
+        return self.calibration.get(pump_id).seconds_for(volume_ml)
+
+    def pump_volume(self, pump_id: int, volume_ml: float):
+        """
+        倒出指定 ml（阻塞直到倒完）
+        """
+        self.pump_out(pump_id, self.seconds_for_volume(pump_id, volume_ml))
 
     def stop(self, pump_id: int):
         """
         停止指定幫浦
         """
-        logger.info(f"幫浦 {pump_id} 停止")
+        logger.info("幫浦 %d 停止", pump_id)
         self._set_motor(pump_id, False, False)
 
+    def force_off(self, pump_id: int):
+        """
+        看門狗用：只把腳位拉 LOW（在看門狗執行緒中呼叫，不經過硬體執行緒）
+        - GPIO 寫入本身是單一暫存器操作，和硬體執行緒同時呼叫也只會是兩次 LOW
+        - 不碰 states / 流量模型 / 用量累計（這些只有硬體執行緒會寫）；
+          那些由之後排入硬體執行緒的 stop 指令補做（見 PumpHardwareThread._watchdog_stop）
+        """
+        if pump_id not in PUMP_PINS:
+            raise ValueError(f"無效的 pump_id: {pump_id}")
+        logger.error("幫浦 %d 被看門狗強制關閉", pump_id)
+        pins = PUMP_PINS[pump_id]
+        self.gpio.output(pins["in1"], self.gpio.LOW)
+        self.gpio.output(pins["in2"], self.gpio.LOW)
+
     def emergency_stop(self):
         """
         緊急停止所有幫浦
@@ -104,9 +373,35 @@ class PumpController:
         程式結束時呼叫
         """
         self.emergency_stop()
-        if not SIMULATION_MODE and self.initialized:
-            GPIO.cleanup()
-            logger.info("GPIO cleanup 完成")
+        if self.initialized:
+            self.gpio.cleanup()
+            if not self.simulation:
+                logger.info("GPIO cleanup 完成")
+
+    # =========================
+    # 模擬模式：出水量 / 時間軸
+    # =========================
+    def pump_states(self) -> Dict[int, str]:
+        """各幫浦目前的馬達狀態（off / forward / reverse）"""
+        return dict(self.states)
+
+    def dispensed_ml(self, pump_id: Optional[int] = None) -> Dict[int, float]:
+        """各幫浦累積出水量（ml），只有模擬模式有資料"""
+        if self.flow is None:
+            return {}
+        pump_ids = PUMP_PINS.keys() if pump_id is None else [pump_id]
+        return {pid: self.flow.dispensed_ml(pid) for pid in pump_ids}
+
+    def pump_timeline(self, pump_id: int) -> List[Tuple[float, str]]:
+        """幫浦狀態時間軸 [(虛擬時間, off/forward/reverse), ...]，只有模擬模式有資料"""
+        if self.flow is None:
+            return []
+        return self.flow.timeline(pump_id)
+
+    def reset_simulation(self):
+        """清空模擬出水量與時間軸（測試之間呼叫）"""
+        if self.flow is not None:
+            self.flow.reset()
 
 
 # 全域實例（main.py 直接 import 用）
@@ -0,0 +1,356 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from log_config import get_logger
+from pump_controller import PUMP_PINS
+from pump_hardware import PumpHardwareThread
+
+logger = get_logger("pump")
+
+# 保留最近幾筆倒酒工作供查詢
+JOB_HISTORY_SIZE = 200
+
+# =========================
+# 電源預算（MW LRS-50-12：12V / 4.2A）
+# 兩台 L298N 共用同一顆電源，同時運轉的幫浦數受電流限制
+# =========================
+PSU_VOLTAGE = 12.0
+PSU_RATED_CURRENT = 4.2
+PSU_DERATING = 0.8            # 只用額定電流的 80%，保留啟動突波與 L298N 壓降的餘裕
+PUMP_RUNNING_CURRENT = 1.0    # 單顆幫浦運轉電流（A，依實測調整）
+
+
+def max_concurrent_pumps() -> int:
+    """
+    同時運轉幫浦數上限
+    - 可用環境變數 PUMP_MAX_CONCURRENT 直接指定
+    - 否則依電源預算計算，至少 1 顆、最多全部幫浦
+    """
+    configured = os.getenv("PUMP_MAX_CONCURRENT")
+    if configured:
+        limit = int(configured)
+    else:
+        limit = int(PSU_RATED_CURRENT * PSU_DERATING // PUMP_RUNNING_CURRENT)
+    return max(1, min(limit, len(PUMP_PINS)))
+
+
+class PourJob:
+    """
+    一次倒酒工作（一個 pour plan，可包含多顆幫浦）
+
+    status: queued -> running -> done / failed / cancelled
+    """
+
+    def __init__(
+        self,
+        actions: List[Dict[str, float]],
+        room_code: Optional[str] = None,
+        stop_epoch: int = 0,
+    ):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.actions = actions
+        self.room_code = room_code
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        # 排入時的緊急停止世代；之後發生過緊急停止的話，這個工作一律不能再啟動幫浦
+        self.stop_epoch = stop_epoch
+
+    @property
+    def pump_time(self) -> float:
+        """所有幫浦出水秒數加總（逐顆倒的話需要的時間）"""
+        return sum(float(a["duration"]) for a in self.actions)
+
+    @property
+    def wall_time(self) -> Optional[float]:
+        """實際從開始到倒完的時間"""
+        if self.started_at is None or self.finished_at is None:
+            return None
+        return self.finished_at - self.started_at
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "actions": self.actions,
+            "room_code": self.room_code,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "pump_time": self.pump_time,
+            "wall_time": self.wall_time,
+        }
+
+
+class PourCancelled(Exception):
+    """倒酒被停止（緊急停止 / 單顆停止）"""
+
+
+class PumpExecutor:
+    """
+    非阻塞倒酒執行器
+
+    - submit() 可以從任何執行緒呼叫（同步 endpoint 在 threadpool 中），立刻回傳 job
+    - 排程與計時在 event loop 中執行，GPIO 呼叫交給 PumpHardwareThread，不佔用 threadpool
+    - 工作之間依序執行（一次一杯）；同一杯的不同幫浦並行出水，
+      同時運轉的數量受電源預算限制，同一顆幫浦的動作一定排隊
+    - 每次出水由 deadline timer 負責關閉；emergency_stop() 會取消所有排隊中 /
+      執行中的工作，之後這些工作不會再啟動任何幫浦
+    - 工作完成後在 threadpool 中呼叫 on_done(job)，讓呼叫端把結果寫回房間狀態
+      （回呼會拿房間鎖、寫快照，不能卡住 event loop 上的計時與看門狗心跳）
+    """
+
+    def __init__(
+        self,
+        hardware: PumpHardwareThread,
+        history_size: int = JOB_HISTORY_SIZE,
+        max_concurrent: Optional[int] = None,
+    ):
+        self.hardware = hardware
+        self.history_size = history_size
+        self.max_concurrent = max_concurrent or max_concurrent_pumps()
+        self._power: Optional[asyncio.Semaphore] = None
+        self._pump_locks: Dict[int, asyncio.Lock] = {}
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._jobs: "OrderedDict[str, PourJob]" = OrderedDict()
+        self._callbacks: Dict[str, Callable[[PourJob], None]] = {}
+        self._lock = threading.Lock()
+        self._stop_epoch = 0
+        self._current: Optional[PourJob] = None
+        self._current_task: Optional[asyncio.Task] = None
+        self._pour_tasks: Dict[int, Set[asyncio.Task]] = {}
+
+    # =========================
+    # 生命週期
+    # =========================
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._queue = asyncio.Queue()
+        self._power = asyncio.Semaphore(self.max_concurrent)
+        self._pump_locks = {pump_id: asyncio.Lock() for pump_id in PUMP_PINS}
+        self._worker = loop.create_task(self._run())
+
+    async def shutdown(self):
+        await self.emergency_stop()
+        if self._worker:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    # =========================
+    # 對外 API
+    # =========================
+    def submit(
+        self,
+        actions: List[Dict[str, float]],
+        room_code: Optional[str] = None,
+        on_done: Optional[Callable[[PourJob], None]] = None,
+    ) -> PourJob:
+        """
+        排入一個倒酒工作（執行緒安全），立刻回傳
+
+        action 可以給 duration（秒）或 volume_ml（依校正值換算成秒數）
+        """
+        if self.loop is None:
+            raise RuntimeError("PumpExecutor 尚未啟動")
+        for action in actions:
+            if int(action["pump_id"]) not in PUMP_PINS:
+                raise ValueError(f"無效的 pump_id: {action['pump_id']}")
+            if "duration" not in action:
+                if "volume_ml" not in action:
+                    raise ValueError("action 需要 duration 或 volume_ml")
+                action["duration"] = self.hardware.seconds_for_volume(int(action["pump_id"]), float(action["volume_ml"]))
+
+        job = PourJob(actions, room_code, stop_epoch=self._stop_epoch)
+        with self._lock:
+            self._jobs[job.job_id] = job
+            if on_done is not None:
+                self._callbacks[job.job_id] = on_done
+            while len(self._jobs) > self.history_size:
+                old_id, _ = self._jobs.popitem(last=False)
+                self._callbacks.pop(old_id, None)
+
+        self.loop.call_soon_threadsafe(self._queue.put_nowait, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[PourJob]:
+        return self._jobs.get(job_id)
+
+    def pending_count(self) -> int:
+        return sum(1 for job in list(self._jobs.values()) if not job.finished)
+
+    async def emergency_stop(self) -> Dict[str, Any]:
+        """
+        緊急停止（必須在 event loop 中呼叫）
+
+        1. 世代 +1：之前排入的工作全部失效，不會再啟動幫浦
+        2. 立刻把所有幫浦腳位拉 LOW
+        3. 取消排隊中的工作，並等執行中的工作收尾
+        回傳停止延遲（毫秒）與被取消的工作
+        """
+        t0 = time.perf_counter()
+        self._stop_epoch += 1
+        # 走硬體執行緒的優先佇列，排在所有 start 前面
+        await asyncio.wrap_future(self.hardware.emergency_stop())
+        stop_latency = time.perf_counter() - t0
+
+        cancelled: List[str] = []
+        if self._queue is not None:
+            while not self._queue.empty():
+                job = self._queue.get_nowait()
+                self._cancel_queued(job)
+                cancelled.append(job.job_id)
+
+        current, task = self._current, self._current_task
+        if task is not None and not task.done():
+            cancelled.append(current.job_id)
+            task.cancel()
+            await asyncio.wait([task])
+
+        return {
+            "stop_latency_ms": round(stop_latency * 1000, 3),
+            "settle_latency_ms": round((time.perf_counter() - t0) * 1000, 3),
+            "cancelled_jobs": cancelled,
+        }
+
+    async def stop_pump(self, pump_id: int) -> Dict[str, Any]:
+        """停止單顆幫浦，並取消目前工作中這顆幫浦的出水（必須在 event loop 中呼叫）"""
+        t0 = time.perf_counter()
+        await asyncio.wrap_future(self.hardware.stop_pump(pump_id))
+        stop_latency = time.perf_counter() - t0
+
+        tasks = [t for t in self._pour_tasks.get(pump_id, ()) if not t.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks)
+
+        return {
+            "stop_latency_ms": round(stop_latency * 1000, 3),
+            "settle_latency_ms": round((time.perf_counter() - t0) * 1000, 3),
+            "cancelled_pours": len(tasks),
+        }
+
+    # =========================
+    # 內部：執行工作
+    # =========================
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            if job.stop_epoch != self._stop_epoch:
+                # 排入之後發生過緊急停止（submit 與 emergency_stop 同時發生時會走到這裡）
+                self._cancel_queued(job)
+                continue
+            self._current = job
+            self._current_task = self.loop.create_task(self._execute(job))
+            try:
+                # 用 wait 而不是直接 await：工作被取消時 worker 本身不會跟著結束
+                await asyncio.wait([self._current_task])
+            finally:
+                self._current = None
+                self._current_task = None
+
+    def _cancel_queued(self, job: PourJob):
+        job.status = "cancelled"
+        job.error = "緊急停止"
+        job.finished_at = time.time()
+        self._notify(job)
+
+    async def _execute(self, job: PourJob):
+        job.status = "running"
+        job.started_at = time.time()
+        # 長的先倒：名額不夠時，最長的那顆先開始，總時間才會接近最長單顆
+        ordered = sorted(job.actions, key=lambda a: float(a["duration"]), reverse=True)
+        tasks: List[asyncio.Task] = []
+        for a in ordered:
+            pump_id = int(a["pump_id"])
+            task = self.loop.create_task(self._pour(job, pump_id, float(a["duration"])))
+            self._pour_tasks.setdefault(pump_id, set()).add(task)
+            task.add_done_callback(self._pour_tasks[pump_id].discard)
+            tasks.append(task)
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+            cancelled = [r for r in results if isinstance(r, (asyncio.CancelledError, PourCancelled))]
+            errors = [r for r in results if isinstance(r, BaseException) and r not in cancelled]
+            if errors:
+                raise errors[0]
+            if cancelled:
+                job.status = "cancelled"
+                job.error = str(cancelled[0]) or "倒酒被停止"
+            else:
+                job.status = "done"
+        except asyncio.CancelledError:
+            # 整個工作被取消（緊急停止）：gather 已經把每個出水 task 取消，幫浦都在 finally 關掉了
+            job.status = "cancelled"
+            job.error = "緊急停止"
+        except Exception as e:
+            logger.exception("倒酒工作 %s 失敗", job.job_id)
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            self._notify(job)
+
+    async def _pour(self, job: PourJob, pump_id: int, duration: float):
+        # 先拿幫浦的鎖再拿電源名額，避免排隊等同一顆幫浦時白白佔住名額
+        async with self._pump_locks[pump_id]:
+            async with self._power:
+                # 等名額期間可能發生過緊急停止：啟動前最後再確認一次
+                if job.stop_epoch != self._stop_epoch:
+                    raise PourCancelled("緊急停止")
+
+                expired: Optional[asyncio.Future] = None
+                timer: Optional[asyncio.TimerHandle] = None
+                try:
+                    started = await asyncio.wrap_future(self.hardware.start_pump(pump_id, duration))
+                    if not started:
+                        raise PourCancelled("幫浦啟動前已被停止")
+
+                    # deadline timer 負責到時關閉幫浦（從確認啟動起算）；被取消時在 finally 立刻關閉
+                    # 模擬模式的時鐘是倍速的，真實等待時間依倍速縮短
+                    expired = self.loop.create_future()
+                    wait = duration / self.hardware.time_scale()
+                    timer = self.loop.call_at(self.loop.time() + wait, self._expire, pump_id, expired)
+                    await expired
+                finally:
+                    if timer is not None:
+                        timer.cancel()
+                    if expired is None or expired.cancelled():
+                        # start 可能已經在硬體執行緒執行：補一個 stop（優先佇列，比它晚排入就會讓它失效）
+                        self.hardware.stop_pump(pump_id)
+
+    def _expire(self, pump_id: int, expired: asyncio.Future):
+        self.hardware.stop_pump(pump_id)
+        if not expired.done():
+            expired.set_result(None)
+
+    def _notify(self, job: PourJob):
+        with self._lock:
+            callback = self._callbacks.pop(job.job_id, None)
+        if callback is None:
+            return
+        # 在 event loop 中被呼叫：只負責把回呼丟給 threadpool
+        self.loop.run_in_executor(None, self._run_callback, callback, job)
+
+    def _run_callback(self, callback: Callable[[PourJob], None], job: PourJob):
+        try:
+            callback(job)
+        except Exception:
+            logger.exception("倒酒工作 %s 完成回呼失敗", job.job_id)
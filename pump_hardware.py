@@ -0,0 +1,236 @@
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+from log_config import get_logger
+from pump_controller import PumpController, PUMP_PINS, pump_controller
+
+logger = get_logger("pump")
+
+# =========================
+# 指令優先序（數字小的先執行）
+# =========================
+PRIORITY_STOP = 0      # stop / emergency_stop：插隊
+PRIORITY_NORMAL = 1    # start 與其他指令
+
+# 所有幫浦的 stop 序號用這個 key 記錄
+ALL_PUMPS = 0
+
+
+class _Command:
+    def __init__(self, priority: int, seq: int, name: str, pump_id: Optional[int], fn: Callable[[], Any]):
+        self.priority = priority
+        self.seq = seq
+        self.name = name
+        self.pump_id = pump_id
+        self.fn = fn
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+    def __lt__(self, other: "_Command") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class PumpHardwareThread:
+    """
+    幫浦硬體專用執行緒（唯一擁有 PumpController 的地方）
+
+    - 所有 GPIO 呼叫都在這條執行緒中依序執行，不佔用 HTTP threadpool，
+      也不會在 event loop 裡做任何可能卡住的硬體操作
+    - 兩條佇列：stop 類指令優先，排在所有 start 前面
+    - stop 插隊後，比它更早排入、但還沒執行的 start 會被丟掉（回傳 False），
+      保證「先要求啟動、後要求停止」的幫浦最後一定是停止狀態
+    - 每個指令回傳 concurrent.futures.Future，asyncio 端用 asyncio.wrap_future 等待
+    """
+
+    def __init__(self, controller: PumpController):
+        self.controller = controller
+        self._queue: "queue.PriorityQueue[_Command]" = queue.PriorityQueue()
+        self._seq = itertools.count(1)
+        self._seq_lock = threading.Lock()
+        # pump_id（或 ALL_PUMPS）-> 最近一次 stop 的序號
+        self._stopped_seq: Dict[int, int] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._running = False
+
+        self._metrics_lock = threading.Lock()
+        self._depth = {PRIORITY_STOP: 0, PRIORITY_NORMAL: 0}
+        self._max_depth = {PRIORITY_STOP: 0, PRIORITY_NORMAL: 0}
+        self._executed = 0
+        self._skipped = 0
+        self._failed = 0
+        self._max_wait = 0.0
+        self._total_wait = 0.0
+        self._max_service = 0.0
+
+        # 看門狗到期：先直接拉 LOW，再由本執行緒做狀態 / 用量結算
+        controller.watchdog.force_off = self._watchdog_stop
+
+    # =========================
+    # 生命週期
+    # =========================
+    def start(self):
+        if self._thread is not None:
+            return
+        self.controller.watchdog.start()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="pump-hardware", daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: float = 2.0):
+        """關閉所有幫浦、釋放 GPIO，並結束執行緒"""
+        if self._thread is None:
+            self.controller.cleanup()
+            return
+        done = self._submit(PRIORITY_STOP, "cleanup", ALL_PUMPS, self._cleanup)
+        try:
+            done.result(timeout=timeout)
+        except Exception:
+            logger.exception("幫浦硬體執行緒 cleanup 失敗")
+        self._thread.join(timeout=timeout)
+        self._thread = None
+        self.controller.watchdog.close()
+
+    # =========================
+    # 對外 API（執行緒安全，立刻回傳 Future）
+    # =========================
+    def start_pump(self, pump_id: int, expected_seconds: Optional[float] = None) -> Future:
+        """
+        啟動幫浦；結果 True 代表已啟動，False 代表被之後的 stop 取消
+        expected_seconds 交給看門狗設定期限（超過佔空比時 Future 帶 PumpDutyCycleError）
+        """
+        return self._submit(PRIORITY_NORMAL, "start", pump_id, lambda: self.controller.start(pump_id, expected_seconds))
+
+    def stop_pump(self, pump_id: int) -> Future:
+        return self._submit(PRIORITY_STOP, "stop", pump_id, lambda: self.controller.stop(pump_id))
+
+    def emergency_stop(self) -> Future:
+        return self._submit(PRIORITY_STOP, "emergency_stop", ALL_PUMPS, self.controller.emergency_stop)
+
+    def time_scale(self) -> float:
+        """幫浦時鐘相對真實時間的倍速（實體硬體 = 1；模擬模式 = VirtualClock.speed）"""
+        return self.controller.clock.speed
+
+    def seconds_for_volume(self, pump_id: int, volume_ml: float) -> float:
+        """ml 換算秒數（純計算，不經過硬體執行緒）"""
+        return self.controller.seconds_for_volume(pump_id, volume_ml)
+
+    def metrics(self) -> Dict[str, Any]:
+        """佇列深度與等待時間統計"""
+        with self._metrics_lock:
+            return {
+                "alive": self._thread is not None and self._thread.is_alive(),
+                "queue_depth": {
+                    "stop": self._depth[PRIORITY_STOP],
+                    "normal": self._depth[PRIORITY_NORMAL],
+                },
+                "max_queue_depth": {
+                    "stop": self._max_depth[PRIORITY_STOP],
+                    "normal": self._max_depth[PRIORITY_NORMAL],
+                },
+                "executed": self._executed,
+                "skipped_starts": self._skipped,
+                "failed": self._failed,
+                "avg_wait_ms": round(self._total_wait / self._executed * 1000, 3) if self._executed else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+                "max_service_ms": round(self._max_service * 1000, 3),
+            }
+
+    # =========================
+    # 內部
+    # =========================
+    def _submit(self, priority: int, name: str, pump_id: Optional[int], fn: Callable[[], Any]) -> Future:
+        if pump_id not in (None, ALL_PUMPS) and pump_id not in PUMP_PINS:
+            future: Future = Future()
+            future.set_exception(ValueError(f"無效的 pump_id: {pump_id}"))
+            return future
+
+        # 取序號與放入佇列必須一起做，否則 stop 可能拿到較小的序號卻較晚入列
+        with self._seq_lock:
+            command = _Command(priority, next(self._seq), name, pump_id, fn)
+            with self._metrics_lock:
+                self._depth[priority] += 1
+                self._max_depth[priority] = max(self._max_depth[priority], self._depth[priority])
+            if not self._running:
+                # 執行緒沒在跑（尚未啟動 / 已關閉）：停止類指令直接執行，絕不能被吞掉；
+                # 啟動一律拒絕（見 _is_stale_start）
+                self._execute(command)
+                return command.future
+            self._queue.put(command)
+        return command.future
+
+    def _run(self):
+        while True:
+            command = self._queue.get()
+            if command.name == "cleanup":
+                with self._seq_lock:
+                    self._running = False
+                self._execute(command)
+                break
+            self._execute(command)
+
+        # 關閉後還在排隊的指令：硬體已經 cleanup，一律回報「未執行」
+        while not self._queue.empty():
+            command = self._queue.get_nowait()
+            with self._metrics_lock:
+                self._depth[command.priority] -= 1
+            if command.future.set_running_or_notify_cancel():
+                command.future.set_result(False)
+
+    def _is_stale_start(self, command: _Command) -> bool:
+        if not self._running:
+            return True
+        stopped = max(self._stopped_seq.get(command.pump_id, 0), self._stopped_seq.get(ALL_PUMPS, 0))
+        return command.seq < stopped
+
+    def _execute(self, command: _Command):
+        started_at = time.perf_counter()
+        wait = started_at - command.enqueued_at
+        with self._metrics_lock:
+            self._depth[command.priority] -= 1
+
+        if not command.future.set_running_or_notify_cancel():
+            return
+
+        if command.name == "start" and self._is_stale_start(command):
+            with self._metrics_lock:
+                self._skipped += 1
+            command.future.set_result(False)
+            return
+
+        try:
+            command.fn()
+            if command.name != "start":
+                self._stopped_seq[command.pump_id] = command.seq
+            command.future.set_result(True)
+        except Exception as e:
+            with self._metrics_lock:
+                self._failed += 1
+            logger.exception("幫浦硬體指令 %s(%s) 失敗", command.name, command.pump_id)
+            command.future.set_exception(e)
+        finally:
+            service = time.perf_counter() - started_at
+            with self._metrics_lock:
+                self._executed += 1
+                self._total_wait += wait
+                self._max_wait = max(self._max_wait, wait)
+                self._max_service = max(self._max_service, service)
+
+    def _cleanup(self):
+        self.controller.cleanup()
+
+    def _watchdog_stop(self, pump_id: int):
+        """
+        看門狗執行緒呼叫：腳位立刻拉 LOW（硬體執行緒可能正卡住），
+        再排一個優先的 stop，讓 states / 流量模型 / 用量累計仍然只在本執行緒更新
+        （執行緒沒在跑時 _submit 會直接執行，也不會和任何人搶）
+        """
+        self.controller.force_off(pump_id)
+        self.stop_pump(pump_id)
+
+
+# 全域實例（main.py 直接 import 用）
+pump_hardware = PumpHardwareThread(pump_controller)
@@ -0,0 +1,275 @@
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from log_config import get_logger
+
+logger = get_logger("pump")
+
+# =========================
+# 酒瓶 / 用量設定（可用環境變數覆寫）
+# =========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESERVOIR_FILE = os.getenv("PUMP_RESERVOIR_FILE", os.path.join(BASE_DIR, "data", "pump_reservoirs.json"))
+
+# 預設一瓶 750 ml；剩下 15% 以下就提醒換瓶
+DEFAULT_CAPACITY_ML = float(os.getenv("PUMP_BOTTLE_CAPACITY_ML", "750"))
+DEFAULT_LOW_FRACTION = 0.15
+
+# 背景執行緒多久寫一次檔（秒）；倒酒路徑上只改數字，不做 I/O
+RESERVOIR_SAVE_INTERVAL = 2.0
+
+# 警示等級
+LEVEL_OK = "ok"
+LEVEL_LOW = "low"
+LEVEL_EMPTY = "empty"
+
+
+class _PumpCounters:
+    """
+    單顆幫浦的累計值（一律在 ReservoirTracker._lock 內讀寫）
+
+    - run_seconds / dispensed_ml：幫浦停止時由硬體執行緒累加；換幫浦時 API 端會歸零
+    - refill_mark_ml：換瓶時依當時的 dispensed_ml 計算
+      剩餘量 = 容量 - (dispensed_ml - refill_mark_ml)
+    """
+
+    __slots__ = ("capacity_ml", "low_threshold_ml", "run_seconds", "dispensed_ml", "refill_mark_ml", "refilled_at")
+
+    def __init__(self, capacity_ml: float, low_threshold_ml: float):
+        self.capacity_ml = capacity_ml
+        self.low_threshold_ml = low_threshold_ml
+        self.run_seconds = 0.0
+        self.dispensed_ml = 0.0
+        self.refill_mark_ml = 0.0
+        self.refilled_at: Optional[float] = None
+
+    def remaining_ml(self) -> float:
+        return max(0.0, self.capacity_ml - (self.dispensed_ml - self.refill_mark_ml))
+
+    def level(self) -> str:
+        remaining = self.remaining_ml()
+        if remaining <= 0:
+            return LEVEL_EMPTY
+        if remaining <= self.low_threshold_ml:
+            return LEVEL_LOW
+        return LEVEL_OK
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "capacity_ml": self.capacity_ml,
+            "low_threshold_ml": self.low_threshold_ml,
+            "run_seconds": round(self.run_seconds, 3),
+            "dispensed_ml": round(self.dispensed_ml, 3),
+            "refill_mark_ml": round(self.refill_mark_ml, 3),
+            "refilled_at": self.refilled_at,
+        }
+
+
+class ReservoirTracker:
+    """
+    各幫浦的運轉時間 / 出水量累計與酒瓶剩餘量（JSON 檔持久化）
+
+    - record_run()：幫浦停止時由 PumpController 呼叫（硬體執行緒），只做加法並設旗標
+    - 所有累計值的讀寫都在 _lock 內：refill() / configure() 在 API 執行緒中
+      依 dispensed_ml 重算 refill_mark_ml，不能和硬體執行緒的累加交錯；
+      鎖內只做加減法，不做 I/O，硬體執行緒最多等幾微秒
+    - 背景執行緒每 RESERVOIR_SAVE_INTERVAL 秒把有變動的累計值寫檔（暫存檔 + os.replace），
+      並在警示等級改變時通知 listener（例如更新所有房間狀態）
+    - refill()：換瓶後呼叫，剩餘量回到容量（或指定的量）
+    """
+
+    def __init__(
+        self,
+        pump_ids: Iterable[int],
+        path: Optional[str] = RESERVOIR_FILE,
+        capacity_ml: float = DEFAULT_CAPACITY_ML,
+        save_interval: float = RESERVOIR_SAVE_INTERVAL,
+    ):
+        self.path = path
+        self.save_interval = save_interval
+        self._pumps: Dict[int, _PumpCounters] = {
+            pump_id: _PumpCounters(capacity_ml, capacity_ml * DEFAULT_LOW_FRACTION) for pump_id in pump_ids
+        }
+        self._lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+        # 警示等級改變時呼叫 listener(alerts)（在背景執行緒中）
+        self.listeners: List[Callable[[List[Dict[str, Any]]], None]] = []
+        self._levels: Dict[int, str] = {}
+
+        self.load()
+        self._levels = {pump_id: c.level() for pump_id, c in self._pumps.items()}
+
+    # =========================
+    # 持久化
+    # =========================
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error("幫浦用量檔無法讀取，從 0 開始累計: %s", e)
+            return
+        with self._lock:
+            for key, value in data.get("pumps", {}).items():
+                counters = self._pumps.get(int(key))
+                if counters is None:
+                    continue
+                counters.capacity_ml = float(value.get("capacity_ml", counters.capacity_ml))
+                counters.low_threshold_ml = float(value.get("low_threshold_ml", counters.low_threshold_ml))
+                counters.run_seconds = float(value.get("run_seconds", 0.0))
+                counters.dispensed_ml = float(value.get("dispensed_ml", 0.0))
+                counters.refill_mark_ml = float(value.get("refill_mark_ml", 0.0))
+                counters.refilled_at = value.get("refilled_at")
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            data = {"pumps": {str(pump_id): c.to_dict() for pump_id, c in self._pumps.items()}}
+        with self._file_lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+
+    # =========================
+    # 生命週期
+    # =========================
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="pump-reservoir", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """寫入最後的累計值並停止背景執行緒"""
+        if self._thread is None:
+            return
+        self._stopping = True
+        self._dirty.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        while not self._stopping:
+            self._dirty.wait()
+            if not self._stopping:
+                # 同一段時間內的多次出水合併成一次寫檔
+                time.sleep(self.save_interval)
+            self._dirty.clear()
+            try:
+                self.save()
+            except OSError:
+                logger.exception("幫浦用量寫入失敗")
+            self._check_levels()
+
+    def _check_levels(self):
+        with self._lock:
+            levels = {pump_id: c.level() for pump_id, c in self._pumps.items()}
+            remaining = {pump_id: c.remaining_ml() for pump_id, c in self._pumps.items()}
+        if levels == self._levels:
+            return
+        for pump_id, level in levels.items():
+            if level != self._levels.get(pump_id) and level != LEVEL_OK:
+                logger.warning(
+                    "幫浦 %d 酒瓶%s：剩 %.0f ml",
+                    pump_id, "快空了" if level == LEVEL_LOW else "已空", remaining[pump_id],
+                )
+        self._levels = levels
+        alerts = self.alerts()
+        for listener in self.listeners:
+            try:
+                listener(alerts)
+            except Exception:
+                logger.exception("酒瓶警示通知失敗")
+
+    # =========================
+    # 對外 API
+    # =========================
+    def record_run(self, pump_id: int, seconds: float, volume_ml: float):
+        """幫浦跑完一段（硬體執行緒呼叫）：累加後交給背景執行緒寫檔"""
+        counters = self._pumps.get(pump_id)
+        if counters is None or seconds <= 0:
+            return
+        with self._lock:
+            counters.run_seconds += seconds
+            counters.dispensed_ml += volume_ml
+        self._dirty.set()
+
+    def refill(self, pump_id: int, volume_ml: Optional[float] = None, reset_totals: bool = False) -> Dict[str, Any]:
+        """
+        換瓶：剩餘量回到 volume_ml（不給 = 整瓶容量）
+        reset_totals=True 連同累計運轉時間 / 出水量一起歸零（換幫浦時用）
+        """
+        counters = self._get(pump_id)
+        if volume_ml is not None and not 0 <= volume_ml <= counters.capacity_ml:
+            raise ValueError(f"volume_ml 必須介於 0 到 {counters.capacity_ml:g}")
+        with self._lock:
+            remaining = counters.capacity_ml if volume_ml is None else float(volume_ml)
+            if reset_totals:
+                counters.run_seconds = 0.0
+                counters.dispensed_ml = 0.0
+            # 剩餘量 = 容量 - (dispensed - mark) => mark = dispensed - (容量 - 剩餘量)
+            counters.refill_mark_ml = counters.dispensed_ml - (counters.capacity_ml - remaining)
+            counters.refilled_at = time.time()
+        self._dirty.set()
+        return self.status(pump_id)
+
+    def configure(self, pump_id: int, capacity_ml: Optional[float] = None, low_threshold_ml: Optional[float] = None) -> Dict[str, Any]:
+        """調整酒瓶容量 / 警示門檻（剩餘量不變）"""
+        counters = self._get(pump_id)
+        if capacity_ml is not None and capacity_ml <= 0:
+            raise ValueError("capacity_ml 必須大於 0")
+        if low_threshold_ml is not None and low_threshold_ml < 0:
+            raise ValueError("low_threshold_ml 不能是負數")
+        with self._lock:
+            if capacity_ml is not None:
+                remaining = counters.remaining_ml()
+                counters.capacity_ml = float(capacity_ml)
+                counters.refill_mark_ml = counters.dispensed_ml - (counters.capacity_ml - min(remaining, counters.capacity_ml))
+            if low_threshold_ml is not None:
+                counters.low_threshold_ml = float(low_threshold_ml)
+        self._dirty.set()
+        return self.status(pump_id)
+
+    def status(self, pump_id: Optional[int] = None) -> Dict[int, Dict[str, Any]]:
+        pump_ids = self._pumps.keys() if pump_id is None else [pump_id]
+        result = {}
+        for pid in pump_ids:
+            counters = self._get(pid)
+            with self._lock:
+                result[pid] = {
+                    "capacity_ml": counters.capacity_ml,
+                    "low_threshold_ml": counters.low_threshold_ml,
+                    "remaining_ml": round(counters.remaining_ml(), 1),
+                    "level": counters.level(),
+                    "run_seconds": round(counters.run_seconds, 3),
+                    "dispensed_ml": round(counters.dispensed_ml, 1),
+                    "refilled_at": counters.refilled_at,
+                }
+        return result
+
+    def alerts(self) -> List[Dict[str, Any]]:
+        """低於門檻的酒瓶（給房間狀態顯示）"""
+        with self._lock:
+            return [
+                {"pump_id": pump_id, "level": c.level(), "remaining_ml": round(c.remaining_ml(), 1)}
+                for pump_id, c in self._pumps.items()
+                if c.level() != LEVEL_OK
+            ]
+
+    def _get(self, pump_id: int) -> _PumpCounters:
+        if pump_id not in self._pumps:
+            raise ValueError(f"無效的 pump_id: {pump_id}")
+        return self._pumps[pump_id]
@@ -0,0 +1,95 @@
+import os
+import random
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+# =========================
+# 基底幫浦選擇策略
+# =========================
+# 每個策略：(候選幫浦, 各幫浦用量狀態, 亂數產生器) -> 幫浦編號
+# 用量狀態格式同 ReservoirTracker.status()：{pump_id: {"remaining_ml", "run_seconds", ...}}
+# 沒有用量資料的幫浦視為全滿、沒跑過
+PumpPolicy = Callable[[List[int], Dict[int, Dict[str, Any]], random.Random], int]
+
+# 預設策略（可用環境變數覆寫）
+DEFAULT_POLICY = os.getenv("PUMP_SELECTION_POLICY", "weighted")
+
+
+def _pick_best(candidates: List[int], key: Callable[[int], float], rng: random.Random) -> int:
+    """key 最大的幫浦；平手時隨機挑一顆（避免新酒瓶時永遠從 1 號開始）"""
+    best = max(key(pump_id) for pump_id in candidates)
+    return rng.choice([pump_id for pump_id in candidates if key(pump_id) == best])
+
+
+def random_policy(candidates: List[int], status: Dict[int, Dict[str, Any]], rng: random.Random) -> int:
+    """舊版行為：完全隨機"""
+    return rng.choice(candidates)
+
+
+def least_run_time(candidates: List[int], status: Dict[int, Dict[str, Any]], rng: random.Random) -> int:
+    """累計運轉時間最短的幫浦（平均幫浦磨耗）"""
+    return _pick_best(candidates, lambda pump_id: -status.get(pump_id, {}).get("run_seconds", 0.0), rng)
+
+
+def most_remaining(candidates: List[int], status: Dict[int, Dict[str, Any]], rng: random.Random) -> int:
+    """酒瓶剩最多的幫浦（各瓶同時見底）"""
+    return _pick_best(candidates, lambda pump_id: status.get(pump_id, {}).get("remaining_ml", float("inf")), rng)
+
+
+def weighted_remaining(candidates: List[int], status: Dict[int, Dict[str, Any]], rng: random.Random) -> int:
+    """依剩餘量加權隨機：保留隨機感，但剩越多越容易被選到"""
+    if not status:
+        return rng.choice(candidates)
+    weights = [max(0.0, status.get(pump_id, {}).get("remaining_ml", 0.0)) for pump_id in candidates]
+    if sum(weights) <= 0:
+        return rng.choice(candidates)
+    return rng.choices(candidates, weights=weights)[0]
+
+
+POLICIES: Dict[str, PumpPolicy] = {
+    "random": random_policy,
+    "least_run_time": least_run_time,
+    "most_remaining": most_remaining,
+    "weighted": weighted_remaining,
+}
+
+
+class PumpSelector:
+    """
+    依策略挑選基底幫浦
+
+    - status_provider：回傳各幫浦用量狀態（main.py 綁到 ReservoirTracker.status）；
+      沒有綁定時所有策略都等同隨機
+    - 共同規則（在策略之前套用）：
+      1. 已空的酒瓶不選（全部都空了才不過濾）
+      2. 避免連續選到同一顆（exclude，只剩一顆可選時例外）
+    """
+
+    def __init__(
+        self,
+        pump_ids: Iterable[int],
+        policy: str = DEFAULT_POLICY,
+        status_provider: Optional[Callable[[], Dict[int, Dict[str, Any]]]] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        self.pump_ids = list(pump_ids)
+        self.status_provider = status_provider
+        self.rng = rng or random.Random()
+        self.policy_name = "random"
+        self.set_policy(policy if policy in POLICIES else "random")
+
+    def set_policy(self, name: str):
+        if name not in POLICIES:
+            raise ValueError(f"未知的幫浦選擇策略: {name}（可用: {', '.join(POLICIES)}）")
+        self.policy_name = name
+
+    def bind(self, status_provider: Callable[[], Dict[int, Dict[str, Any]]]):
+        self.status_provider = status_provider
+
+    def choose(self, exclude: Optional[int] = None) -> int:
+        status = self.status_provider() if self.status_provider is not None else {}
+
+        candidates = [p for p in self.pump_ids if status.get(p, {}).get("level") != "empty"] or list(self.pump_ids)
+        if exclude in candidates and len(candidates) > 1:
+            candidates.remove(exclude)
+
+        return POLICIES[self.policy_name](candidates, status, self.rng)
@@ -0,0 +1,219 @@
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+
+from log_config import get_logger
+
+logger = get_logger("pump")
+
+# =========================
+# 看門狗設定（可用環境變數覆寫）
+# =========================
+# 單次出水的絕對上限（秒）：沒有給預期秒數時就用這個當期限
+MAX_RUN_SECONDS = float(os.getenv("PUMP_MAX_RUN_SECONDS", "30"))
+
+# 有預期秒數時，超過預期多久就強制關閉（秒）
+DEADLINE_GRACE = 0.5
+
+# 主程式（event loop）多久沒有心跳就關閉所有幫浦（秒）
+HEARTBEAT_TIMEOUT = 3.0
+
+# 佔空比限制：DUTY_WINDOW 秒內最多運轉 MAX_DUTY_CYCLE 的時間（避免馬達過熱）
+DUTY_WINDOW = 60.0
+MAX_DUTY_CYCLE = float(os.getenv("PUMP_MAX_DUTY_CYCLE", "0.5"))
+
+# 監視執行緒最長多久檢查一次心跳（秒）
+CHECK_INTERVAL = 0.25
+
+
+class PumpDutyCycleError(RuntimeError):
+    """幫浦近期運轉太久（超過佔空比）或要求的秒數超過上限，拒絕啟動"""
+
+
+class PumpWatchdog:
+    """
+    幫浦看門狗（獨立的監視執行緒）
+
+    - arm(pump_id, expected)：幫浦啟動前呼叫（硬體執行緒），給這次出水一個硬期限；
+      近期運轉時間加上這次會超過佔空比時直接拒絕（丟 PumpDutyCycleError），不會倒到一半被切
+    - disarm(pump_id)：幫浦停止時呼叫
+    - heartbeat()：主程式定期呼叫；收到過心跳之後，超過 HEARTBEAT_TIMEOUT 沒有心跳就關閉所有運轉中的幫浦
+    - 監視執行緒睡到最早的期限（最多 CHECK_INTERVAL 秒），到期就呼叫 force_off(pump_id) 直接把腳位拉 LOW，
+      不經過可能已經卡住的硬體執行緒 / event loop
+
+    時間一律用真實的 time.monotonic()（模擬模式的虛擬時鐘不適用於保護實體馬達）
+    """
+
+    def __init__(
+        self,
+        pump_ids: Iterable[int],
+        force_off: Callable[[int], None],
+        max_run_seconds: float = MAX_RUN_SECONDS,
+        grace: float = DEADLINE_GRACE,
+        heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+        duty_window: float = DUTY_WINDOW,
+        max_duty_cycle: float = MAX_DUTY_CYCLE,
+    ):
+        self.pump_ids = list(pump_ids)
+        self.force_off = force_off
+        self.max_run_seconds = max_run_seconds
+        self.grace = grace
+        self.heartbeat_timeout = heartbeat_timeout
+        self.duty_window = duty_window
+        self.max_duty_cycle = max_duty_cycle
+
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+
+        # 以下受 _cond 保護
+        self._deadlines: Dict[int, Tuple[float, Optional[float]]] = {}  # pump_id -> (期限, 預期結束時間)
+        self._on_since: Dict[int, float] = {}
+        self._history: Dict[int, Deque[Tuple[float, float]]] = {pump_id: deque() for pump_id in self.pump_ids}
+
+        # 心跳（單純的 float 寫入，不拿鎖）
+        self._last_heartbeat: Optional[float] = None
+
+        # 統計
+        self.overruns: Dict[int, int] = {pump_id: 0 for pump_id in self.pump_ids}
+        self.duty_refusals: Dict[int, int] = {pump_id: 0 for pump_id in self.pump_ids}
+        self.heartbeat_trips = 0
+        self.max_overrun_ms = 0.0
+
+    # =========================
+    # 生命週期
+    # =========================
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="pump-watchdog", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join()
+        self._thread = None
+
+    # =========================
+    # 對外 API
+    # =========================
+    def heartbeat(self):
+        self._last_heartbeat = time.monotonic()
+
+    def arm(self, pump_id: int, expected_seconds: Optional[float] = None):
+        now = time.monotonic()
+        with self._cond:
+            if expected_seconds is not None and expected_seconds > self.max_run_seconds:
+                self.duty_refusals[pump_id] = self.duty_refusals.get(pump_id, 0) + 1
+                raise PumpDutyCycleError(f"幫浦 {pump_id} 單次出水 {expected_seconds:.1f} 秒超過上限 {self.max_run_seconds:g} 秒")
+
+            allowance = self.max_duty_cycle * self.duty_window - self._on_time(pump_id, now)
+            needed = expected_seconds if expected_seconds is not None else 0.0
+            if allowance <= needed:
+                self.duty_refusals[pump_id] = self.duty_refusals.get(pump_id, 0) + 1
+                raise PumpDutyCycleError(
+                    f"幫浦 {pump_id} 最近 {self.duty_window:g} 秒運轉太久（佔空比上限 {self.max_duty_cycle:.0%}），請稍後再試"
+                )
+
+            if expected_seconds is None:
+                expected_end = None
+                deadline = now + min(self.max_run_seconds, allowance)
+            else:
+                expected_end = now + expected_seconds
+                deadline = expected_end + self.grace
+            self._deadlines[pump_id] = (deadline, expected_end)
+            self._on_since.setdefault(pump_id, now)
+            self._cond.notify()
+
+    def disarm(self, pump_id: int):
+        now = time.monotonic()
+        with self._cond:
+            self._deadlines.pop(pump_id, None)
+            since = self._on_since.pop(pump_id, None)
+            if since is not None:
+                self._history.setdefault(pump_id, deque()).append((since, now))
+
+    def metrics(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self._cond:
+            duty = {
+                pump_id: round(self._on_time(pump_id, now) / self.duty_window, 4)
+                for pump_id in self.pump_ids
+            }
+            armed = len(self._deadlines)
+        heartbeat = self._last_heartbeat
+        return {
+            "alive": self._thread is not None and self._thread.is_alive(),
+            "armed": armed,
+            "overruns": dict(self.overruns),
+            "duty_refusals": dict(self.duty_refusals),
+            "heartbeat_trips": self.heartbeat_trips,
+            "max_overrun_ms": round(self.max_overrun_ms, 3),
+            "heartbeat_age_ms": None if heartbeat is None else round((now - heartbeat) * 1000, 3),
+            "duty_cycle": duty,
+            "max_duty_cycle": self.max_duty_cycle,
+        }
+
+    # =========================
+    # 內部
+    # =========================
+    def _on_time(self, pump_id: int, now: float) -> float:
+        """最近 duty_window 秒內的運轉時間（含正在運轉的這段）；呼叫端需持有 _cond"""
+        window_start = now - self.duty_window
+        history = self._history.setdefault(pump_id, deque())
+        while history and history[0][1] <= window_start:
+            history.popleft()
+        total = sum(end - max(start, window_start) for start, end in history)
+        since = self._on_since.get(pump_id)
+        if since is not None:
+            total += now - max(since, window_start)
+        return total
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._stopping:
+                    return
+                now = time.monotonic()
+                next_deadline = min((d for d, _ in self._deadlines.values()), default=now + CHECK_INTERVAL)
+                self._cond.wait(max(0.0, min(next_deadline - now, CHECK_INTERVAL)))
+                if self._stopping:
+                    return
+
+                now = time.monotonic()
+                expired: List[Tuple[int, Optional[float]]] = []  # (pump_id, 超時秒數；心跳逾時為 None)
+                for pump_id, (deadline, expected_end) in list(self._deadlines.items()):
+                    if now >= deadline:
+                        expired.append((pump_id, now - (expected_end if expected_end is not None else deadline)))
+
+                stalled = (
+                    self._deadlines
+                    and self._last_heartbeat is not None
+                    and now - self._last_heartbeat > self.heartbeat_timeout
+                )
+                if stalled:
+                    tripped = {pump_id for pump_id, _ in expired}
+                    expired.extend((pump_id, None) for pump_id in self._deadlines if pump_id not in tripped)
+                    self.heartbeat_trips += 1
+
+            # 在鎖外關閉（force_off 只拉 LOW 並排入 stop；狀態結算由硬體執行緒做，這裡先解除期限）
+            if stalled:
+                logger.error("主程式 %.1f 秒沒有心跳，強制關閉所有運轉中的幫浦", now - self._last_heartbeat)
+            for pump_id, overrun in expired:
+                if overrun is not None:
+                    self.overruns[pump_id] = self.overruns.get(pump_id, 0) + 1
+                    self.max_overrun_ms = max(self.max_overrun_ms, overrun * 1000)
+                    logger.error("看門狗強制關閉幫浦 %d（超時 %.0f ms）", pump_id, overrun * 1000)
+                try:
+                    self.force_off(pump_id)
+                except Exception:
+                    logger.exception("看門狗關閉幫浦 %d 失敗", pump_id)
+                finally:
+                    self.disarm(pump_id)
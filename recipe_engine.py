@@ -0,0 +1,123 @@
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# =========================
+# 顏色 -> 幫浦（依實際接線 / 瓶子擺放調整）
+# =========================
+COLOR_PUMPS: Dict[str, int] = {
+    "red": 1,
+    "blue": 2,
+    "yellow": 3,
+    "green": 4,
+}
+
+# 材料：(顏色, ml, 幫浦編號)；幫浦編號 None 代表依 COLOR_PUMPS 對應
+Ingredient = Tuple[str, float, Optional[int]]
+
+# 酒堆疊中每一格的份量（ml）；基底酒份量與遊戲開始倒的基底一致
+STACK_PORTION_ML = 10.0
+BASE_PORTION_ML = 12.5
+
+# =========================
+# 具名酒譜（顏色 -> ml）
+# =========================
+RECIPES: Dict[str, Dict[str, float]] = {
+    "sunset": {"red": 15.0, "yellow": 15.0},
+    "ocean": {"blue": 20.0, "green": 10.0},
+    "forest": {"green": 20.0, "yellow": 10.0},
+    "rainbow": {"red": 7.5, "yellow": 7.5, "green": 7.5, "blue": 7.5},
+}
+
+
+def stack_to_ingredients(
+    colors: Iterable[str],
+    base_color: Optional[str] = None,
+    portion_ml: float = STACK_PORTION_ML,
+    base_ml: float = BASE_PORTION_ML,
+    base_pump_id: Optional[int] = None,
+) -> List[Ingredient]:
+    """
+    把基底酒 + 酒堆疊轉成材料清單（尚未合併）
+
+    base_pump_id：遊戲選定的基底幫浦（room.base_pump_id），
+    整杯倒時基底酒要和 /api/game/event 從同一顆幫浦倒；沒給才依顏色對應
+    """
+    ingredients: List[Ingredient] = []
+    if base_color:
+        ingredients.append((base_color, base_ml, base_pump_id))
+    ingredients.extend((color, portion_ml, None) for color in colors)
+    return ingredients
+
+
+def recipe_to_ingredients(recipe_name: str) -> List[Ingredient]:
+    if recipe_name not in RECIPES:
+        raise ValueError(f"未知的酒譜: {recipe_name}")
+    return [(color, volume_ml, None) for color, volume_ml in RECIPES[recipe_name].items()]
+
+
+def merge_ingredients(ingredients: Iterable[Ingredient]) -> "OrderedDict[int, Tuple[str, float]]":
+    """
+    同一顆幫浦合併成一次較長的出水（保留第一次出現的順序）
+    回傳 pump_id -> (顏色, ml)；顏色取第一次出現的材料
+    """
+    valid_pumps = set(COLOR_PUMPS.values())
+    merged: "OrderedDict[int, Tuple[str, float]]" = OrderedDict()
+    for color, volume_ml, pump_id in ingredients:
+        if color not in COLOR_PUMPS:
+            raise ValueError(f"未知的顏色: {color}")
+        if pump_id is None:
+            pump_id = COLOR_PUMPS[color]
+        elif pump_id not in valid_pumps:
+            raise ValueError(f"無效的 pump_id: {pump_id}")
+        if volume_ml <= 0:
+            continue
+        first_color, total_ml = merged.get(pump_id, (color, 0.0))
+        merged[pump_id] = (first_color, total_ml + float(volume_ml))
+    return merged
+
+
+def estimate_wall_time(durations: List[float], max_concurrent: int) -> float:
+    """依序把工作丟給最早空出來的名額，回傳全部倒完的時間"""
+    slots = [0.0] * max(1, max_concurrent)
+    for duration in durations:
+        i = slots.index(min(slots))
+        slots[i] += duration
+    return max(slots) if durations else 0.0
+
+
+def build_pour_plan(
+    ingredients: Iterable[Ingredient],
+    seconds_for: Callable[[int, float], float],
+    max_concurrent: int,
+) -> Dict[str, Any]:
+    """
+    一杯酒算一次倒酒計畫
+
+    1. 同一顆幫浦合併：每顆幫浦只啟動一次
+    2. 依校正值把 ml 換成秒數
+    3. 長的排前面（LPT）：同時運轉數量有限時，總時間最接近最長的那一步
+
+    回傳 {"actions": [...], "pump_time": 逐顆倒的總秒數, "estimated_time": 預估實際秒數, "total_ml": ...}
+    actions 可以直接交給 PumpExecutor.submit()
+    """
+    merged = merge_ingredients(ingredients)
+    if not merged:
+        raise ValueError("沒有要倒的材料")
+
+    actions: List[Dict[str, Any]] = []
+    for pump_id, (color, volume_ml) in merged.items():
+        actions.append({
+            "pump_id": pump_id,
+            "color": color,
+            "volume_ml": round(volume_ml, 3),
+            "duration": seconds_for(pump_id, volume_ml),
+        })
+    actions.sort(key=lambda a: a["duration"], reverse=True)
+
+    durations = [a["duration"] for a in actions]
+    return {
+        "actions": actions,
+        "total_ml": round(sum(volume_ml for _, volume_ml in merged.values()), 3),
+        "pump_time": sum(durations),
+        "estimated_time": estimate_wall_time(durations, max_concurrent),
+    }
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from typing import Any, Dict, Iterable, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+from log_config import get_logger
+
+logger = get_logger("room")
+
+
+def personalize_state(state: Dict[str, Any], player_id: Optional[str]) -> Dict[str, Any]:
+    """
+    在共用的房間狀態上補上「我是誰」相關欄位
+    （與 /api/room/state、/api/game/state 回傳的欄位一致）
+    """
+    personalized = dict(state)
+    if player_id:
+        personalized["is_in_room"] = any(p["player_id"] == player_id for p in state["players"])
+        personalized["is_host"] = player_id == state["host_id"]
+        personalized["is_my_turn"] = player_id == state["current_player_id"]
+    else:
+        personalized["is_in_room"] = False
+        personalized["is_host"] = False
+        personalized["is_my_turn"] = False
+    personalized["my_player_id"] = player_id
+    return personalized
+
+
+class RoomSubscriber:
+    """
+    一條 WebSocket 連線
+
+    只保留「最新一份」待送訊息：連線慢的手機不會累積舊狀態，
+    也不會拖慢其他人的推播
+    """
+
+    def __init__(self, websocket: WebSocket, player_id: Optional[str]):
+        self.websocket = websocket
+        self.player_id = player_id
+        self._pending: Optional[Dict[str, Any]] = None
+        self._wakeup = asyncio.Event()
+
+    def offer(self, message: Dict[str, Any]):
+        self._pending = message
+        self._wakeup.set()
+
+    async def run(self, broadcaster: "RoomBroadcaster", room: Any):
+        """送出待送訊息直到連線關閉；送不出去就取消訂閱並結束"""
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            message, self._pending = self._pending, None
+            if message is None:
+                continue
+            try:
+                await self.websocket.send_json(message)
+            except (WebSocketDisconnect, RuntimeError) as e:
+                # 連線已斷（或已關閉）：不再接收推播，接收端的 finally 會再做一次清理
+                logger.debug("WebSocket 推播失敗，取消訂閱: %s", e, extra={"room": room.room_code})
+                broadcaster.unsubscribe(room, self)
+                return
+
+
+class RoomBroadcaster:
+    """
+    房間狀態推播中心
+
+    - notify() 可以從任何執行緒呼叫（GameRoom 的 mutator 在 threadpool 中執行），
+      實際推播一律交給 event loop
+    - 同一個 loop tick 內的多次變更會合併成一次推播
+    """
+
+    def __init__(self):
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self._subscribers: Dict[str, Set[RoomSubscriber]] = {}
+        self._dirty: Dict[str, Any] = {}
+        self._flush_scheduled = False
+        self._lock = threading.Lock()
+
+    def bind_loop(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+
+    # =========================
+    # 訂閱管理（只在 event loop 中呼叫）
+    # =========================
+    def subscribe(self, room: Any, subscriber: RoomSubscriber):
+        self._subscribers.setdefault(room.room_code, set()).add(subscriber)
+
+    def unsubscribe(self, room: Any, subscriber: RoomSubscriber):
+        subscribers = self._subscribers.get(room.room_code)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[room.room_code]
+
+    def subscriber_count(self, room_code: Optional[str] = None) -> int:
+        if room_code is not None:
+            return len(self._subscribers.get(room_code, ()))
+        return sum(len(s) for s in self._subscribers.values())
+
+    # =========================
+    # 推播
+    # =========================
+    def notify(self, room: Any):
+        """GameRoom 狀態改變時呼叫（執行緒安全）"""
+        if self.loop is None or room.room_code not in self._subscribers:
+            return
+        with self._lock:
+            self._dirty[room.room_code] = room
+            if self._flush_scheduled:
+                return
+            self._flush_scheduled = True
+        self.loop.call_soon_threadsafe(self._flush)
+
+    def _flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._flush_scheduled = False
+        for room in dirty.values():
+            self.push(room)
+
+    def push(self, room: Any, subscribers: Optional[Iterable[RoomSubscriber]] = None):
+        """把房間目前的狀態送給訂閱者（預設為該房間全部訂閱者）"""
+        if subscribers is None:
+            subscribers = self._subscribers.get(room.room_code)
+        if not subscribers:
+            return
+
+        with room.lock:
+            state = room.get_state()
+            wheel = room.get_wheel_state()
+
+        for subscriber in list(subscribers):
+            subscriber.offer({
+                "type": "state",
+                "room": personalize_state(state, subscriber.player_id),
+                "wheel": wheel,
+            })
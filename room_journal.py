@@ -0,0 +1,298 @@
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from log_config import get_logger
+from state_sync import apply_merge_patch, make_merge_patch
+
+logger = get_logger("room")
+
+# =========================
+# 持久化設定
+# =========================
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 每個房間兩個檔案：<房號>.snapshot.json（完整狀態）與 <房號>.journal（之後的 merge patch，一行一筆）
+# ROOM_JOURNAL_DIR= （空字串）可以關閉持久化
+JOURNAL_DIR = os.getenv("ROOM_JOURNAL_DIR", os.path.join(BASE_DIR, "data", "rooms"))
+
+# 累積幾筆 patch 就重寫快照並清空 journal（限制啟動時要重播的長度）
+SNAPSHOT_EVERY = 200
+
+# 兩次 fsync 之間至少間隔幾秒：期間內的變更合併成一批寫入（SD 卡上 fsync 很慢）
+FSYNC_INTERVAL = 0.05
+
+# 啟動還原超過這個時間（ms）就記錄警告
+RESTORE_BUDGET_MS = 500.0
+
+SNAPSHOT_SUFFIX = ".snapshot.json"
+JOURNAL_SUFFIX = ".journal"
+
+_STOP = object()
+
+
+def _fsync_dir(directory: str):
+    # 確保 rename 本身也寫進磁碟（Windows 不支援開啟資料夾，略過）
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class RoomJournal:
+    """
+    房間狀態持久化（append-only journal + 定期快照）
+
+    - record()：在房間鎖內呼叫，只把狀態快照丟進佇列，不做 I/O
+    - 背景執行緒計算與上一版的 merge patch、寫入 journal，一批只 fsync 一次
+    - 每 SNAPSHOT_EVERY 筆寫一次完整快照（先寫暫存檔再 rename），然後清空 journal
+    - load_all()：快照 + 重播 journal 尾端；最後一行寫到一半（斷電）時忽略該行
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = JOURNAL_DIR,
+        snapshot_every: int = SNAPSHOT_EVERY,
+        fsync_interval: float = FSYNC_INTERVAL,
+    ):
+        self.directory = directory or None
+        self.snapshot_every = snapshot_every
+        self.fsync_interval = fsync_interval
+        self._queue: "queue.Queue[Any]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+        # 以下只在背景執行緒使用
+        self._states: Dict[str, Tuple[int, Dict[str, Any]]] = {}  # 房號 -> (版本, 已寫入的狀態)
+        self._pending: Dict[str, int] = {}  # 房號 -> 快照後累積的 patch 數
+        self._files: Dict[str, Any] = {}
+
+        # 統計
+        self.records = 0
+        self.fsyncs = 0
+        self.snapshots = 0
+        self.last_restore_ms: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def _path(self, room_code: str, suffix: str) -> str:
+        return os.path.join(self.directory, f"{room_code}{suffix}")
+
+    # =========================
+    # 對外 API
+    # =========================
+    def start(self):
+        if not self.enabled or self._thread is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="room-journal", daemon=True)
+        self._thread.start()
+
+    def record(self, room_code: str, version: int, state: Dict[str, Any]):
+        """記錄新版本（state 必須是新建立的物件，之後不會再被修改）"""
+        if self._thread is not None:
+            self._queue.put(("record", room_code, version, state))
+
+    def remove(self, room_code: str):
+        """房間被回收：刪除檔案"""
+        if self._thread is not None:
+            self._queue.put(("remove", room_code, None, None))
+
+    def close(self):
+        """寫完佇列中的變更、fsync 並停止背景執行緒"""
+        if self._thread is None:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    def pending_count(self) -> int:
+        return self._queue.qsize()
+
+    def load_all(self) -> Dict[str, Tuple[int, Dict[str, Any]]]:
+        """
+        讀取所有房間的最新狀態：{房號: (版本, 狀態)}
+        必須在任何 record() 之前呼叫（start() 之後也可以：背景執行緒收到第一筆 record 才會讀 _states）
+        """
+        if not self.enabled or not os.path.isdir(self.directory):
+            self.last_restore_ms = 0.0
+            return {}
+
+        started = time.perf_counter()
+        codes = {
+            name[: -len(suffix)]
+            for name in os.listdir(self.directory)
+            for suffix in (SNAPSHOT_SUFFIX, JOURNAL_SUFFIX)
+            if name.endswith(suffix)
+        }
+        rooms: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        for code in sorted(codes):
+            try:
+                loaded = self._load_room(code)
+            except (OSError, ValueError) as e:
+                logger.error("房間 %s 的持久化資料無法讀取，略過: %s", code, e)
+                continue
+            if loaded is not None:
+                rooms[code] = loaded
+                self._states[code] = loaded
+                # 還原後的 journal 可能很長：下一次寫入時直接重寫快照
+                self._pending[code] = self.snapshot_every
+
+        self.last_restore_ms = (time.perf_counter() - started) * 1000
+        return rooms
+
+    # =========================
+    # 讀取
+    # =========================
+    def _load_room(self, code: str) -> Optional[Tuple[int, Dict[str, Any]]]:
+        version, state = -1, None
+        snapshot_path = self._path(code, SNAPSHOT_SUFFIX)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            version, state = data["version"], data["state"]
+
+        journal_path = self._path(code, JOURNAL_SUFFIX)
+        if os.path.exists(journal_path):
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line_no, line in enumerate(f, start=1):
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        # 只有最後一行可能寫到一半；之後的內容都不可信
+                        logger.warning("房間 %s journal 第 %d 行不完整，停止重播", code, line_no)
+                        break
+                    if entry["v"] <= version:
+                        continue  # 快照已包含（寫快照後、清空 journal 前當機）
+                    if "state" in entry:
+                        state = entry["state"]
+                    elif state is not None:
+                        state = apply_merge_patch(state, entry["patch"])
+                    else:
+                        continue
+                    version = entry["v"]
+
+        return (version, state) if state is not None else None
+
+    # =========================
+    # 背景寫入
+    # =========================
+    def _run(self):
+        last_fsync = 0.0
+        stopping = False
+        while not stopping:
+            batch = [self._queue.get()]
+            # 把同一段時間內的變更全部拿出來，合併成一次 fsync
+            wait = self.fsync_interval - (time.monotonic() - last_fsync)
+            if wait > 0 and batch[0] is not _STOP:
+                time.sleep(wait)
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            dirty = set()
+            for item in batch:
+                if item is _STOP:
+                    stopping = True
+                    continue
+                action, code, version, state = item
+                try:
+                    if action == "record":
+                        if self._write(code, version, state):
+                            dirty.add(code)
+                    else:
+                        self._delete(code)
+                except OSError:
+                    logger.exception("房間 %s 狀態寫入失敗", code)
+
+            for code in dirty:
+                f = self._files.get(code)
+                if f is None:
+                    continue
+                try:
+                    f.flush()
+                    os.fsync(f.fileno())
+                except OSError:
+                    logger.exception("房間 %s journal fsync 失敗", code)
+            if dirty:
+                self.fsyncs += 1
+                last_fsync = time.monotonic()
+
+        for f in self._files.values():
+            f.close()
+        self._files.clear()
+
+    def _journal_file(self, code: str):
+        f = self._files.get(code)
+        if f is None:
+            f = open(self._path(code, JOURNAL_SUFFIX), "a", encoding="utf-8")
+            self._files[code] = f
+        return f
+
+    def _write(self, code: str, version: int, state: Dict[str, Any]) -> bool:
+        """寫入一筆；回傳 journal 是否有待 fsync 的資料"""
+        previous = self._states.get(code)
+        self._states[code] = (version, state)
+        self.records += 1
+
+        if previous is None or self._pending.get(code, 0) >= self.snapshot_every:
+            self._write_snapshot(code, version, state)
+            return False
+
+        patch = make_merge_patch(previous[1], state)
+        if not patch:
+            return False
+        line = json.dumps({"v": version, "patch": patch}, ensure_ascii=False, separators=(",", ":"))
+        self._journal_file(code).write(line + "\n")
+        self._pending[code] = self._pending.get(code, 0) + 1
+        return True
+
+    def _write_snapshot(self, code: str, version: int, state: Dict[str, Any]):
+        path = self._path(code, SNAPSHOT_SUFFIX)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": version, "state": state}, f, ensure_ascii=False, separators=(",", ":"))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+        _fsync_dir(self.directory)
+
+        # 快照已經涵蓋 journal 的內容，清空重來
+        f = self._files.pop(code, None)
+        if f is not None:
+            f.close()
+        open(self._path(code, JOURNAL_SUFFIX), "w", encoding="utf-8").close()
+        self._pending[code] = 0
+        self.snapshots += 1
+
+    def _delete(self, code: str):
+        f = self._files.pop(code, None)
+        if f is not None:
+            f.close()
+        self._states.pop(code, None)
+        self._pending.pop(code, None)
+        for suffix in (SNAPSHOT_SUFFIX, JOURNAL_SUFFIX):
+            try:
+                os.remove(self._path(code, suffix))
+            except FileNotFoundError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "pending": self.pending_count(),
+            "records": self.records,
+            "fsyncs": self.fsyncs,
+            "snapshots": self.snapshots,
+            "last_restore_ms": self.last_restore_ms,
+        }
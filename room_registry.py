@@ -0,0 +1,134 @@
+import secrets
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Any
+
+# =========================
+# 房號設定
+# =========================
+# 去掉 0/O、1/I/L 這類容易看錯的字元，方便口頭報房號
+JOIN_CODE_ALPHABET = "ABCDEFGHJKMNPQRSTUVWXYZ23456789"
+JOIN_CODE_LENGTH = 4
+
+# 沒帶房號的請求一律進入預設房間（相容舊版前端）
+DEFAULT_ROOM_CODE = "MAIN"
+
+# 閒置多久（秒）沒有任何請求的房間會被回收
+ROOM_IDLE_TIMEOUT = 2 * 60 * 60
+
+# 背景巡檢間隔（秒）
+ROOM_SWEEP_INTERVAL = 60
+
+
+def normalize_room_code(code: Optional[str]) -> Optional[str]:
+    """統一房號格式（去空白、轉大寫），空字串視為沒有房號"""
+    if code is None:
+        return None
+    code = code.strip().upper()
+    return code or None
+
+
+class RoomRegistry:
+    """
+    房間註冊表（房號 -> 房間）
+
+    - 查房間是單純的 dict 查詢，O(1)，不需要上鎖
+    - 註冊表自己的鎖只在建立 / 回收房間時使用
+    - 每個房間各自帶一把 lock，不同桌之間不會互相等待
+    - 房間物件只需要有 room_code / lock / last_active 三個屬性
+    """
+
+    def __init__(
+        self,
+        room_factory: Callable[[str], Any],
+        idle_timeout: float = ROOM_IDLE_TIMEOUT,
+    ):
+        self._room_factory = room_factory
+        self._rooms: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self.idle_timeout = idle_timeout
+
+    # =========================
+    # 內部工具
+    # =========================
+    def _new_code(self) -> str:
+        while True:
+            code = "".join(secrets.choice(JOIN_CODE_ALPHABET) for _ in range(JOIN_CODE_LENGTH))
+            if code not in self._rooms:
+                return code
+
+    @staticmethod
+    def _touch(room: Any):
+        room.last_active = time.monotonic()
+
+    # =========================
+    # 對外 API
+    # =========================
+    def create(self) -> Any:
+        """建立新房間並分配一組不重複的房號"""
+        with self._lock:
+            code = self._new_code()
+            room = self._room_factory(code)
+            self._touch(room)
+            self._rooms[code] = room
+        return room
+
+    def restore(self, code: str) -> Any:
+        """以指定房號建立房間（從持久化資料還原用；已存在就直接回傳）"""
+        code = normalize_room_code(code)
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None:
+                room = self._room_factory(code)
+                self._rooms[code] = room
+            self._touch(room)
+        return room
+
+    def get(self, code: Optional[str]) -> Optional[Any]:
+        """依房號取得房間，找不到回傳 None"""
+        code = normalize_room_code(code)
+        if code is None:
+            return None
+        room = self._rooms.get(code)
+        if room is not None:
+            self._touch(room)
+        return room
+
+    def default_room(self) -> Any:
+        """取得預設房間（不存在就建立）"""
+        room = self._rooms.get(DEFAULT_ROOM_CODE)
+        if room is None:
+            with self._lock:
+                room = self._rooms.get(DEFAULT_ROOM_CODE)
+                if room is None:
+                    room = self._room_factory(DEFAULT_ROOM_CODE)
+                    self._rooms[DEFAULT_ROOM_CODE] = room
+        self._touch(room)
+        return room
+
+    def remove(self, code: str) -> bool:
+        """移除指定房間"""
+        with self._lock:
+            return self._rooms.pop(normalize_room_code(code), None) is not None
+
+    def evict_idle(self, now: Optional[float] = None) -> List[str]:
+        """回收閒置過久的房間（預設房間保留），回傳被回收的房號"""
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [
+                code for code, room in self._rooms.items()
+                if code != DEFAULT_ROOM_CODE and now - room.last_active > self.idle_timeout
+            ]
+            for code in expired:
+                del self._rooms[code]
+        return expired
+
+    def rooms(self) -> List[Any]:
+        """目前所有房間（快照）"""
+        return list(self._rooms.values())
+
+    def __contains__(self, code: str) -> bool:
+        return normalize_room_code(code) in self._rooms
+
+    def __len__(self) -> int:
+        return len(self._rooms)
@@ -0,0 +1,116 @@
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, Optional, Tuple
+
+# =========================
+# JSON Merge Patch（RFC 7386）工具
+# - dict 逐欄比較，其餘型別（含 list）整個取代
+# - 值為 None 代表刪除該欄位
+# =========================
+
+def make_merge_patch(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """計算把 old 變成 new 的 merge patch"""
+    patch: Dict[str, Any] = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = value
+            continue
+        previous = old[key]
+        if previous == value:
+            continue
+        if isinstance(previous, dict) and isinstance(value, dict):
+            patch[key] = make_merge_patch(previous, value)
+        else:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def compose_merge_patches(first: Dict[str, Any], second: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    把兩個連續的 patch 合併成一個（效果等同先套 first 再套 second）
+
+    某欄位在 first 被刪除或改成非 dict、在 second 又設回 dict 時無法合併：
+    RFC 7386 沒有「整個取代這個物件」的寫法，合併後的 dict 會被併進客戶端舊的 dict，
+    留下早該刪掉的子欄位。這種情況回傳 None，由呼叫端改給完整快照
+    """
+    result = dict(first)
+    for key, value in second.items():
+        if isinstance(value, dict) and key in result:
+            if not isinstance(result[key], dict):
+                return None
+            composed = compose_merge_patches(result[key], value)
+            if composed is None:
+                return None
+            result[key] = composed
+        else:
+            result[key] = value
+    return result
+
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """把 patch 套用到 target，回傳新物件（不修改 target）"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+# =========================
+# 狀態變更紀錄（環狀緩衝區）
+# =========================
+STATE_HISTORY_SIZE = 64
+
+
+class StateHistory:
+    """
+    保存最近幾個版本的 merge patch
+
+    entries 中的 (version, patch) 代表「從 version-1 到 version」的變化；
+    客戶端落後超過緩衝區範圍時 since() 回傳 None，由呼叫端改給完整快照
+    """
+
+    def __init__(self, initial_state: Dict[str, Any], maxlen: int = STATE_HISTORY_SIZE):
+        self._entries: Deque[Tuple[int, Dict[str, Any]]] = deque(maxlen=maxlen)
+        self._snapshot = initial_state
+
+    def record(self, version: int, state: Dict[str, Any]) -> Dict[str, Any]:
+        """記錄新版本的狀態，回傳與上一版的差異"""
+        patch = make_merge_patch(self._snapshot, state)
+        self._entries.append((version, patch))
+        self._snapshot = state
+        return patch
+
+    def reset(self, state: Dict[str, Any]):
+        """捨棄所有紀錄（例如從持久化資料還原後）"""
+        self._entries.clear()
+        self._snapshot = state
+
+    def since(self, version: int, current_version: int) -> Optional[Dict[str, Any]]:
+        """取得 version 之後累積的 patch；無法提供時回傳 None"""
+        if version == current_version:
+            return {}
+        if version > current_version or not self._entries:
+            return None
+        if self._entries[0][0] > version + 1:
+            return None
+
+        patch: Optional[Dict[str, Any]] = {}
+        for entry_version, entry_patch in self._entries:
+            if entry_version > version:
+                patch = compose_merge_patches(patch, entry_patch)
+                if patch is None:
+                    return None
+        return patch
+
+    def __iter__(self) -> Iterable[Tuple[int, Dict[str, Any]]]:
+        return iter(self._entries)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,18 @@
+import os
+import sys
+import tempfile
+
+# 模組都放在專案根目錄（和 main.py 同一層）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# 測試一律用模擬幫浦，且不讀寫 data/ 底下的執行期資料（必須在 import 任何模組之前設定）
+_TMP = tempfile.mkdtemp(prefix="cheers-tests-")
+os.environ.setdefault("PUMP_SIMULATION", "1")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+os.environ.setdefault("ROOM_JOURNAL_DIR", "")
+os.environ.setdefault("GAME_HISTORY_DIR", "")
+os.environ.setdefault("PUMP_RESERVOIR_FILE", "")
+os.environ.setdefault("PUMP_CALIBRATION_FILE", os.path.join(_TMP, "pump_calibration.json"))
+os.environ.setdefault("GAME_RULES_FILE", os.path.join(_TMP, "game_rules.json"))
@@ -0,0 +1,85 @@
+from deadline_heap import DeadlineHeap
+
+
+def test_pop_due_returns_keys_in_deadline_order():
+    heap = DeadlineHeap()
+    heap.touch("c", 30.0)
+    heap.touch("a", 10.0)
+    heap.touch("b", 20.0)
+
+    assert heap.pop_due(25.0) == ["a", "b"]
+    assert heap.pop_due(25.0) == []
+    assert heap.pop_due(30.0) == ["c"]
+    assert len(heap) == 0
+
+
+def test_touch_later_invalidates_stale_entry():
+    heap = DeadlineHeap()
+    heap.touch("p1", 10.0)
+    heap.touch("p1", 50.0)  # 心跳：延後到期
+
+    assert heap.pop_due(20.0) == []
+    assert "p1" in heap
+    assert heap.deadline("p1") == 50.0
+    assert heap.pop_due(50.0) == ["p1"]
+
+
+def test_late_heartbeat_after_deadline_is_honoured():
+    heap = DeadlineHeap()
+    heap.touch("p1", 10.0)
+    # 已經過了原本的期限、但還沒被取出時收到心跳
+    heap.touch("p1", 40.0)
+
+    assert heap.pop_due(15.0) == []
+    assert heap.pop_due(40.0) == ["p1"]
+
+
+def test_touch_earlier_reschedules():
+    heap = DeadlineHeap()
+    heap.touch("p1", 50.0)
+    heap.touch("p1", 10.0)
+
+    assert heap.pop_due(10.0) == ["p1"]
+    # 舊的 50 秒項目不能再讓它出現一次
+    assert heap.pop_due(100.0) == []
+
+
+def test_discarded_key_is_never_returned():
+    heap = DeadlineHeap()
+    heap.touch("p1", 10.0)
+    heap.touch("p2", 20.0)
+    heap.discard("p1")
+
+    assert "p1" not in heap
+    assert heap.pop_due(100.0) == ["p2"]
+    assert heap.next_deadline() is None
+
+
+def test_discard_then_touch_again_uses_new_deadline():
+    heap = DeadlineHeap()
+    heap.touch("p1", 10.0)
+    heap.discard("p1")
+    heap.touch("p1", 30.0)
+
+    assert heap.pop_due(20.0) == []
+    assert heap.pop_due(30.0) == ["p1"]
+
+
+def test_each_key_returned_once_despite_many_touches():
+    heap = DeadlineHeap()
+    for t in range(100):
+        heap.touch("p1", 10.0 + t)
+
+    assert heap.pop_due(1000.0) == ["p1"]
+
+
+def test_next_deadline_skips_removed_entries():
+    heap = DeadlineHeap()
+    heap.touch("p1", 5.0)
+    heap.touch("p2", 8.0)
+    heap.discard("p1")
+
+    assert heap.next_deadline() == 8.0
+    heap.clear()
+    assert heap.next_deadline() is None
+    assert len(heap) == 0
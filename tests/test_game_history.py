@@ -0,0 +1,137 @@
+import json
+
+import pytest
+from fastapi.testclient import TestClient
+
+from game_history import GameHistory, is_valid_game_id, new_game_id
+
+
+@pytest.fixture
+def history(tmp_path):
+    history = GameHistory(str(tmp_path))
+    history.start()
+    yield history
+    history.close()
+
+
+def test_replay_applies_state_then_patches(history):
+    game_id = "ROOM-20260101-000000-abcdef"
+    states = [
+        {"round": 1, "scores": {}, "stack": []},
+        {"round": 1, "scores": {"p1": 1}, "stack": ["red"]},
+        {"round": 2, "scores": {"p1": 1, "p2": 2}, "stack": []},
+    ]
+    for version, (event_type, state) in enumerate(zip(("game_start", "score", "round"), states), start=1):
+        history.record([(game_id, 1000.0 + version, event_type, {"n": version})], version, state)
+    assert history.flush()
+
+    entries = list(history.iter_events(game_id))
+    assert "state" in entries[0] and "patch" in entries[1] and "patch" in entries[2]
+
+    for seq, state in enumerate(states, start=1):
+        event, replayed, version = history.replay(game_id, seq)
+        assert event["seq"] == seq
+        assert replayed == state
+        assert version == seq
+    assert history.replay(game_id)[1] == states[-1]
+
+
+def test_events_in_one_mutation_share_the_last_state(history):
+    game_id = "ROOM-20260101-000000-abcdef"
+    history.record([(game_id, 1.0, "game_start", {})], 1, {"n": 0})
+    history.record([(game_id, 2.0, "roll", {}), (game_id, 2.0, "score", {})], 2, {"n": 1})
+    assert history.flush()
+
+    entries = list(history.iter_events(game_id))
+    assert "v" not in entries[1] and entries[2]["v"] == 2
+    # 停在同一次變更中較前面的事件：狀態算到那次變更結束
+    event, state, version = history.replay(game_id, 2)
+    assert event["type"] == "roll"
+    assert state == {"n": 1} and version == 2
+
+
+def test_prune_keeps_newest_games(tmp_path):
+    history = GameHistory(str(tmp_path), keep=2)
+    history.start()
+    game_ids = [f"ROOM-20260101-00000{i}-abcdef" for i in range(4)]
+    try:
+        for i, game_id in enumerate(game_ids):
+            history.record([(game_id, float(i), "game_start", {})], 1, {"n": i})
+            history.record([(game_id, float(i), "game_end", {})], 2, {"n": i, "ended": True})
+        assert history.flush()
+    finally:
+        history.close()
+
+    assert [g["game_id"] for g in history.list_games("ROOM")] == game_ids[:1:-1]
+    assert history.list_games("OTHER") == []
+
+
+def test_game_id_format():
+    game_id = new_game_id("AB12")
+    assert is_valid_game_id(game_id)
+    assert not is_valid_game_id("../etc/passwd")
+    assert not is_valid_game_id(game_id + "/x")
+
+
+# =========================
+# 透過 API 完整玩一局
+# =========================
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "game_history", GameHistory(str(tmp_path)))
+    with TestClient(main.app) as client:
+        yield main, client
+
+
+def play_short_game(main, client):
+    code = client.post("/api/room/create").json()["room_code"]
+    client.cookies.set("room_code", code)
+    host = client.post("/api/room/join", json={"player_name": "alice", "room_code": code}).json()["player_id"]
+    client.post("/api/room/join", json={"player_name": "bob", "room_code": code})
+
+    assert client.post("/api/room/start", json={"player_id": host}).status_code == 200
+    client.post("/api/wheel/spin", json={"player_id": host})
+    client.post("/api/wheel/finish")
+
+    room = main.room_registry.get(code)
+    for dice in ((2, 2), (3, 4), (1, 3)):
+        current = room.get_current_player_id()
+        client.post("/api/game/roll-dice", json={"player_id": current, "dice1": dice[0], "dice2": dice[1]})
+        client.post("/api/game/update-score", json={"player_id": current, "score_delta": 1})
+        client.post("/api/game/add-wine", json={"player_id": current, "color": "red"})
+        client.post("/api/game/next-turn", json={"player_id": current})
+    return room
+
+
+def test_replay_matches_live_room(api):
+    main, client = api
+    room = play_short_game(main, client)
+
+    replay = client.get(f"/api/game/history/{room.game_id}/replay").json()
+    with room.lock:
+        live = room.get_state()
+
+    assert replay["version"] == room.version
+    assert replay["state"] == live
+    assert replay["event"]["type"] == "next_turn"
+
+
+def test_export_streams_one_json_line_per_event(api):
+    main, client = api
+    room = play_short_game(main, client)
+    game_id = room.game_id
+
+    response = client.get(f"/api/game/history/{game_id}/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = response.text.splitlines()
+    entries = [json.loads(line) for line in lines]
+    assert [e["seq"] for e in entries] == list(range(1, len(entries) + 1))
+    assert entries[0]["type"] == "game_start" and "state" in entries[0]
+    assert {"turn_order", "roll", "score", "add_wine", "next_turn"} <= {e["type"] for e in entries}
+    assert sum(1 for e in entries if e["type"] == "roll") == 3
+
+    assert client.get("/api/game/history/not-a-game/export").status_code == 400
@@ -0,0 +1,175 @@
+import json
+import os
+
+import pytest
+
+import game_logic
+from game_logic import (
+    DRUNK_MODE,
+    FAMILY_MODE,
+    GAME_RULES,
+    MAX_SCORE,
+    MIN_SCORE,
+    CompiledRules,
+    RuleBook,
+    RuleValidationError,
+    resolve_game_event,
+    rules_from_json,
+)
+
+# 改成 ml 之前寫死的規則（秒數）；換算時用原本的固定流量 25 ml/s
+BASELINE_FLOW_RATE = 25.0
+
+
+def baseline_seconds(mode, event, score=None):
+    """原本 resolve_game_event 的分支，原封不動搬過來當對照組"""
+    if event in ("game_start", "after_drink"):
+        return {"game_start": 0.5, "after_drink": 0.7}[event]
+    if mode == FAMILY_MODE:
+        if score in (4, 8):
+            return 0.4
+        if score == 7:
+            return 0.6
+    if mode == DRUNK_MODE:
+        if score in (4, 8):
+            return 0.6
+        if score == 7:
+            return 0.7
+    return None
+
+
+@pytest.mark.parametrize("mode", [FAMILY_MODE, DRUNK_MODE])
+@pytest.mark.parametrize("event", ["game_start", "after_drink"])
+def test_compiled_table_matches_baseline_events(mode, event):
+    compiled = CompiledRules(GAME_RULES)
+    assert compiled.lookup(mode, event) == pytest.approx(baseline_seconds(mode, event) * BASELINE_FLOW_RATE)
+
+
+@pytest.mark.parametrize("mode", [FAMILY_MODE, DRUNK_MODE])
+@pytest.mark.parametrize("score", range(0, MAX_SCORE + 3))
+def test_compiled_table_matches_baseline_scores(mode, score):
+    compiled = CompiledRules(GAME_RULES)
+    expected = baseline_seconds(mode, "score", score)
+
+    volume_ml = compiled.lookup(mode, "score", score)
+    if expected is None:
+        assert volume_ml is None
+    else:
+        # 例如 family 4 點：0.4 秒 ≙ 10 ml
+        assert volume_ml == pytest.approx(expected * BASELINE_FLOW_RATE)
+
+
+def test_resolve_game_event_uses_compiled_rules():
+    result = resolve_game_event(mode=FAMILY_MODE, event="score", score=4, base_pump_id=2)
+    assert result == {"success": True, "pump_id": 2, "volume_ml": 10.0, "message": "點數 4 觸發倒酒"}
+
+    assert resolve_game_event(mode=FAMILY_MODE, event="score", score=5, base_pump_id=2)["success"] is False
+    assert resolve_game_event(mode="nope", event="score", score=4)["success"] is False
+    assert resolve_game_event(mode=FAMILY_MODE, event="nope")["success"] is False
+    assert resolve_game_event(mode=FAMILY_MODE, event="score")["success"] is False
+
+
+def test_rules_from_json_round_trips_to_dict():
+    compiled = CompiledRules(GAME_RULES)
+    reloaded = CompiledRules(rules_from_json(compiled.to_dict()))
+
+    for mode in (FAMILY_MODE, DRUNK_MODE):
+        for score in range(MIN_SCORE, MAX_SCORE + 1):
+            assert reloaded.lookup(mode, "score", score) == compiled.lookup(mode, "score", score)
+        assert reloaded.lookup(mode, "game_start") == compiled.lookup(mode, "game_start")
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {},
+        {"modes": {}},
+        {"modes": {"family": {"bogus": 1}}},
+        {"modes": {"family": {"game_start": 0}}},
+        {"modes": {"family": {"game_start": game_logic.MAX_POUR_ML + 1}}},
+        {"modes": {"family": {"score": [{"scores": [], "volume_ml": 10}]}}},
+        {"modes": {"family": {"score": [{"scores": ["4"], "volume_ml": 10}]}}},
+        {"modes": {"family": {"score": [{"scores": [4], "volume_ml": True}]}}},
+    ],
+)
+def test_rules_from_json_rejects_invalid(data):
+    with pytest.raises(RuleValidationError):
+        rules_from_json(data)
+
+
+def test_compiled_rules_rejects_duplicate_and_out_of_range_scores():
+    with pytest.raises(RuleValidationError):
+        CompiledRules({"family": {"score": {(4,): 10.0, (4, 8): 12.0}}})
+    with pytest.raises(RuleValidationError):
+        CompiledRules({"family": {"score": {(13,): 10.0}}})
+
+
+# =========================
+# RuleBook 熱更新
+# =========================
+def write_rules(path, game_start, mtime):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"modes": {"family": {"game_start": game_start, "score": [{"scores": [7], "volume_ml": 20}]}}}, f)
+    # 明確設定 mtime，避免檔案系統時間解析度太粗導致偵測不到修改
+    os.utime(path, (mtime, mtime))
+
+
+def test_missing_file_uses_builtin_rules(tmp_path):
+    book = RuleBook(str(tmp_path / "missing.json"), reload_interval=0)
+    assert book.current().source == "builtin"
+    assert book.current().lookup(FAMILY_MODE, "score", 4) == 10.0
+
+
+def test_mtime_change_triggers_reload(tmp_path):
+    path = str(tmp_path / "rules.json")
+    write_rules(path, 12.0, mtime=1_000_000)
+    book = RuleBook(path, reload_interval=0)
+    first = book.current()
+    assert first.lookup(FAMILY_MODE, "game_start") == 12.0
+
+    # mtime 沒變：不重新載入
+    assert book.current() is first
+
+    write_rules(path, 30.0, mtime=1_000_010)
+    second = book.current()
+    assert second is not first
+    assert second.source == path
+    assert second.lookup(FAMILY_MODE, "game_start") == 30.0
+
+
+def test_reload_interval_throttles_checks(tmp_path):
+    path = str(tmp_path / "rules.json")
+    write_rules(path, 12.0, mtime=1_000_000)
+    book = RuleBook(path, reload_interval=3600)
+
+    write_rules(path, 30.0, mtime=1_000_010)
+    assert book.current().lookup(FAMILY_MODE, "game_start") == 12.0
+
+
+def test_malformed_file_keeps_previous_rules(tmp_path):
+    path = str(tmp_path / "rules.json")
+    write_rules(path, 12.0, mtime=1_000_000)
+    book = RuleBook(path, reload_interval=0)
+    previous = book.current()
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"modes": {"family": ')
+    os.utime(path, (1_000_010, 1_000_010))
+    assert book.current() is previous
+
+    # 內容是 JSON 但驗證失敗：一樣保留舊規則
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"modes": {"family": {"game_start": -1}}}, f)
+    os.utime(path, (1_000_020, 1_000_020))
+    assert book.current() is previous
+
+    # 修好之後會再載入
+    write_rules(path, 25.0, mtime=1_000_030)
+    assert book.current().lookup(FAMILY_MODE, "game_start") == 25.0
+
+
+def test_malformed_file_at_startup_raises(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text("not json", encoding="utf-8")
+    with pytest.raises(RuleValidationError):
+        RuleBook(str(path))
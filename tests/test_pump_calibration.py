@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from pump_calibration import CalibrationStore, PumpCalibration, fit_calibration
+
+
+def synthetic_samples(flow_rate, dead_volume_ml, startup_lag, durations):
+    """依校正曲線產生理想的實測資料：ml = flow * (t - lag) - dead"""
+    return [
+        {"duration": t, "measured_ml": flow_rate * (t - startup_lag) - dead_volume_ml}
+        for t in durations
+    ]
+
+
+@pytest.mark.parametrize(
+    "flow_rate,dead_volume_ml,startup_lag",
+    [(25.0, 0.0, 0.0), (25.0, 3.0, 0.2), (12.5, 1.5, 0.35), (40.0, 6.0, 0.05)],
+)
+def test_fit_recovers_known_curve(flow_rate, dead_volume_ml, startup_lag):
+    samples = synthetic_samples(flow_rate, dead_volume_ml, startup_lag, [1.0, 2.0, 4.0, 8.0])
+    # 單看 (秒數, ml) 分不出 dead_volume 和 startup_lag，dead_volume 以目前的值為準
+    current = PumpCalibration(flow_rate=10.0, dead_volume_ml=dead_volume_ml, startup_lag=0.0)
+
+    fitted = fit_calibration(samples, current)
+
+    assert fitted.flow_rate == pytest.approx(flow_rate)
+    assert fitted.dead_volume_ml == pytest.approx(dead_volume_ml)
+    assert fitted.startup_lag == pytest.approx(startup_lag)
+    for sample in samples:
+        assert fitted.seconds_for(sample["measured_ml"]) == pytest.approx(sample["duration"])
+
+
+def test_fit_with_single_duration_only_updates_flow():
+    current = PumpCalibration(flow_rate=10.0, dead_volume_ml=2.0, startup_lag=0.2)
+    samples = synthetic_samples(20.0, 2.0, 0.2, [3.0, 3.0])
+
+    fitted = fit_calibration(samples, current)
+
+    assert fitted.flow_rate == pytest.approx(20.0)
+    assert fitted.dead_volume_ml == 2.0
+    assert fitted.startup_lag == 0.2
+
+
+@pytest.mark.parametrize(
+    "samples",
+    [
+        [],
+        [{"duration": 0, "measured_ml": 10}],
+        [{"duration": 1, "measured_ml": -1}],
+        [{"duration": 1, "measured_ml": 30}, {"duration": 2, "measured_ml": 10}],
+    ],
+)
+def test_fit_rejects_bad_samples(samples):
+    with pytest.raises(ValueError):
+        fit_calibration(samples, PumpCalibration())
+
+
+def test_seconds_for_formula():
+    calibration = PumpCalibration(flow_rate=25.0, dead_volume_ml=5.0, startup_lag=0.3)
+
+    # seconds = lag + (ml + dead) / flow
+    assert calibration.seconds_for(20.0) == pytest.approx(0.3 + (20.0 + 5.0) / 25.0)
+    assert calibration.seconds_for(0) == 0.0
+    assert calibration.volume_for(calibration.seconds_for(37.5)) == pytest.approx(37.5)
+    assert calibration.volume_for(0.1) == 0.0
+
+
+def test_default_calibration_matches_baseline_rate():
+    # 沒有校正檔時等同原本的 25 ml/s：0.4 秒 = 10 ml
+    assert PumpCalibration().seconds_for(10.0) == pytest.approx(0.4)
+
+
+def test_invalid_calibration_values():
+    with pytest.raises(ValueError):
+        PumpCalibration(flow_rate=0)
+    with pytest.raises(ValueError):
+        PumpCalibration(dead_volume_ml=-1)
+    with pytest.raises(ValueError):
+        PumpCalibration(startup_lag=-0.1)
+
+
+def test_store_persists_calibrations(tmp_path):
+    path = str(tmp_path / "calibration.json")
+    store = CalibrationStore([1, 2], path=path)
+    store.set(2, PumpCalibration(flow_rate=30.0, dead_volume_ml=1.0, startup_lag=0.1))
+
+    with open(path, "r", encoding="utf-8") as f:
+        assert json.load(f)["pumps"]["2"]["flow_rate"] == 30.0
+
+    reloaded = CalibrationStore([1, 2], path=path)
+    assert reloaded.get(1).to_dict() == PumpCalibration().to_dict()
+    assert reloaded.get(2).to_dict() == {"flow_rate": 30.0, "dead_volume_ml": 1.0, "startup_lag": 0.1}
+    with pytest.raises(ValueError):
+        reloaded.get(9)
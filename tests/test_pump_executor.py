@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from pump_calibration import CalibrationStore
+from pump_controller import PUMP_FORWARD, PUMP_OFF, PUMP_PINS, PumpController
+from pump_executor import PumpExecutor
+from pump_hardware import PumpHardwareThread
+from pump_reservoir import ReservoirTracker
+
+
+@pytest.fixture
+def hardware():
+    """模擬 GPIO + 虛擬時鐘的幫浦硬體執行緒"""
+    controller = PumpController(
+        simulation=True,
+        calibration=CalibrationStore(PUMP_PINS.keys(), path=None),
+        reservoirs=ReservoirTracker(PUMP_PINS.keys(), path=None),
+    )
+    hardware = PumpHardwareThread(controller)
+    hardware.start()
+    yield hardware
+    hardware.shutdown()
+
+
+def real(hardware, seconds):
+    """真實秒數換成幫浦時鐘的秒數（模擬模式是倍速的）"""
+    return seconds * hardware.time_scale()
+
+
+def pins_low(controller, pump_id):
+    pins = PUMP_PINS[pump_id]
+    return controller.gpio.input(pins["in1"]) == 0 and controller.gpio.input(pins["in2"]) == 0
+
+
+async def wait_for_state(controller, pump_id, state, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while controller.states[pump_id] != state and time.monotonic() < deadline:
+        await asyncio.sleep(0.01)
+    assert controller.states[pump_id] == state
+
+
+def test_emergency_stop_cancels_in_flight_pour(hardware):
+    controller = hardware.controller
+    finished = []
+
+    async def scenario():
+        executor = PumpExecutor(hardware, max_concurrent=2)
+        executor.start(asyncio.get_running_loop())
+        # 真實 2 秒的出水，測試期間不會自己倒完
+        running = executor.submit([{"pump_id": 1, "duration": real(hardware, 2.0)}], on_done=finished.append)
+        queued = executor.submit([{"pump_id": 2, "duration": 1.0}], on_done=finished.append)
+
+        await wait_for_state(controller, 1, PUMP_FORWARD)
+
+        result = await executor.emergency_stop()
+        assert set(result["cancelled_jobs"]) == {running.job_id, queued.job_id}
+        assert running.status == "cancelled"
+        assert queued.status == "cancelled"
+
+        # 之後也不會有任何幫浦被重新啟動
+        await asyncio.sleep(0.2)
+        await executor.shutdown()
+
+    asyncio.run(scenario())
+
+    assert all(state == PUMP_OFF for state in controller.states.values())
+    assert all(pins_low(controller, pump_id) for pump_id in PUMP_PINS)
+    assert {job.status for job in finished} == {"cancelled"}
+    assert len(finished) == 2
+    # 排隊中的工作從來沒有啟動 2 號幫浦
+    assert all(state != PUMP_FORWARD for _, state in controller.pump_timeline(2))
+
+
+def test_pour_completes_and_stops_pump(hardware):
+    controller = hardware.controller
+    finished = []
+
+    async def scenario():
+        executor = PumpExecutor(hardware, max_concurrent=2)
+        executor.start(asyncio.get_running_loop())
+        job = executor.submit(
+            [{"pump_id": 1, "duration": real(hardware, 0.1)}, {"pump_id": 3, "duration": real(hardware, 0.05)}],
+            on_done=finished.append,
+        )
+        for _ in range(200):
+            if job.finished:
+                break
+            await asyncio.sleep(0.01)
+        await executor.shutdown()
+        return job
+
+    job = asyncio.run(scenario())
+
+    assert job.status == "done"
+    assert finished == [job]
+    assert all(state == PUMP_OFF for state in controller.states.values())
+    assert controller.dispensed_ml(1)[1] > controller.dispensed_ml(3)[3] > 0
+
+
+def test_on_done_runs_off_the_event_loop(hardware):
+    callback_threads = []
+    release = threading.Event()
+
+    def slow_callback(job):
+        # 像 room.update_pour 一樣會拿鎖、寫快照：卡住也不能拖到 event loop
+        callback_threads.append(threading.get_ident())
+        release.wait(timeout=2)
+
+    async def scenario():
+        executor = PumpExecutor(hardware, max_concurrent=2)
+        executor.start(asyncio.get_running_loop())
+        job = executor.submit([{"pump_id": 1, "duration": real(hardware, 0.05)}], on_done=slow_callback)
+        for _ in range(200):
+            if callback_threads:
+                break
+            await asyncio.sleep(0.01)
+
+        # 回呼還卡著，event loop 照樣能跑計時
+        t0 = time.monotonic()
+        await asyncio.sleep(0.05)
+        elapsed = time.monotonic() - t0
+        release.set()
+        await executor.shutdown()
+        return job, threading.get_ident(), elapsed
+
+    job, loop_thread, elapsed = asyncio.run(scenario())
+    assert job.status == "done"
+    assert len(callback_threads) == 1 and callback_threads[0] != loop_thread
+    assert elapsed < 0.5
+
+
+def test_stop_pump_cancels_only_that_pump(hardware):
+    controller = hardware.controller
+
+    async def scenario():
+        executor = PumpExecutor(hardware, max_concurrent=2)
+        executor.start(asyncio.get_running_loop())
+        job = executor.submit([{"pump_id": 1, "duration": real(hardware, 2.0)}, {"pump_id": 2, "duration": real(hardware, 0.3)}])
+        await wait_for_state(controller, 1, PUMP_FORWARD)
+
+        result = await executor.stop_pump(1)
+        assert result["cancelled_pours"] == 1
+        assert controller.states[1] == PUMP_OFF
+        # 2 號照常倒完
+        for _ in range(200):
+            if job.finished:
+                break
+            await asyncio.sleep(0.01)
+        await executor.shutdown()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "cancelled"
+    assert controller.dispensed_ml(2)[2] > 0
+    assert pins_low(controller, 1) and pins_low(controller, 2)
@@ -0,0 +1,103 @@
+import sys
+import threading
+
+import pytest
+
+from pump_reservoir import LEVEL_EMPTY, LEVEL_LOW, LEVEL_OK, ReservoirTracker
+
+
+def make_tracker(**kwargs):
+    kwargs.setdefault("path", None)
+    kwargs.setdefault("capacity_ml", 750.0)
+    return ReservoirTracker([1, 2], **kwargs)
+
+
+def test_record_run_reduces_remaining():
+    tracker = make_tracker()
+    tracker.record_run(1, 2.0, 50.0)
+    tracker.record_run(1, 1.0, 25.0)
+
+    status = tracker.status(1)[1]
+    assert status["dispensed_ml"] == 75.0
+    assert status["run_seconds"] == 3.0
+    assert status["remaining_ml"] == 675.0
+    assert tracker.status(2)[2]["remaining_ml"] == 750.0
+
+
+def test_levels_and_alerts():
+    tracker = make_tracker()
+    tracker.record_run(1, 1.0, 700.0)
+    tracker.record_run(2, 1.0, 800.0)
+
+    assert tracker.status(1)[1]["level"] == LEVEL_LOW
+    assert tracker.status(2)[2]["level"] == LEVEL_EMPTY
+    assert [a["pump_id"] for a in tracker.alerts()] == [1, 2]
+
+
+def test_refill_keeps_totals_unless_reset():
+    tracker = make_tracker()
+    tracker.record_run(1, 4.0, 600.0)
+
+    status = tracker.refill(1, volume_ml=500.0)[1]
+    assert status["remaining_ml"] == 500.0
+    assert status["dispensed_ml"] == 600.0
+    assert status["level"] == LEVEL_OK
+
+    tracker.record_run(1, 1.0, 100.0)
+    assert tracker.status(1)[1]["remaining_ml"] == 400.0
+
+    status = tracker.refill(1, reset_totals=True)[1]
+    assert status == {**status, "remaining_ml": 750.0, "dispensed_ml": 0.0, "run_seconds": 0.0}
+    with pytest.raises(ValueError):
+        tracker.refill(1, volume_ml=751.0)
+
+
+def test_configure_keeps_remaining_volume():
+    tracker = make_tracker()
+    tracker.record_run(1, 1.0, 100.0)
+
+    status = tracker.configure(1, capacity_ml=1000.0, low_threshold_ml=50.0)[1]
+    assert status["remaining_ml"] == 650.0
+    assert status["low_threshold_ml"] == 50.0
+
+    # 容量改小：剩餘量不能超過新容量
+    assert tracker.configure(1, capacity_ml=500.0)[1]["remaining_ml"] == 500.0
+    with pytest.raises(ValueError):
+        tracker.configure(1, capacity_ml=0)
+
+
+def test_record_run_during_refill_is_not_lost():
+    tracker = make_tracker(capacity_ml=1_000_000.0)
+    runs, volume = 20_000, 0.5
+    old_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        def hardware():
+            for _ in range(runs):
+                tracker.record_run(1, 0.01, volume)
+
+        thread = threading.Thread(target=hardware)
+        thread.start()
+        while thread.is_alive():
+            tracker.refill(1)
+            tracker.configure(1, capacity_ml=1_000_000.0)
+        thread.join()
+    finally:
+        sys.setswitchinterval(old_interval)
+
+    assert tracker.status(1)[1]["dispensed_ml"] == runs * volume
+    # 最後一次換瓶之後沒有再出水：剩餘量是整瓶
+    tracker.refill(1)
+    assert tracker.status(1)[1]["remaining_ml"] == 1_000_000.0
+
+
+def test_totals_persist(tmp_path):
+    path = str(tmp_path / "reservoirs.json")
+    tracker = make_tracker(path=path)
+    tracker.record_run(2, 3.0, 120.0)
+    tracker.refill(1, volume_ml=300.0)
+    tracker.save()
+
+    reloaded = make_tracker(path=path)
+    assert reloaded.status(2)[2]["dispensed_ml"] == 120.0
+    assert reloaded.status(1)[1]["remaining_ml"] == 300.0
@@ -0,0 +1,122 @@
+import time
+
+import pytest
+
+from pump_calibration import CalibrationStore
+from pump_controller import PUMP_FORWARD, PUMP_OFF, PUMP_PINS, PumpController
+from pump_hardware import PumpHardwareThread
+from pump_reservoir import ReservoirTracker
+from pump_watchdog import PumpDutyCycleError, PumpWatchdog
+
+
+def make_stack(**watchdog_kwargs):
+    """模擬 GPIO + 虛擬時鐘的完整幫浦堆疊（看門狗本身用真實時間，所以期限都設得很短）"""
+    watchdog_kwargs.setdefault("grace", 0.05)
+    watchdog_kwargs.setdefault("heartbeat_timeout", 0.2)
+    watchdog = PumpWatchdog(PUMP_PINS.keys(), force_off=lambda pump_id: None, **watchdog_kwargs)
+    controller = PumpController(
+        simulation=True,
+        calibration=CalibrationStore(PUMP_PINS.keys(), path=None),
+        reservoirs=ReservoirTracker(PUMP_PINS.keys(), path=None),
+        watchdog=watchdog,
+    )
+    hardware = PumpHardwareThread(controller)
+    hardware.start()
+    return hardware
+
+
+@pytest.fixture
+def hardware():
+    hardware = make_stack()
+    yield hardware
+    hardware.shutdown()
+
+
+def wait_until(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def real(hardware, seconds):
+    """真實秒數換成幫浦時鐘的秒數（模擬模式是倍速的，看門狗則一律用真實時間）"""
+    return seconds * hardware.time_scale()
+
+
+def pins_low(controller, pump_id):
+    pins = PUMP_PINS[pump_id]
+    return controller.gpio.input(pins["in1"]) == 0 and controller.gpio.input(pins["in2"]) == 0
+
+
+def test_pump_past_deadline_is_forced_off(hardware):
+    controller = hardware.controller
+    assert hardware.start_pump(1, expected_seconds=real(hardware, 0.05)).result(timeout=1) is True
+    assert controller.states[1] == PUMP_FORWARD
+
+    # 沒有人呼叫 stop：看門狗在 預期 + grace 之後關閉
+    assert wait_until(lambda: controller.states[1] == PUMP_OFF)
+    assert pins_low(controller, 1)
+    metrics = controller.watchdog.metrics()
+    assert metrics["overruns"][1] == 1
+    assert metrics["armed"] == 0
+    # 用量只結算一次
+    assert controller.reservoirs.status(1)[1]["run_seconds"] > 0
+    assert controller.states[2] == PUMP_OFF
+
+
+def test_missed_heartbeat_stops_all_pumps(hardware):
+    controller = hardware.controller
+    watchdog = controller.watchdog
+    watchdog.heartbeat()
+    hardware.start_pump(1, expected_seconds=real(hardware, 10.0)).result(timeout=1)
+    hardware.start_pump(2).result(timeout=1)
+
+    assert wait_until(lambda: all(controller.states[p] == PUMP_OFF for p in (1, 2)))
+    assert pins_low(controller, 1) and pins_low(controller, 2)
+    assert watchdog.heartbeat_trips == 1
+    # 心跳逾時不算超時
+    assert watchdog.metrics()["overruns"][1] == 0
+
+
+def test_regular_heartbeat_keeps_pump_running(hardware):
+    controller = hardware.controller
+    watchdog = controller.watchdog
+    watchdog.heartbeat()
+    hardware.start_pump(1, expected_seconds=real(hardware, 10.0)).result(timeout=1)
+
+    for _ in range(6):
+        time.sleep(0.1)
+        watchdog.heartbeat()
+    assert controller.states[1] == PUMP_FORWARD
+    assert watchdog.heartbeat_trips == 0
+    hardware.stop_pump(1).result(timeout=1)
+
+
+def test_duty_cycle_limit_refuses_start():
+    hardware = make_stack(duty_window=2.0, max_duty_cycle=0.25, max_run_seconds=1.0)
+    controller = hardware.controller
+    try:
+        # 單次超過上限
+        with pytest.raises(PumpDutyCycleError):
+            hardware.start_pump(1, expected_seconds=real(hardware, 1.5)).result(timeout=1)
+
+        # 視窗內運轉約 0.3 秒，額度 0.5 秒只剩約 0.2 秒
+        hardware.start_pump(1, expected_seconds=real(hardware, 0.3)).result(timeout=1)
+        time.sleep(0.3)
+        hardware.stop_pump(1).result(timeout=1)
+
+        with pytest.raises(PumpDutyCycleError):
+            hardware.start_pump(1, expected_seconds=real(hardware, 0.3)).result(timeout=1)
+        assert controller.states[1] == PUMP_OFF
+        assert pins_low(controller, 1)
+        assert controller.watchdog.metrics()["duty_refusals"][1] == 2
+
+        # 其他幫浦不受影響
+        assert hardware.start_pump(2, expected_seconds=real(hardware, 0.3)).result(timeout=1) is True
+        hardware.stop_pump(2).result(timeout=1)
+    finally:
+        hardware.shutdown()
+
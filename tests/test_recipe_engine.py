@@ -0,0 +1,94 @@
+import pytest
+
+from recipe_engine import (
+    BASE_PORTION_ML,
+    COLOR_PUMPS,
+    STACK_PORTION_ML,
+    build_pour_plan,
+    estimate_wall_time,
+    recipe_to_ingredients,
+    stack_to_ingredients,
+)
+
+
+def seconds_at_25ml(pump_id, volume_ml):
+    return volume_ml / 25.0
+
+
+def test_same_pump_is_started_once():
+    plan = build_pour_plan(stack_to_ingredients(["red", "blue", "red"]), seconds_at_25ml, max_concurrent=2)
+
+    by_pump = {a["pump_id"]: a for a in plan["actions"]}
+    assert by_pump[COLOR_PUMPS["red"]]["volume_ml"] == 2 * STACK_PORTION_ML
+    assert by_pump[COLOR_PUMPS["blue"]]["volume_ml"] == STACK_PORTION_ML
+    assert plan["total_ml"] == 3 * STACK_PORTION_ML
+    # 長的排前面
+    assert plan["actions"][0]["pump_id"] == COLOR_PUMPS["red"]
+
+
+def test_base_uses_game_selected_pump():
+    # 基底酒是紅色，但遊戲選的基底幫浦是 3 號（不是紅色對應的 1 號）
+    ingredients = stack_to_ingredients(["blue"], base_color="red", base_pump_id=3)
+    plan = build_pour_plan(ingredients, seconds_at_25ml, max_concurrent=4)
+
+    by_pump = {a["pump_id"]: a for a in plan["actions"]}
+    assert set(by_pump) == {3, COLOR_PUMPS["blue"]}
+    assert by_pump[3]["volume_ml"] == BASE_PORTION_ML
+    assert by_pump[3]["color"] == "red"
+
+
+def test_base_pump_merges_with_stack_on_same_pump():
+    ingredients = stack_to_ingredients(["yellow"], base_color="red", base_pump_id=COLOR_PUMPS["yellow"])
+    plan = build_pour_plan(ingredients, seconds_at_25ml, max_concurrent=4)
+
+    assert [a["pump_id"] for a in plan["actions"]] == [COLOR_PUMPS["yellow"]]
+    assert plan["actions"][0]["volume_ml"] == BASE_PORTION_ML + STACK_PORTION_ML
+
+
+def test_base_without_selected_pump_falls_back_to_color():
+    plan = build_pour_plan(stack_to_ingredients([], base_color="green"), seconds_at_25ml, max_concurrent=1)
+    assert [a["pump_id"] for a in plan["actions"]] == [COLOR_PUMPS["green"]]
+
+
+def test_invalid_ingredients():
+    with pytest.raises(ValueError):
+        build_pour_plan(stack_to_ingredients(["purple"]), seconds_at_25ml, max_concurrent=1)
+    with pytest.raises(ValueError):
+        build_pour_plan(stack_to_ingredients([], base_color="red", base_pump_id=9), seconds_at_25ml, max_concurrent=1)
+    with pytest.raises(ValueError):
+        build_pour_plan([], seconds_at_25ml, max_concurrent=1)
+    with pytest.raises(ValueError):
+        recipe_to_ingredients("nope")
+
+
+def test_recipe_plan_and_wall_time():
+    plan = build_pour_plan(recipe_to_ingredients("rainbow"), seconds_at_25ml, max_concurrent=2)
+
+    assert plan["total_ml"] == 30.0
+    assert plan["pump_time"] == pytest.approx(4 * 0.3)
+    assert plan["estimated_time"] == pytest.approx(0.6)
+    assert estimate_wall_time([3.0, 2.0, 2.0], 2) == 4.0
+    assert estimate_wall_time([], 2) == 0.0
+
+
+def test_pour_drink_endpoint_pours_base_from_room_pump():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        code = client.post("/api/room/create").json()["room_code"]
+        room = main.room_registry.get(code)
+        with room.mutate():
+            room.base_wine_color = "red"
+            room.base_pump_id = 4
+            room.wine_stack[:] = ["blue"]
+
+        client.cookies.set("room_code", code)
+        data = client.post("/api/game/pour-drink", json={}).json()
+
+    assert data["success"] is True
+    assert {a["pump_id"]: a["volume_ml"] for a in data["actions"]} == {
+        4: BASE_PORTION_ML,
+        COLOR_PUMPS["blue"]: STACK_PORTION_ML,
+    }
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from fastapi import WebSocketDisconnect
+
+from room_events import RoomBroadcaster, RoomSubscriber
+
+
+class FakeRoom:
+    room_code = "TEST"
+
+
+class FakeWebSocket:
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    async def send_json(self, message):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(message)
+
+
+@pytest.mark.parametrize("error", [WebSocketDisconnect(code=1001), RuntimeError("socket closed")])
+def test_send_failure_unsubscribes_and_exits(error):
+    async def scenario():
+        broadcaster = RoomBroadcaster()
+        room = FakeRoom()
+        subscriber = RoomSubscriber(FakeWebSocket(error), None)
+        broadcaster.subscribe(room, subscriber)
+
+        task = asyncio.create_task(subscriber.run(broadcaster, room))
+        subscriber.offer({"type": "state"})
+        await asyncio.wait_for(task, timeout=1)
+
+        assert broadcaster.subscriber_count(room.room_code) == 0
+        # 接收端的 finally 再取消一次也沒問題
+        broadcaster.unsubscribe(room, subscriber)
+
+    asyncio.run(scenario())
+
+
+def test_only_latest_message_is_sent():
+    async def scenario():
+        broadcaster = RoomBroadcaster()
+        room = FakeRoom()
+        websocket = FakeWebSocket()
+        subscriber = RoomSubscriber(websocket, None)
+        broadcaster.subscribe(room, subscriber)
+
+        task = asyncio.create_task(subscriber.run(broadcaster, room))
+        subscriber.offer({"n": 1})
+        subscriber.offer({"n": 2})
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        task.cancel()
+
+        assert websocket.sent == [{"n": 2}]
+        assert broadcaster.subscriber_count(room.room_code) == 1
+
+    asyncio.run(scenario())
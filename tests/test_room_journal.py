@@ -0,0 +1,105 @@
+import json
+import os
+
+from room_journal import JOURNAL_SUFFIX, SNAPSHOT_SUFFIX, RoomJournal
+
+
+def make_journal(directory, **kwargs):
+    kwargs.setdefault("fsync_interval", 0.0)
+    return RoomJournal(directory=str(directory), **kwargs)
+
+
+def write_states(directory, states, **kwargs):
+    """依序記錄 [(版本, 狀態), ...] 後關閉（等同伺服器正常寫入一段時間）"""
+    journal = make_journal(directory, **kwargs)
+    journal.start()
+    for version, state in states:
+        journal.record("ROOM", version, state)
+    journal.close()
+    return journal
+
+
+def read_lines(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().splitlines()
+
+
+def test_replays_snapshot_plus_journal(tmp_path):
+    states = [
+        (1, {"round": 1, "scores": {"p1": 0}, "stack": []}),
+        (2, {"round": 1, "scores": {"p1": 2}, "stack": ["red"]}),
+        (3, {"round": 2, "scores": {"p1": 2, "p2": 1}, "stack": ["red", "blue"]}),
+        (4, {"round": 2, "scores": {"p2": 1}, "stack": []}),
+    ]
+    write_states(tmp_path, states)
+
+    # 第一筆是快照，之後是 journal 中的 patch
+    assert len(read_lines(tmp_path / f"ROOM{JOURNAL_SUFFIX}")) == 3
+
+    loaded = make_journal(tmp_path).load_all()
+    assert loaded == {"ROOM": states[-1]}
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    states = [(1, {"n": 1}), (2, {"n": 2}), (3, {"n": 3})]
+    write_states(tmp_path, states)
+
+    # 斷電：最後一行只寫了一半
+    with open(tmp_path / f"ROOM{JOURNAL_SUFFIX}", "a", encoding="utf-8") as f:
+        f.write('{"v": 4, "patch": {"n"')
+
+    assert make_journal(tmp_path).load_all() == {"ROOM": (3, {"n": 3})}
+
+
+def test_journal_entries_covered_by_snapshot_are_skipped(tmp_path):
+    # 寫完新快照、還沒清空 journal 就當機：journal 裡是快照之前的舊 patch
+    with open(tmp_path / f"ROOM{SNAPSHOT_SUFFIX}", "w", encoding="utf-8") as f:
+        json.dump({"version": 5, "state": {"n": 5, "keep": True}}, f)
+    with open(tmp_path / f"ROOM{JOURNAL_SUFFIX}", "w", encoding="utf-8") as f:
+        for entry in (
+            {"v": 4, "patch": {"n": 4, "keep": None}},
+            {"v": 5, "patch": {"n": 5}},
+            {"v": 6, "patch": {"n": 6}},
+        ):
+            f.write(json.dumps(entry) + "\n")
+
+    assert make_journal(tmp_path).load_all() == {"ROOM": (6, {"n": 6, "keep": True})}
+
+
+def test_snapshot_rewrite_clears_journal(tmp_path):
+    every = 3
+    states = [(v, {"n": v}) for v in range(1, every + 3)]  # 快照 + every 筆 patch + 觸發重寫的一筆
+    journal = write_states(tmp_path, states, snapshot_every=every)
+
+    with open(tmp_path / f"ROOM{SNAPSHOT_SUFFIX}", "r", encoding="utf-8") as f:
+        snapshot = json.load(f)
+    assert snapshot == {"version": every + 2, "state": {"n": every + 2}}
+    assert read_lines(tmp_path / f"ROOM{JOURNAL_SUFFIX}") == []
+    assert journal.snapshots == 2
+
+    assert make_journal(tmp_path).load_all() == {"ROOM": (every + 2, {"n": every + 2})}
+
+
+def test_restored_room_continues_after_restart(tmp_path):
+    write_states(tmp_path, [(1, {"n": 1}), (2, {"n": 2})])
+
+    journal = make_journal(tmp_path)
+    assert journal.load_all() == {"ROOM": (2, {"n": 2})}
+    journal.start()
+    journal.record("ROOM", 3, {"n": 3})
+    journal.close()
+
+    assert make_journal(tmp_path).load_all() == {"ROOM": (3, {"n": 3})}
+
+
+def test_remove_deletes_files(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.start()
+    journal.record("ROOM", 1, {"n": 1})
+    journal.record("ROOM", 2, {"n": 2})
+    journal.remove("ROOM")
+    journal.close()
+
+    assert not os.path.exists(tmp_path / f"ROOM{SNAPSHOT_SUFFIX}")
+    assert not os.path.exists(tmp_path / f"ROOM{JOURNAL_SUFFIX}")
+    assert make_journal(tmp_path).load_all() == {}
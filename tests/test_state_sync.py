@@ -0,0 +1,277 @@
+import copy
+import random
+
+import pytest
+
+from state_sync import StateHistory, apply_merge_patch, compose_merge_patches, make_merge_patch
+
+
+def drop_nones(value):
+    """merge patch 以 None 表示刪除：值為 None 的欄位套用後等同不存在"""
+    if isinstance(value, dict):
+        return {k: drop_nones(v) for k, v in value.items() if v is not None}
+    return value
+
+
+CASES = [
+    # 新增 / 修改 / 刪除欄位
+    ({"a": 1, "b": 2}, {"a": 1, "b": 3, "c": 4}),
+    ({"a": 1, "b": 2}, {"a": 1}),
+    # 巢狀 dict：只送變動的子欄位，子欄位也可以刪除
+    ({"scores": {"p1": 1, "p2": 2}}, {"scores": {"p1": 1, "p3": 0}}),
+    ({"x": {"y": {"z": 1, "w": 2}}}, {"x": {"y": {"z": 5}}}),
+    # list 整個取代
+    ({"stack": ["red", "blue"]}, {"stack": ["red"]}),
+    ({"stack": ["red"]}, {"stack": []}),
+    # 型別改變：dict <-> 純量
+    ({"last_pour": {"status": "running"}}, {"last_pour": "gone"}),
+    ({"last_pour": "x"}, {"last_pour": {"status": "done"}}),
+    # 值變成 None（等同刪除）/ 從 None 變成有值
+    ({"question": "q1", "answer": "a1"}, {"question": None, "answer": "a1"}),
+    ({"question": None}, {"question": "q2"}),
+    ({}, {}),
+]
+
+
+@pytest.mark.parametrize("old,new", CASES)
+def test_round_trip(old, new):
+    old_copy = copy.deepcopy(old)
+    patch = make_merge_patch(old, new)
+
+    assert apply_merge_patch(drop_nones(old), patch) == drop_nones(new)
+    # 不修改輸入
+    assert old == old_copy
+
+
+def test_unchanged_state_gives_empty_patch():
+    state = {"a": 1, "b": {"c": [1, 2]}}
+    assert make_merge_patch(state, copy.deepcopy(state)) == {}
+
+
+def test_deleted_key_is_sent_as_none():
+    assert make_merge_patch({"a": 1, "b": 2}, {"a": 1}) == {"b": None}
+
+
+def random_state(rng, depth=0):
+    state = {}
+    for key in rng.sample("abcdef", rng.randint(0, 5)):
+        kind = rng.random()
+        if kind < 0.4:
+            state[key] = rng.randint(0, 3)
+        elif kind < 0.6:
+            state[key] = [rng.randint(0, 3) for _ in range(rng.randint(0, 3))]
+        elif kind < 0.8 and depth < 2:
+            state[key] = random_state(rng, depth + 1)
+        else:
+            state[key] = rng.choice(["x", "y", True])
+    return state
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_random_round_trip_and_compose(seed):
+    rng = random.Random(seed)
+    a, b, c = random_state(rng), random_state(rng), random_state(rng)
+    ab, bc = make_merge_patch(a, b), make_merge_patch(b, c)
+
+    assert apply_merge_patch(a, ab) == b
+    assert apply_merge_patch(apply_merge_patch(a, ab), bc) == c
+    composed = compose_merge_patches(ab, bc)
+    # None 代表無法合併（呼叫端改給完整快照），否則合併結果必須等同依序套用
+    if composed is not None:
+        assert apply_merge_patch(a, composed) == c
+
+
+@pytest.mark.parametrize(
+    "middle",
+    [
+        {},                          # 欄位被刪除
+        {"g": None},
+        {"g": "reset"},              # 改成純量
+        {"g": [1, 2]},
+        {"g": {"x": 1, "y": 2, "sub": 0}},  # 子欄位被刪除 / 改成純量後又設回 dict
+    ],
+)
+def test_compose_refuses_dict_after_delete_or_scalar(middle):
+    a = {"g": {"x": 1, "y": 2, "sub": {"k": 1}}}
+    c = {"g": {"z": 3, "sub": {"q": 2}}} if "g" in middle and isinstance(middle["g"], dict) else {"g": {"z": 3}}
+    ab, bc = make_merge_patch(a, middle), make_merge_patch(middle, c)
+
+    assert apply_merge_patch(apply_merge_patch(a, ab), bc) == c
+    assert compose_merge_patches(ab, bc) is None
+
+
+def test_compose_still_merges_dict_updates():
+    a = {"g": {"x": 1, "y": 2}}
+    b = {"g": {"x": 1, "y": 3}}
+    c = {"g": {"y": 3, "z": 4}}
+    composed = compose_merge_patches(make_merge_patch(a, b), make_merge_patch(b, c))
+
+    assert composed == {"g": {"x": None, "y": 3, "z": 4}}
+    assert apply_merge_patch(a, composed) == c
+
+
+# =========================
+# StateHistory / ?since=
+# =========================
+def test_since_composes_recorded_versions():
+    history = StateHistory({"n": 0, "stack": []})
+    history.record(1, {"n": 1, "stack": ["red"]})
+    history.record(2, {"n": 2, "stack": ["red", "blue"]})
+
+    assert history.since(2, 2) == {}
+    assert history.since(1, 2) == {"n": 2, "stack": ["red", "blue"]}
+    assert apply_merge_patch({"n": 0, "stack": []}, history.since(0, 2)) == {"n": 2, "stack": ["red", "blue"]}
+
+
+def test_since_older_than_buffer_returns_none():
+    history = StateHistory({"n": 0}, maxlen=4)
+    for v in range(1, 11):
+        history.record(v, {"n": v})
+
+    assert history.since(5, 10) is None   # 第 6 版已經被擠出緩衝區
+    assert history.since(6, 10) == {"n": 10}
+    assert history.since(11, 10) is None  # 比目前還新（例如伺服器重啟）
+
+
+def test_since_falls_back_when_dict_is_reset_then_replaced():
+    # 闔家歡結果 → 重置（None）→ 喝醉模式結果：合併後會留下舊的 max_score / min_score
+    family = {"game_result": {"mode": "family", "max_score": 5, "min_score": 1, "winners": []}}
+    drunk = {"game_result": {"mode": "drunk", "winners": []}}
+    history = StateHistory(family)
+    history.record(1, {"game_result": None})
+    history.record(2, drunk)
+
+    assert history.since(0, 2) is None
+    # 從重置之後開始的客戶端仍然可以拿增量
+    assert apply_merge_patch({}, history.since(1, 2)) == drunk
+
+
+def test_since_after_reset_returns_none():
+    history = StateHistory({"n": 0})
+    history.record(1, {"n": 1})
+    history.reset({"n": 5})
+
+    assert history.since(0, 5) is None
+
+
+@pytest.fixture
+def room():
+    from main import GameRoom
+    room = GameRoom("TEST")
+    room.add_player("alice")
+    room.add_player("bob")
+    return room
+
+
+def test_room_delta_when_client_is_recent(room):
+    from main import state_or_delta
+
+    since = room.version
+    with room.mutate():
+        room.wine_stack.append("red")
+
+    result = state_or_delta(room, {}, since, room.epoch)
+    assert result["delta"] is True
+    assert result["patch"]["wine_stack"] == ["red"]
+    assert result["version"] == room.version
+
+
+def test_room_falls_back_to_full_state_on_epoch_mismatch(room):
+    from main import state_or_delta
+
+    since = room.version
+    with room.mutate():
+        room.wine_stack.append("red")
+
+    result = state_or_delta(room, {}, since, "not-the-epoch")
+    assert "delta" not in result
+    assert result["wine_stack"] == ["red"]
+    assert result["epoch"] == room.epoch
+
+
+def test_room_falls_back_to_full_state_when_game_result_is_replaced(room):
+    from main import state_or_delta
+
+    with room.mutate():
+        room.game_result = {"mode": "family", "max_score": 5, "min_score": 1, "winners": [], "losers": []}
+    since = room.version
+    with room.mutate():
+        room.game_result = None
+    with room.mutate():
+        room.game_result = {"mode": "drunk", "winners": [], "losers": []}
+
+    result = state_or_delta(room, {}, since, room.epoch)
+    assert "delta" not in result
+    assert result["game_result"] == {"mode": "drunk", "winners": [], "losers": []}
+
+
+def test_room_falls_back_to_full_state_when_history_is_exhausted(room):
+    from main import state_or_delta
+    from state_sync import STATE_HISTORY_SIZE
+
+    since = room.version
+    for i in range(STATE_HISTORY_SIZE + 1):
+        with room.mutate():
+            room.current_round = i + 2
+
+    result = state_or_delta(room, {}, since, room.epoch)
+    assert "delta" not in result
+    assert result["version"] == room.version
+    assert result["current_round"] == STATE_HISTORY_SIZE + 2
+
+
+def test_room_mutation_without_changes_keeps_version(room):
+    notified = []
+    room.listeners.append(notified.append)
+    version, etag = room.version, room.etag()
+
+    with room.mutate():
+        room.wine_stack[:] = list(room.wine_stack)
+        with room.mutate():
+            pass
+    assert (room.version, room.etag()) == (version, etag)
+    assert notified == []
+
+    # 改了又改回來也算沒變
+    with room.mutate():
+        room.current_round += 1
+        room.current_round -= 1
+    assert room.version == version
+
+    # 只改不在 get_state() 裡的欄位（轉盤 / 遊戲順序）仍然要遞增版本
+    with room.mutate():
+        room.spin_seed = 42
+    assert room.version == version + 1
+    assert notified == [room]
+
+
+def test_noop_endpoints_keep_etag():
+    from fastapi.testclient import TestClient
+
+    import main
+
+    with TestClient(main.app) as client:
+        code = client.post("/api/room/create").json()["room_code"]
+        client.cookies.set("room_code", code)
+        host = client.post("/api/room/join", json={"player_name": "alice", "room_code": code}).json()["player_id"]
+        room = main.room_registry.get(code)
+
+        def etag():
+            response = client.get("/api/room/state")
+            assert response.status_code == 200
+            return response.headers["ETag"]
+
+        # 遊戲還沒開始：提早丟出 400
+        before = etag()
+        assert client.post("/api/game/increment-round", json={"player_id": host, "new_round": 2}).status_code == 400
+        assert client.get("/api/room/state", headers={"If-None-Match": before}).status_code == 304
+
+        # 酒鬼模式不使用回合：回傳 success False，什麼都沒改
+        with room.mutate():
+            room.game_started = True
+            room.game_mode = "drunk"
+        before, version = etag(), room.version
+        data = client.post("/api/game/increment-round", json={"player_id": host, "new_round": 2}).json()
+        assert data["success"] is False
+        assert room.version == version
+        assert client.get("/api/room/state", headers={"If-None-Match": before}).status_code == 304
@@ -0,0 +1,114 @@
+import random
+
+import pytest
+
+from waiting_queue import WaitingQueue
+
+
+class P:
+    def __init__(self, player_id):
+        self.player_id = player_id
+
+
+def assert_matches(queue, expected):
+    assert [p.player_id for p in queue] == expected
+    assert len(queue) == len(expected)
+    for i, player_id in enumerate(expected, start=1):
+        assert queue.position(player_id) == i
+
+
+def test_positions_follow_fifo_order():
+    queue = WaitingQueue()
+    for pid in "abcd":
+        queue.append(P(pid))
+
+    assert_matches(queue, list("abcd"))
+    assert queue.position("x") is None
+
+
+def test_remove_head_and_readd_goes_to_tail():
+    queue = WaitingQueue()
+    for pid in "abc":
+        queue.append(P(pid))
+
+    assert queue.remove("a").player_id == "a"
+    assert_matches(queue, ["b", "c"])
+    assert queue.position("a") is None
+
+    queue.append(P("a"))
+    assert_matches(queue, ["b", "c", "a"])
+
+
+def test_append_existing_player_keeps_position():
+    queue = WaitingQueue()
+    for pid in "abc":
+        queue.append(P(pid))
+    queue.append(P("a"))
+
+    assert_matches(queue, list("abc"))
+
+
+def test_popleft_and_empty_queue():
+    queue = WaitingQueue()
+    queue.append(P("a"))
+    queue.append(P("b"))
+
+    assert queue.popleft().player_id == "a"
+    assert_matches(queue, ["b"])
+    assert queue.popleft().player_id == "b"
+    assert not queue
+    with pytest.raises(IndexError):
+        queue.popleft()
+    assert queue.remove("b") is None
+
+
+def test_clear_resets_positions():
+    queue = WaitingQueue()
+    for pid in "abc":
+        queue.append(P(pid))
+    queue.clear()
+    queue.append(P("z"))
+
+    assert_matches(queue, ["z"])
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_operations_match_plain_list(seed):
+    rng = random.Random(seed)
+    queue = WaitingQueue()
+    expected = []
+    next_id = 0
+
+    # 次數遠超過 MIN_CAPACITY，過程中會多次重建 Fenwick tree
+    for _ in range(600):
+        op = rng.random()
+        if op < 0.45 or not expected:
+            pid = f"p{next_id}"
+            next_id += 1
+            queue.append(P(pid))
+            expected.append(pid)
+        elif op < 0.6:
+            # 移除最前面（進場）
+            assert queue.popleft().player_id == expected.pop(0)
+        elif op < 0.75:
+            # 移除隊首後重新排隊（移到最後）
+            pid = expected.pop(0)
+            assert queue.remove(pid).player_id == pid
+            queue.append(P(pid))
+            expected.append(pid)
+        elif op < 0.9:
+            pid = rng.choice(expected)
+            assert queue.remove(pid).player_id == pid
+            expected.remove(pid)
+        else:
+            # 中間的人離開又回來（移到最後）
+            pid = rng.choice(expected)
+            queue.remove(pid)
+            queue.append(P(pid))
+            expected.remove(pid)
+            expected.append(pid)
+
+        for pid in rng.sample(expected, min(5, len(expected))):
+            assert queue.position(pid) == expected.index(pid) + 1
+
+    assert_matches(queue, expected)
@@ -0,0 +1,239 @@
+"""
+熱路徑微基準測試
+
+量測每次輪詢 / 每個遊戲事件都會走到的函式：
+- GameRoom.get_state / get_wheel_state / get_player_status / remove_inactive_players
+- game_logic.resolve_game_event、main._decision_to_actions
+- DiceEngine.roll（backend；缺少 sqlalchemy 等相依套件時跳過）
+
+房間大小分兩種：
+- realistic：6 位玩家、沒有人排隊
+- stress：6 位玩家 + 500 位排隊
+
+結果寫成 JSON（含 git commit），可以用 --compare 與另一次的結果比較找出退步。
+
+用法：
+    python tools/benchmarks.py --output bench/$(git rev-parse --short HEAD).json
+    python tools/benchmarks.py --compare bench/old.json --filter get_state
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import timeit
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+# 基準測試不需要真的硬體；建房時幾百筆加入紀錄不要洗版
+os.environ.setdefault("PUMP_SIMULATION", "1")
+os.environ.setdefault("LOG_LEVEL_ROOM", "WARNING")
+
+import main  # noqa: E402
+from game_logic import resolve_game_event  # noqa: E402
+
+SIZES = {
+    "realistic": {"players": 6, "queued": 0},
+    "stress": {"players": 6, "queued": 500},
+}
+
+# 每個 case 重複量測幾輪（取中位數與最小值）
+DEFAULT_REPEAT = 5
+
+# 每輪至少跑多久（秒），太短的量測誤差大
+MIN_ROUND_TIME = 0.2
+
+# 與基準比較時，慢多少算退步
+REGRESSION_THRESHOLD = 0.10
+
+
+def build_room(players: int, queued: int) -> Tuple["main.GameRoom", str, str]:
+    """建立一個進行中的房間，回傳 (房間, 目前玩家 ID, 最後一位排隊者 ID)"""
+    room = main.GameRoom("BENCH")
+    player_ids = [room.add_player(f"bot{i}")[1] for i in range(players + queued)]
+    with room.mutate():
+        room.game_started = True
+        room.wheel_candidates = list(room.players.values())
+        room.wheel_finished = True
+        room.player_order = list(room.players)
+    return room, room.player_order[0], player_ids[-1]
+
+
+def room_cases(size: str) -> Dict[str, Callable[[], Any]]:
+    room, current_id, last_id = build_room(**SIZES[size])
+    return {
+        f"GameRoom.get_state[{size}]": room.get_state,
+        f"GameRoom.get_wheel_state[{size}]": room.get_wheel_state,
+        f"GameRoom.get_player_status[{size}]": lambda: room.get_player_status(current_id),
+        f"GameRoom.get_player_status.queued[{size}]": lambda: room.get_player_status(last_id),
+        f"GameRoom.remove_inactive_players[{size}]": room.remove_inactive_players,
+    }
+
+
+def rule_cases() -> Dict[str, Callable[[], Any]]:
+    decision = resolve_game_event("family", "score", score=7, base_pump_id=1)
+    multi = {"success": True, "actions": [{"pump_id": i, "volume_ml": 10.0} for i in (1, 2, 3, 4)]}
+    return {
+        "resolve_game_event.score": lambda: resolve_game_event("family", "score", score=7, base_pump_id=1),
+        "resolve_game_event.no_pour": lambda: resolve_game_event("family", "score", score=5, base_pump_id=1),
+        "resolve_game_event.after_drink": lambda: resolve_game_event("drunk", "after_drink", base_pump_id=2),
+        "_decision_to_actions.single": lambda: main._decision_to_actions(decision),
+        "_decision_to_actions.multi": lambda: main._decision_to_actions(multi),
+    }
+
+
+def dice_cases() -> Tuple[Dict[str, Callable[[], Any]], Optional[str]]:
+    """backend 的骰子引擎（相依套件沒裝就跳過，回傳跳過原因）"""
+    sys.path.insert(0, os.path.join(ROOT_DIR, "backend"))
+    try:
+        from app.models.game import GameMode
+        from app.services.dice_engine import DiceEngine
+    except ImportError as e:
+        return {}, f"DiceEngine 略過：{e}"
+    return {
+        f"DiceEngine.roll[{mode.value}]": (lambda m=mode: DiceEngine.roll(m))
+        for mode in GameMode
+    }, None
+
+
+def measure(func: Callable[[], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    # autorange 只保證 0.2 秒，依需要再放大
+    if elapsed < min_time:
+        number = max(number, int(number * min_time / max(elapsed, 1e-9)))
+    rounds = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return {
+        "loops": number,
+        "repeat": repeat,
+        "median_ns": round(statistics.median(rounds) * 1e9, 1),
+        "min_ns": round(min(rounds) * 1e9, 1),
+        "max_ns": round(max(rounds) * 1e9, 1),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def run(filter_text: Optional[str], repeat: int, min_time: float) -> Dict[str, Any]:
+    cases: Dict[str, Callable[[], Any]] = {}
+    for size in SIZES:
+        cases.update(room_cases(size))
+    cases.update(rule_cases())
+    dice, skipped = dice_cases()
+    cases.update(dice)
+
+    results = {}
+    for name, func in cases.items():
+        if filter_text and filter_text not in name:
+            continue
+        results[name] = measure(func, repeat, min_time)
+
+    return {
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "sizes": SIZES,
+        "skipped": [skipped] if skipped else [],
+        "results": results,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """以中位數比較，回傳每個共同 case 的變化比例"""
+    rows = []
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old:
+            continue
+        ratio = result["median_ns"] / old["median_ns"] if old["median_ns"] else float("inf")
+        rows.append({
+            "name": name,
+            "baseline_ns": old["median_ns"],
+            "current_ns": result["median_ns"],
+            "ratio": round(ratio, 3),
+            "regression": ratio > 1 + threshold,
+        })
+    return rows
+
+
+def print_results(report: Dict[str, Any]):
+    print(f"🧪 commit {report['commit'] or '?'} / Python {report['python']} / {report['machine']}")
+    for reason in report["skipped"]:
+        print(f"⚠️ {reason}")
+    print(f"{'case':<52}{'median':>12}{'min':>12}{'loops':>10}")
+    for name, r in report["results"].items():
+        print(f"{name:<52}{format_ns(r['median_ns']):>12}{format_ns(r['min_ns']):>12}{r['loops']:>10}")
+
+
+def print_comparison(rows: List[Dict[str, Any]], baseline_commit: Optional[str]):
+    print(f"\n📊 與 {baseline_commit or '基準'} 比較（中位數）")
+    for row in rows:
+        mark = "🔴" if row["regression"] else "  "
+        print(
+            f"{mark}{row['name']:<50}{format_ns(row['baseline_ns']):>12} → "
+            f"{format_ns(row['current_ns']):>10}  x{row['ratio']}"
+        )
+
+
+def format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} µs"
+    return f"{ns:.0f} ns"
+
+
+def main_cli(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="熱路徑微基準測試")
+    parser.add_argument("--output", help="結果寫入這個 JSON 檔")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="慢多少比例算退步")
+    parser.add_argument("--filter", help="只跑名稱包含這段文字的 case")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--min-time", type=float, default=MIN_ROUND_TIME, help="每輪至少跑幾秒")
+    parser.add_argument("--json", action="store_true", help="輸出 JSON 到 stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.filter, args.repeat, args.min_time)
+
+    rows = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(report, baseline, args.threshold)
+        report["comparison"] = {"baseline_commit": baseline.get("commit"), "rows": rows}
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_results(report)
+        if rows is not None:
+            print_comparison(rows, report["comparison"]["baseline_commit"])
+
+    # 有退步時回傳非 0，方便接 CI
+    if rows and any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main_cli()
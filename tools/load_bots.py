@@ -0,0 +1,417 @@
+"""
+機器人玩家壓力測試（只用標準函式庫）
+
+模擬 N 支手機對「正在執行的」伺服器照 script.js 的流程操作：
+- 玩家：加入房間 → 心跳（5 秒）→ 輪詢遊戲狀態（1 秒）→
+  輪到自己時擲骰子、觸發 /api/game/event、喝酒時加分 / 換基底、next-turn
+- 房主：開始遊戲、轉盤；一局結束後重置再開新局
+- 觀眾：只輪詢遊戲狀態
+- 轉盤階段（已開始、還沒輪到任何人）另外每 0.5 秒輪詢 /api/wheel/state
+
+輪詢與瀏覽器一樣帶 If-None-Match（可用 --no-etag 關掉），
+房間 / 遊戲狀態另外帶 ?since=&epoch= 只下載變動的欄位（可用 --no-delta 關掉）。
+結束時列出每個 endpoint 的吞吐量、p50/p95/p99 延遲、錯誤率，
+以及輪詢排程的延遲（實際發出時間比預定晚多少）：輪詢延遲持續變大就代表伺服器跟不上 1 秒一次的輪詢。
+
+用法：
+    python tools/load_bots.py --url http://raspberrypi.local:8000 --rooms 3 --players 4 --spectators 10 --duration 60
+"""
+import argparse
+import http.client
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+# 與 script.js 相同的間隔（秒）
+POLL_INTERVAL = 1.0
+WHEEL_POLL_INTERVAL = 0.5
+HEARTBEAT_INTERVAL = 5.0
+
+# 轉盤動畫長度（script.js 是 4~7 秒，動畫結束才呼叫 /api/wheel/finish）
+WHEEL_SPIN_SECONDS = 4.0
+
+# 會觸發倒酒的點數（闔家歡）與喝酒的點數
+POUR_SCORES = (4, 7, 8)
+DRINK_SCORE = 9
+
+
+class Stats:
+    """各 endpoint 的延遲與錯誤統計（執行緒安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.not_modified: Dict[str, int] = defaultdict(int)
+        self.poll_lag: List[float] = []
+
+    def record(self, name: str, latency: float, status: int):
+        with self._lock:
+            self.latencies[name].append(latency)
+            if status == 304:
+                self.not_modified[name] += 1
+            elif status >= 400 or status == 0:
+                self.errors[name] += 1
+
+    def record_lag(self, lag: float):
+        with self._lock:
+            self.poll_lag.append(lag)
+
+
+def percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, int(round(p / 100 * (len(values) - 1)))))
+    return values[k]
+
+
+def apply_merge_patch(target: Any, patch: Any) -> Any:
+    """JSON merge patch（與 script.js 的 applyMergePatch 相同）：None 代表刪除欄位"""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_merge_patch(result.get(key), value)
+    return result
+
+
+class Client:
+    """一支手機：一條 keep-alive 連線 + 自己的 cookie"""
+
+    def __init__(self, base_url: str, stats: Stats, use_etag: bool = True, use_delta: bool = True,
+                 timeout: float = 10.0):
+        parsed = urlparse(base_url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 80
+        self.timeout = timeout
+        self.stats = stats
+        self.use_etag = use_etag
+        self.use_delta = use_delta
+        self.cookies: Dict[str, str] = {}
+        self.etags: Dict[str, str] = {}
+        self.cache: Dict[str, Any] = {}
+        self.states: Dict[str, Dict[str, Any]] = {}  # ?since= 用：path -> 上一次的完整狀態
+        self._conn: Optional[http.client.HTTPConnection] = None
+
+    def _connection(self) -> http.client.HTTPConnection:
+        if self._conn is None:
+            self._conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._conn
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None,
+                name: Optional[str] = None, query: Optional[Dict[str, str]] = None) -> Tuple[int, Any]:
+        name = name or path
+        url = path + ("?" + urlencode(query) if query else "")
+        headers = {"Connection": "keep-alive"}
+        if self.cookies:
+            headers["Cookie"] = "; ".join(f"{k}={v}" for k, v in self.cookies.items())
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        if method == "GET" and self.use_etag and url in self.etags:
+            headers["If-None-Match"] = self.etags[url]
+
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, url, body=payload, headers=headers)
+            response = conn.getresponse()
+            raw = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            # 連線斷掉：下次重連
+            if self._conn is not None:
+                self._conn.close()
+            self._conn = None
+            self.stats.record(name, time.perf_counter() - start, 0)
+            return 0, None
+        self.stats.record(name, time.perf_counter() - start, status)
+
+        for header, value in response.getheaders():
+            if header.lower() == "set-cookie":
+                key, _, rest = value.partition("=")
+                self.cookies[key.strip()] = rest.split(";", 1)[0].strip('"')
+        if status == 304:
+            return status, self.cache.get(url)
+
+        data = json.loads(raw) if raw else None
+        etag = response.getheader("ETag")
+        if method == "GET" and etag:
+            self.etags[url] = etag
+            self.cache[url] = data
+        return status, data
+
+    def get_state(self, path: str) -> Tuple[int, Any]:
+        """
+        照 fetchStateDelta 輪詢狀態：帶上一次的 version / epoch，
+        伺服器回 delta 時套用到上一次的完整狀態；請求失敗就丟掉快取，下次重新下載完整狀態
+        """
+        cached = self.states.get(path) if self.use_delta else None
+        query = {"since": str(cached["version"]), "epoch": cached["epoch"]} if cached else None
+        status, data = self.request("GET", path, name=path, query=query)
+        if status == 304 and cached:
+            return status, cached["state"]
+        if status != 200 or not data:
+            self.states.pop(path, None)
+            return status, data
+
+        state = apply_merge_patch(cached["state"], data["patch"]) if data.get("delta") and cached else data
+        if self.use_delta and state.get("version") is not None:
+            self.states[path] = {"state": state, "version": state["version"], "epoch": state.get("epoch")}
+        return status, state
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+
+
+class Bot(threading.Thread):
+    """一個玩家或觀眾"""
+
+    def __init__(self, base_url: str, stats: Stats, stop: threading.Event, room_code: str,
+                 name: str, spectator: bool = False, is_host: bool = False,
+                 turn_delay: float = 2.0, mode: str = "family", use_etag: bool = True,
+                 use_delta: bool = True, expected_players: int = 2):
+        super().__init__(daemon=True, name=name)
+        self.client = Client(base_url, stats, use_etag=use_etag, use_delta=use_delta)
+        self.stats = stats
+        self.stop = stop
+        self.room_code = room_code
+        self.player_name = name
+        self.spectator = spectator
+        self.is_host = is_host
+        self.turn_delay = turn_delay
+        self.mode = mode
+        self.expected_players = expected_players
+        self.player_id: Optional[str] = None
+        self.ready = threading.Event()
+        self._my_turn_since: Optional[float] = None
+        self._wheel_spun_at: Optional[float] = None
+
+    # ---------- 流程 ----------
+    def join_room(self) -> bool:
+        if self.spectator:
+            self.client.cookies["room_code"] = self.room_code
+            return True
+        status, data = self.client.request(
+            "POST", "/api/room/join", {"player_name": self.player_name, "room_code": self.room_code}
+        )
+        if status != 200 or not data:
+            return False
+        self.player_id = data["player_id"]
+        return True
+
+    def start_game(self):
+        """房主：開始遊戲並轉轉盤（動畫播完才在 on_state 裡呼叫 finish）"""
+        self.client.request("POST", "/api/room/start", {"player_id": self.player_id})
+        self.spin_wheel()
+
+    def spin_wheel(self):
+        self.client.request("POST", "/api/wheel/spin", {"player_id": self.player_id})
+        self._wheel_spun_at = time.monotonic()
+
+    def play_turn(self):
+        """照 handleFamilyModeEvents 的主要分支操作"""
+        dice1, dice2 = random.randint(1, 6), random.randint(1, 6)
+        total = dice1 + dice2
+        self.client.request("POST", "/api/game/roll-dice",
+                            {"player_id": self.player_id, "dice1": dice1, "dice2": dice2})
+
+        if total == DRINK_SCORE or dice1 == dice2:
+            self.client.request("POST", "/api/game/update-score", {"player_id": self.player_id, "score_delta": 1})
+            _, state = self.client.get_state("/api/game/state")
+            next_round = (state or {}).get("current_round", 1) + 1
+            self.client.request("POST", "/api/game/increment-round", {"player_id": self.player_id, "new_round": next_round})
+            self.client.request("POST", "/api/game/set-base-wine", {"player_id": self.player_id})
+            self.client.request("POST", "/api/game/event", {"mode": self.mode, "event": "after_drink"})
+        elif total in POUR_SCORES:
+            self.client.request("POST", "/api/game/event", {"mode": self.mode, "event": "score", "score": total})
+            self.client.request("POST", "/api/game/add-wine",
+                                {"player_id": self.player_id, "color": random.choice(["red", "blue", "yellow", "green"])})
+
+        self.client.request("POST", "/api/game/next-turn", {"player_id": self.player_id})
+
+    def run(self):
+        if not self.join_room():
+            self.ready.set()
+            return
+        self.ready.set()
+
+        in_game = False
+        in_wheel = False
+        next_poll = time.monotonic()
+        next_wheel_poll = next_poll
+        next_heartbeat = time.monotonic()
+        while not self.stop.is_set():
+            now = time.monotonic()
+
+            if now >= next_poll:
+                self.stats.record_lag(now - next_poll)
+                next_poll += POLL_INTERVAL
+                # 落後超過一個週期就放棄補發（瀏覽器的 setInterval 也不會補）
+                if next_poll < now:
+                    next_poll = now + POLL_INTERVAL
+                # 等待畫面輪詢房間狀態，遊戲畫面輪詢遊戲狀態（與前端相同）
+                path = "/api/game/state" if in_game else "/api/room/state"
+                status, state = self.client.get_state(path)
+                if status == 400 and in_game:
+                    in_game = False
+                elif state:
+                    in_game = bool(state.get("game_started")) and state.get("current_player_id") is not None
+                    # 已開始但還沒輪到任何人：轉盤畫面
+                    in_wheel = (bool(state.get("game_started")) and not state.get("game_ended")
+                                and state.get("current_player_id") is None)
+                    if not self.spectator:
+                        self.on_state(state, now)
+
+            # 轉盤畫面另外輪詢轉盤狀態（與 startWheelStatePolling 相同，每 0.5 秒）
+            if in_wheel and now >= next_wheel_poll:
+                next_wheel_poll = max(next_wheel_poll + WHEEL_POLL_INTERVAL, now)
+                self.client.request("GET", "/api/wheel/state")
+
+            if not self.spectator and now >= next_heartbeat:
+                next_heartbeat += HEARTBEAT_INTERVAL
+                self.client.request("POST", "/api/room/heartbeat", {"player_id": self.player_id})
+
+            wake = next_poll if self.spectator else min(next_poll, next_heartbeat)
+            if in_wheel:
+                wake = min(wake, next_wheel_poll)
+            self.stop.wait(max(0.0, wake - time.monotonic()))
+        self.client.close()
+
+    def on_state(self, state: Dict[str, Any], now: float):
+        if self.is_host:
+            if state.get("game_ended"):
+                self.client.request("POST", "/api/game/reset")
+                return
+            if not state.get("game_started"):
+                # 等所有機器人都加入才開局
+                if state.get("player_count", 0) >= self.expected_players:
+                    self.start_game()
+                return
+            if state.get("current_player_id") is None:
+                # 已開始但轉盤還沒轉完
+                if self._wheel_spun_at is None:
+                    self.spin_wheel()
+                elif now - self._wheel_spun_at >= WHEEL_SPIN_SECONDS:
+                    self._wheel_spun_at = None
+                    self.client.request("POST", "/api/wheel/finish")
+                return
+
+        if state.get("game_ended") or state.get("current_player_id") != self.player_id:
+            self._my_turn_since = None
+            return
+        # 模擬玩家看畫面、按按鈕的時間
+        if self._my_turn_since is None:
+            self._my_turn_since = now
+        if now - self._my_turn_since >= self.turn_delay:
+            self._my_turn_since = None
+            self.play_turn()
+
+
+def create_room(base_url: str, stats: Stats) -> Optional[str]:
+    client = Client(base_url, stats)
+    status, data = client.request("POST", "/api/room/create")
+    client.close()
+    return data["room_code"] if status == 200 and data else None
+
+
+def report(stats: Stats, elapsed: float) -> Dict[str, Any]:
+    endpoints = {}
+    total_requests = 0
+    for name, latencies in sorted(stats.latencies.items()):
+        count = len(latencies)
+        total_requests += count
+        endpoints[name] = {
+            "requests": count,
+            "rps": round(count / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+            "error_rate": round(stats.errors[name] / count, 4) if count else 0.0,
+            "not_modified_rate": round(stats.not_modified[name] / count, 4) if count else 0.0,
+        }
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "requests": total_requests,
+        "rps": round(total_requests / elapsed, 2),
+        "poll_lag_p50_ms": round(percentile(stats.poll_lag, 50) * 1000, 2),
+        "poll_lag_p95_ms": round(percentile(stats.poll_lag, 95) * 1000, 2),
+        "poll_lag_p99_ms": round(percentile(stats.poll_lag, 99) * 1000, 2),
+        "endpoints": endpoints,
+    }
+
+
+def print_report(result: Dict[str, Any]):
+    print(f"\n⏱️  {result['elapsed_s']} 秒，共 {result['requests']} 個請求（{result['rps']} req/s）")
+    print(f"📡 輪詢延遲 p50 {result['poll_lag_p50_ms']} ms / p95 {result['poll_lag_p95_ms']} ms / p99 {result['poll_lag_p99_ms']} ms")
+    print(f"{'endpoint':<32}{'req':>8}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'err%':>8}{'304%':>8}")
+    for name, e in result["endpoints"].items():
+        print(
+            f"{name:<32}{e['requests']:>8}{e['rps']:>9}{e['p50_ms']:>9}{e['p95_ms']:>9}{e['p99_ms']:>9}"
+            f"{e['error_rate'] * 100:>8.2f}{e['not_modified_rate'] * 100:>8.1f}"
+        )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="機器人玩家壓力測試")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--rooms", type=int, default=1, help="開幾桌")
+    parser.add_argument("--players", type=int, default=4, help="每桌幾位玩家（上限依伺服器 max_players）")
+    parser.add_argument("--spectators", type=int, default=0, help="每桌幾位只看不玩的觀眾")
+    parser.add_argument("--duration", type=float, default=30.0, help="測試秒數")
+    parser.add_argument("--turn-delay", type=float, default=2.0, help="輪到自己後幾秒才擲骰子")
+    parser.add_argument("--mode", default="family", choices=["family", "drunk"])
+    parser.add_argument("--no-etag", action="store_true", help="輪詢不帶 If-None-Match")
+    parser.add_argument("--no-delta", action="store_true", help="輪詢不帶 ?since=，每次下載完整狀態")
+    parser.add_argument("--json", action="store_true", help="輸出 JSON")
+    args = parser.parse_args(argv)
+
+    stats = Stats()
+    stop = threading.Event()
+    bots: List[Bot] = []
+
+    for r in range(args.rooms):
+        room_code = create_room(args.url, stats)
+        if room_code is None:
+            raise SystemExit(f"無法在 {args.url} 建立房間")
+        for i in range(args.players):
+            bots.append(Bot(args.url, stats, stop, room_code, f"bot{r}-{i}", is_host=(i == 0),
+                            turn_delay=args.turn_delay, mode=args.mode, use_etag=not args.no_etag,
+                            use_delta=not args.no_delta, expected_players=args.players))
+        for i in range(args.spectators):
+            bots.append(Bot(args.url, stats, stop, room_code, f"spec{r}-{i}", spectator=True,
+                            use_etag=not args.no_etag, use_delta=not args.no_delta))
+
+    # 玩家依序加入（房主最先），確保房主是第一個加入的人
+    for bot in bots:
+        bot.start()
+        bot.ready.wait(timeout=10)
+
+    start = time.monotonic()
+    try:
+        stop.wait(args.duration)
+    except KeyboardInterrupt:
+        pass
+    stop.set()
+    for bot in bots:
+        bot.join(timeout=5)
+
+    result = report(stats, time.monotonic() - start)
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        print_report(result)
+
+
+if __name__ == "__main__":
+    main()
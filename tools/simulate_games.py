@@ -0,0 +1,328 @@
+"""
+遊戲蒙地卡羅模擬器（NumPy 向量化）
+
+一次模擬大量遊戲，回答：
+- 每種模式、每種人數，一場遊戲平均幾回合（擲幾次骰子）
+- 會倒幾次酒、總共倒多少 ml
+- 每顆幫浦每小時大約用掉多少 ml（估算瓶子容量用）
+
+資料來源（與正式遊戲相同）：
+- 骰子事件：backend/data/dice_modes/*.json
+- 出酒量：data/game_rules.json（透過 game_logic 載入與驗證）
+- 結束條件：與 main.py 的 update_score / increment_round 相同
+  （闔家歡：喝滿 5 次結束；酒鬼：有人喝滿 3 杯結束）
+
+需要 numpy（只有這個工具需要，伺服器本身不需要）：
+    pip install numpy
+
+用法：
+    python tools/simulate_games.py --games 1000000 --players 2-6
+    python tools/simulate_games.py --mode drunk --players 4 --json
+"""
+import argparse
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from game_logic import AVAILABLE_PUMPS, MAX_SCORE, RULES_FILE, RuleBook  # noqa: E402
+
+DICE_MODES_DIR = os.path.join(ROOT_DIR, "backend", "data", "dice_modes")
+
+# =========================
+# 模式對照：骰子模式名稱 -> game_logic 規則模式名稱
+# =========================
+RULE_MODES = {
+    "family": "family",
+    "alcoholic": "drunk",
+}
+
+# 結束條件（與 main.py 相同）
+FAMILY_ROUNDS = 5          # 闔家歡：回合數超過 5 結束，每喝一次回合 +1
+DRUNK_MAX_DRINKS = 3       # 酒鬼：有人喝滿 3 杯結束
+
+# 單場最多模擬幾回合（避免規則改壞時永遠不結束）
+MAX_TURNS = 2000
+
+# 每回合大約幾秒（含動畫、對決、喝酒），換算「每小時」用
+DEFAULT_TURN_SECONDS = 45.0
+
+# =========================
+# 事件效果（對應前端 handleFamilyModeEvents / handleAlcoholicModeEvents）
+# =========================
+EFFECT_NONE = 0        # 問答、真心話：不影響長度也不倒酒
+EFFECT_DRINK = 1       # 擲骰者喝一杯，換基底（倒 after_drink）
+EFFECT_DUEL = 2        # 與隨機對手對決，輸的人喝一杯
+EFFECT_GAMBLE = 3      # 射龍門：第三張牌不在兩張之間就喝
+EFFECT_ADD_WINE = 4    # 加酒：依點數倒 score 規則的量
+
+EVENT_EFFECTS = {
+    "drink_reset": EFFECT_DRINK,
+    "drink_penalty": EFFECT_DRINK,
+    "never_have_i": EFFECT_DUEL,
+    "arm_wrestling": EFFECT_DUEL,
+    "dragon_gate": EFFECT_GAMBLE,
+    "random_drink": EFFECT_ADD_WINE,
+    "choose_drink": EFFECT_ADD_WINE,
+}
+
+# 同一個事件在不同模式效果不同（闔家歡的黑白切只加減積分，酒鬼模式輸的要喝）
+MODE_EVENT_EFFECTS = {
+    "alcoholic": {"rock_paper": EFFECT_DUEL},
+}
+
+
+def load_dice_mode(mode: str) -> Dict[str, Any]:
+    path = os.path.join(DICE_MODES_DIR, f"{mode}.json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_effects(spec: Dict[str, Any]) -> "np.ndarray":
+    """
+    把骰子模式展開成 36 格效果表（索引 (dice1 - 1) * 6 + (dice2 - 1)）
+    展開方式與 DiceEngine 相同
+    """
+    totals = {int(k): v for k, v in spec.get("totals", {}).items()}
+    double_event = spec.get("double_event")
+    overrides = MODE_EVENT_EFFECTS.get(spec["mode"], {})
+
+    effects = np.zeros(36, dtype=np.int8)
+    for dice1 in range(1, 7):
+        for dice2 in range(1, 7):
+            if dice1 == dice2 and double_event:
+                event = double_event
+            else:
+                event = totals.get(dice1 + dice2, "unknown")
+            effects[(dice1 - 1) * 6 + (dice2 - 1)] = overrides.get(event, EVENT_EFFECTS.get(event, EFFECT_NONE))
+    return effects
+
+
+def compile_volumes(rule_book: RuleBook, rule_mode: str) -> Dict[str, Any]:
+    """從規則表取出各事件的出酒量（ml），score 展開成依點數索引的陣列"""
+    rules = rule_book.current()
+    score_ml = np.zeros(MAX_SCORE + 1)
+    for score in range(MAX_SCORE + 1):
+        score_ml[score] = rules.lookup(rule_mode, "score", score) or 0.0
+    return {
+        "game_start": rules.lookup(rule_mode, "game_start") or 0.0,
+        "after_drink": rules.lookup(rule_mode, "after_drink") or 0.0,
+        "score": score_ml,
+    }
+
+
+def simulate_batch(
+    rng: "np.random.Generator",
+    games: int,
+    players: int,
+    mode: str,
+    effects: "np.ndarray",
+    volumes: Dict[str, Any],
+) -> Dict[str, "np.ndarray"]:
+    """
+    平行模擬一批遊戲，每一步所有還沒結束的遊戲各擲一次骰子
+
+    回傳每場遊戲的 turns / drinks / pours / ml（各幫浦）
+    """
+    pump_count = len(AVAILABLE_PUMPS)
+    rows = np.arange(games)
+
+    turns = np.zeros(games, dtype=np.int32)
+    drinks = np.zeros((games, players), dtype=np.int16)
+    total_drinks = np.zeros(games, dtype=np.int16)
+    pours = np.zeros(games, dtype=np.int32)
+    ml = np.zeros((games, pump_count))
+    active = np.ones(games, dtype=bool)
+
+    # 遊戲開始：隨機基底幫浦，倒 game_start
+    base_pump = rng.integers(0, pump_count, games)
+    if volumes["game_start"] > 0:
+        ml[rows, base_pump] += volumes["game_start"]
+        pours += 1
+
+    for _ in range(MAX_TURNS):
+        idx = np.flatnonzero(active)
+        if idx.size == 0:
+            break
+
+        roller = turns[idx] % players
+        turns[idx] += 1
+        outcome = rng.integers(0, 36, idx.size)
+        effect = effects[outcome]
+        total = outcome // 6 + outcome % 6 + 2
+
+        # ---------- 加酒 ----------
+        add = effect == EFFECT_ADD_WINE
+        if add.any():
+            volume = volumes["score"][total[add]]
+            poured = volume > 0
+            g = idx[add][poured]
+            ml[g, base_pump[g]] += volume[poured]
+            pours[g] += 1
+
+        # ---------- 誰要喝 ----------
+        drinker = np.full(idx.size, -1)
+        drinker[effect == EFFECT_DRINK] = roller[effect == EFFECT_DRINK]
+
+        duel = effect == EFFECT_DUEL
+        if duel.any() and players > 1:
+            opponent = (roller[duel] + rng.integers(1, players, duel.sum())) % players
+            roller_loses = rng.random(duel.sum()) < 0.5
+            drinker[duel] = np.where(roller_loses, roller[duel], opponent)
+
+        gamble = effect == EFFECT_GAMBLE
+        if gamble.any():
+            n = gamble.sum()
+            c1 = rng.integers(1, 14, n)
+            c2 = (c1 - 1 + rng.integers(1, 13, n)) % 13 + 1   # 與 c1 不同
+            c3 = rng.integers(1, 14, n)
+            safe = (c3 > np.minimum(c1, c2)) & (c3 < np.maximum(c1, c2))
+            drinker[gamble] = np.where(safe, -1, roller[gamble])
+
+        # ---------- 喝酒：計分、換基底（避免同一顆）、倒 after_drink ----------
+        drank = drinker >= 0
+        if drank.any():
+            g = idx[drank]
+            drinks[g, drinker[drank]] += 1
+            total_drinks[g] += 1
+            base_pump[g] = (base_pump[g] + rng.integers(1, pump_count, g.size)) % pump_count
+            if volumes["after_drink"] > 0:
+                ml[g, base_pump[g]] += volumes["after_drink"]
+                pours[g] += 1
+
+            # ---------- 結束條件 ----------
+            if mode == "family":
+                ended = total_drinks[g] >= FAMILY_ROUNDS
+            else:
+                ended = drinks[g].max(axis=1) >= DRUNK_MAX_DRINKS
+            active[g[ended]] = False
+
+    return {
+        "turns": turns,
+        "drinks": total_drinks,
+        "pours": pours,
+        "ml": ml,
+        "finished": ~active,
+    }
+
+
+def summarize(values: "np.ndarray") -> Dict[str, float]:
+    p10, p50, p90, p99 = np.percentile(values, [10, 50, 90, 99])
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p10": float(p10),
+        "p50": float(p50),
+        "p90": float(p90),
+        "p99": float(p99),
+        "max": float(values.max()),
+    }
+
+
+def simulate(
+    mode: str,
+    players: int,
+    games: int,
+    batch_size: int = 200_000,
+    turn_seconds: float = DEFAULT_TURN_SECONDS,
+    seed: Optional[int] = None,
+    rules_file: str = RULES_FILE,
+) -> Dict[str, Any]:
+    rng = np.random.default_rng(seed)
+    effects = compile_effects(load_dice_mode(mode))
+    volumes = compile_volumes(RuleBook(rules_file), RULE_MODES[mode])
+
+    results: List[Dict[str, "np.ndarray"]] = []
+    remaining = games
+    while remaining > 0:
+        size = min(batch_size, remaining)
+        results.append(simulate_batch(rng, size, players, mode, effects, volumes))
+        remaining -= size
+
+    turns = np.concatenate([r["turns"] for r in results])
+    drinks = np.concatenate([r["drinks"] for r in results])
+    pours = np.concatenate([r["pours"] for r in results])
+    ml = np.concatenate([r["ml"] for r in results])
+    finished = np.concatenate([r["finished"] for r in results])
+
+    hours = turns.sum() * turn_seconds / 3600
+    pump_ml = ml.sum(axis=0)
+    return {
+        "mode": mode,
+        "players": players,
+        "games": games,
+        "unfinished": int((~finished).sum()),
+        "turns": summarize(turns),
+        "rounds_per_player": summarize(turns / players),
+        "drinks": summarize(drinks),
+        "pours": summarize(pours),
+        "total_ml": summarize(ml.sum(axis=1)),
+        "max_pump_ml_per_game": summarize(ml.max(axis=1)),
+        "ml_per_hour": {
+            pump_id: round(float(pump_ml[i] / hours), 1) if hours else 0.0
+            for i, pump_id in enumerate(AVAILABLE_PUMPS)
+        },
+        "turn_seconds": turn_seconds,
+    }
+
+
+def parse_players(value: str) -> List[int]:
+    if "-" in value:
+        low, high = value.split("-", 1)
+        return list(range(int(low), int(high) + 1))
+    return [int(v) for v in value.split(",")]
+
+
+def print_report(report: Dict[str, Any]):
+    t, p, ml = report["turns"], report["pours"], report["total_ml"]
+    per_hour = ", ".join(f"#{k} {v}" for k, v in report["ml_per_hour"].items())
+    print(
+        f"{report['mode']:<10}{report['players']:>3} 人 | "
+        f"回合 mean {t['mean']:.1f} p10 {t['p10']:.0f} p50 {t['p50']:.0f} p99 {t['p99']:.0f} | "
+        f"倒酒 mean {p['mean']:.1f} p99 {p['p99']:.0f} | "
+        f"ml mean {ml['mean']:.0f} p99 {ml['p99']:.0f} | "
+        f"ml/h {per_hour}"
+    )
+    if report["unfinished"]:
+        print(f"  ⚠️ {report['unfinished']} 場在 {MAX_TURNS} 回合內沒有結束")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="遊戲蒙地卡羅模擬器")
+    parser.add_argument("--mode", choices=["family", "alcoholic", "drunk", "all"], default="all")
+    parser.add_argument("--players", default="2-6", help="人數，例如 4、2,4,6 或 2-6")
+    parser.add_argument("--games", type=int, default=100_000, help="每種組合模擬幾場")
+    parser.add_argument("--batch-size", type=int, default=200_000)
+    parser.add_argument("--turn-seconds", type=float, default=DEFAULT_TURN_SECONDS)
+    parser.add_argument("--rules", default=RULES_FILE, help="規則檔（預設 data/game_rules.json）")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="輸出 JSON")
+    args = parser.parse_args(argv)
+
+    if np is None:
+        sys.exit("這個工具需要 numpy：pip install numpy")
+
+    mode = "alcoholic" if args.mode == "drunk" else args.mode
+    modes = ["family", "alcoholic"] if mode == "all" else [mode]
+
+    reports = []
+    for m in modes:
+        for players in parse_players(args.players):
+            report = simulate(m, players, args.games, args.batch_size, args.turn_seconds, args.seed, args.rules)
+            reports.append(report)
+            if not args.json:
+                print_report(report)
+
+    if args.json:
+        print(json.dumps(reports, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
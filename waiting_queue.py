@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional
+
+
+class WaitingQueue:
+    """
+    排隊名單（先到先進）
+
+    - player_id -> Player 用 OrderedDict 存：加入、取出最前面、依 ID 移除 / 查詢都是 O(1)
+    - 每位排隊者拿到一個遞增的序號，Fenwick tree 記錄每個序號是否還在排隊，
+      第幾位 = 序號之前（含）還在排隊的人數，O(log n)
+    - 序號用完（陣列滿）時重新編號並重建，平均下來每次加入仍是 O(1)
+
+    不是執行緒安全的，呼叫端需自行持鎖（房間鎖）。
+    元素只需要有 player_id 屬性。
+    """
+
+    # 重建時至少保留的序號空間
+    MIN_CAPACITY = 64
+
+    def __init__(self):
+        self._players: "OrderedDict[str, Any]" = OrderedDict()
+        self._seq: Dict[str, int] = {}
+        self._tree: List[int] = [0] * (self.MIN_CAPACITY + 1)  # 1-based
+        self._next_seq = 1
+
+    # =========================
+    # Fenwick tree
+    # =========================
+    def _add(self, i: int, delta: int):
+        tree = self._tree
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _prefix(self, i: int) -> int:
+        tree = self._tree
+        total = 0
+        while i > 0:
+            total += tree[i]
+            i -= i & -i
+        return total
+
+    def _rebuild(self):
+        """依目前順序重新從 1 編號，並以 O(n) 建樹"""
+        capacity = max(self.MIN_CAPACITY, 2 * len(self._players) + 16)
+        tree = [0] * (capacity + 1)
+        self._seq = {}
+        for i, player_id in enumerate(self._players, start=1):
+            self._seq[player_id] = i
+            tree[i] = 1
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._next_seq = len(self._players) + 1
+
+    # =========================
+    # 對外 API
+    # =========================
+    def append(self, player: Any):
+        """加到隊伍最後面（已在排隊中則不動）"""
+        player_id = player.player_id
+        if player_id in self._players:
+            return
+        if self._next_seq >= len(self._tree):
+            self._rebuild()
+        seq = self._next_seq
+        self._next_seq += 1
+        self._players[player_id] = player
+        self._seq[player_id] = seq
+        self._add(seq, 1)
+
+    def popleft(self) -> Any:
+        """取出最前面的人（空的時候丟 IndexError）"""
+        if not self._players:
+            raise IndexError("排隊名單是空的")
+        player_id, player = self._players.popitem(last=False)
+        self._add(self._seq.pop(player_id), -1)
+        return player
+
+    def remove(self, player_id: str) -> Optional[Any]:
+        """依 ID 移除，回傳被移除的人（不在隊伍中回傳 None）"""
+        player = self._players.pop(player_id, None)
+        if player is not None:
+            self._add(self._seq.pop(player_id), -1)
+        return player
+
+    def get(self, player_id: str) -> Optional[Any]:
+        return self._players.get(player_id)
+
+    def position(self, player_id: str) -> Optional[int]:
+        """第幾位（從 1 開始），不在隊伍中回傳 None"""
+        seq = self._seq.get(player_id)
+        return None if seq is None else self._prefix(seq)
+
+    def clear(self):
+        self._players.clear()
+        self._rebuild()
+
+    def __contains__(self, player_id: str) -> bool:
+        return player_id in self._players
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(list(self._players.values()))
+
+    def __len__(self) -> int:
+        return len(self._players)
+
+    def __bool__(self) -> bool:
+        return bool(self._players)